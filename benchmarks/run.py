@@ -0,0 +1,222 @@
+#!/usr/bin/env python
+"""
+End-to-end benchmarks of the userapp CLI against a local stub API.
+
+Starts benchmarks/stub_server.py in-process and drives the real clidriver.main()
+through single calls, login, script mode, output rendering, paging and
+batch mode. Results are written as JSON so releases can be compared.
+
+    python benchmarks/run.py --out results.json
+    python benchmarks/run.py --latency 0.02 --compare results.json
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+
+ROOT_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_server import StubServer
+from userapp.cli.core import ServiceLocator
+
+class RedirectedIO(object):
+	"""
+	Feed stdin from a string and discard stdout and stderr, including output written
+	to the stdout file descriptor directly (e.g. by 'clear').
+	"""
+	def __init__(self, stdin_text=''):
+		self.stdin_text=stdin_text
+
+	def __enter__(self):
+		try:
+			from StringIO import StringIO
+		except ImportError:
+			from io import StringIO
+
+		sys.stdout.flush()
+
+		self.saved=(sys.stdin, sys.stdout, sys.stderr, os.dup(1))
+		self.devnull=open(os.devnull, 'w')
+
+		os.dup2(self.devnull.fileno(), 1)
+		sys.stdin=StringIO(self.stdin_text)
+		sys.stdout=self.devnull
+		sys.stderr=self.devnull
+
+	def __exit__(self, *arguments):
+		(sys.stdin, sys.stdout, sys.stderr, saved_fd)=self.saved
+
+		os.dup2(saved_fd, 1)
+		os.close(saved_fd)
+		self.devnull.close()
+
+def percentile(values, fraction):
+	values=sorted(values)
+	index=int(round(fraction*(len(values)-1)))
+	return values[index]
+
+class Benchmark(object):
+	def __init__(self, options):
+		self.options=options
+		self.temp_dir=tempfile.mkdtemp()
+		self.config_path=os.path.join(self.temp_dir, 'config.json')
+		self.stub=StubServer(latency=options.latency, users=options.users, payload_size=options.payload_size)
+
+	def write_config(self):
+		with open(self.config_path, 'w') as handle:
+			json.dump({'profiles':{'owner@example.com':{
+				'primary':True,
+				'user':{'app_id':'stub-app', 'token':'stub-token', 'login':'owner@example.com', 'password':'secret'},
+				'server':{'base_address':self.stub.base_address, 'secure':False, 'debug':False}
+			}}}, handle)
+
+	def write_batch_file(self):
+		path=os.path.join(self.temp_dir, 'batch.jsonl')
+
+		with open(path, 'w') as handle:
+			for index in range(self.options.batch_size):
+				handle.write(json.dumps({'service':'user', 'method':'get', 'params':{'user_id':'user{i}'.format(i=index)}}) + '\n')
+
+		return path
+
+	def get_scenarios(self):
+		render_size=str(self.options.render_items)
+		script_lines='\n'.join(['call user.get user_id=user0']*self.options.script_lines)+'\n'
+
+		scenarios=[
+			('call', ['call', 'user.get', 'user_id=user0'], '', 1),
+			('login', ['login', 'owner@example.com', 'secret'], 'n\n', 1),
+			('script', ['-'], script_lines, self.options.script_lines)
+		]
+
+		for output_format in [None, 'json', 'compact', 'ndjson', 'csv']:
+			arguments=['call', 'user.search', 'page_size='+render_size]
+
+			if output_format is not None:
+				arguments += ['--output', output_format]
+
+			scenarios.append(('render-'+(output_format or 'pretty'), arguments, '', self.options.render_items))
+
+		scenarios.append(('search-all', ['call', 'user.search', '--all', '--output', 'ndjson', '--page-size', '100'], '', self.options.users))
+		scenarios.append(('batch', ['call', '--batch', self.write_batch_file(), '--concurrency', '16'], '', self.options.batch_size))
+
+		return scenarios
+
+	def run_main(self, arguments, stdin_text):
+		import userapp.cli.clidriver as clidriver
+
+		self.write_config()
+		sys.argv=['userapp']+list(arguments)
+
+		with RedirectedIO(stdin_text):
+			clidriver.main()
+
+		# Close the keep-alive connections so every run starts from the same state
+		ServiceLocator.get_instance().resolve('client_pool').invalidate()
+
+	def run_scenario(self, arguments, stdin_text, operations):
+		self.run_main(arguments, stdin_text)
+		self.stub.reset_counts()
+
+		durations=[]
+
+		for run in range(self.options.runs):
+			start=time.time()
+			self.run_main(arguments, stdin_text)
+			durations.append(time.time()-start)
+
+		counts=self.stub.reset_counts()
+
+		return {
+			'runs':self.options.runs,
+			'mean_ms':round(1000*sum(durations)/len(durations), 3),
+			'p50_ms':round(1000*percentile(durations, 0.5), 3),
+			'p90_ms':round(1000*percentile(durations, 0.9), 3),
+			'max_ms':round(1000*max(durations), 3),
+			'operations_per_second':round(operations*len(durations)/sum(durations), 1),
+			'requests_per_run':dict([(method, count/float(self.options.runs)) for (method, count) in counts.items()])
+		}
+
+	def run(self):
+		os.environ['HOME']=self.temp_dir
+		os.environ['USERAPP_CONFIG']=self.config_path
+
+		self.stub.start()
+		results={}
+
+		try:
+			for (name, arguments, stdin_text, operations) in self.get_scenarios():
+				if self.options.scenario and name not in self.options.scenario:
+					continue
+
+				results[name]=self.run_scenario(arguments, stdin_text, operations)
+				print('{n:<16} p50 {p:>10.2f} ms  p90 {q:>10.2f} ms  {o:>10.1f} ops/s'.format(n=name, p=results[name]['p50_ms'], q=results[name]['p90_ms'], o=results[name]['operations_per_second']))
+		finally:
+			self.stub.stop()
+			shutil.rmtree(self.temp_dir, True)
+
+		return results
+
+def compare(results, previous_path):
+	with open(previous_path, 'r') as handle:
+		previous=json.load(handle)['scenarios']
+
+	print('')
+	print('Compared with {p}:'.format(p=previous_path))
+
+	for name in sorted(results.keys()):
+		if name not in previous:
+			continue
+
+		before=previous[name]['p50_ms']
+		after=results[name]['p50_ms']
+		change=100.0*(after-before)/before if before > 0 else 0.0
+
+		print('{n:<16} p50 {b:>10.2f} -> {a:>10.2f} ms ({c:+.1f}%)'.format(n=name, b=before, a=after, c=change))
+
+def main(arguments):
+	import argparse
+
+	from userapp.cli import __version__
+
+	parser=argparse.ArgumentParser(description='Benchmark the userapp CLI against a local stub API.')
+	parser.add_argument('--runs', type=int, default=10, help='measured runs per scenario')
+	parser.add_argument('--latency', type=float, default=0.0, help='stub response latency in seconds')
+	parser.add_argument('--users', type=int, default=2000, help='users returned by user.search')
+	parser.add_argument('--payload-size', type=int, default=256, help='bytes of padding per user')
+	parser.add_argument('--render-items', type=int, default=1000, help='page size of the rendering scenarios')
+	parser.add_argument('--script-lines', type=int, default=50, help='commands per script run')
+	parser.add_argument('--batch-size', type=int, default=500, help='calls per batch run')
+	parser.add_argument('--scenario', action='append', help='only run this scenario (repeatable)')
+	parser.add_argument('--out', help='write the results as JSON to this file')
+	parser.add_argument('--compare', help='compare with the results of a previous run')
+	options=parser.parse_args(arguments)
+
+	results=Benchmark(options).run()
+
+	if options.out is not None:
+		settings=dict(vars(options))
+		settings.pop('out')
+		settings.pop('compare')
+
+		with open(options.out, 'w') as handle:
+			json.dump({
+				'version':__version__,
+				'python':sys.version.split()[0],
+				'timestamp':int(time.time()),
+				'settings':settings,
+				'scenarios':results
+			}, handle, sort_keys=True, indent=4, separators=(',', ': '))
+
+	if options.compare is not None:
+		compare(results, options.compare)
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
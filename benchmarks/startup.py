@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+"""
+Cold-start benchmark for the userapp CLI.
+
+Runs a set of commands in fresh interpreters, collects import timings (from
+'python -X importtime' when the interpreter supports it, otherwise from an
+equivalent __import__ hook) and compares them with a budget file.
+
+    python benchmarks/startup.py
+    python benchmarks/startup.py --runs 10 --json startup.json
+    python benchmarks/startup.py --update
+"""
+import os
+import sys
+import json
+import shutil
+import tempfile
+import subprocess
+
+ROOT_DIR=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT_PATH=os.path.join(ROOT_DIR, 'bin', 'userapp')
+BUDGET_PATH=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'startup_budget.json')
+
+COMMANDS=[
+	['help'],
+	['config', 'get', 'app_id'],
+	['config', 'list'],
+	['profile', 'current'],
+	['call', 'user.get']
+]
+
+# Interpreters without -X importtime get an __import__ hook that prints the same format
+IMPORT_HOOK=r'''
+import sys, time
+try:
+	import __builtin__ as builtins
+except ImportError:
+	import builtins
+_import=builtins.__import__
+_stack=[]
+def _timed_import(name, *args, **kwargs):
+	before=len(sys.modules)
+	_stack.append(0.0)
+	start=time.time()
+	try:
+		return _import(name, *args, **kwargs)
+	finally:
+		elapsed=time.time()-start
+		children=_stack.pop()
+		if len(_stack) > 0:
+			_stack[-1]+=elapsed
+		if len(sys.modules) > before:
+			sys.stderr.write('import time: %9d | %10d | %s%s\n' % ((elapsed-children)*1e6, elapsed*1e6, '  '*len(_stack), name))
+builtins.__import__=_timed_import
+script=sys.argv[1]
+sys.argv=sys.argv[1:]
+exec(compile(open(script).read(), script, 'exec'), {'__name__':'__main__', '__file__':script})
+'''
+
+def supports_importtime(python):
+	code='import sys; sys.exit(0 if sys.version_info >= (3, 7) else 1)'
+	return subprocess.call([python, '-c', code]) == 0
+
+def parse_importtime(output):
+	"""
+	Parse importtime lines into (total microseconds, set of imported module names).
+	"""
+	total=0
+	modules=set()
+
+	for line in output.splitlines():
+		if not line.startswith('import time:') or '[us]' in line:
+			continue
+
+		(self_us, cumulative_us, name)=line[len('import time:'):].split('|', 2)
+		name=name.rstrip()
+
+		modules.add(name.strip())
+
+		if not name.startswith('   '):
+			total += int(cumulative_us)
+
+	return (total, modules)
+
+def create_config(directory):
+	"""
+	A profile with a token pointing at a closed local port, so network commands run
+	their full import path without leaving the machine.
+	"""
+	path=os.path.join(directory, 'config.json')
+
+	with open(path, 'w') as handle:
+		json.dump({'profiles':{'bench':{
+			'primary':True,
+			'user':{'app_id':'bench', 'token':'bench', 'login':'bench', 'password':None},
+			'server':{'base_address':'127.0.0.1:9', 'secure':False, 'debug':False}
+		}}}, handle)
+
+	return path
+
+def run_command(python, command, environment, importtime):
+	if importtime:
+		arguments=[python, '-X', 'importtime', SCRIPT_PATH]+command
+	else:
+		arguments=[python, '-c', IMPORT_HOOK, SCRIPT_PATH]+command
+
+	process=subprocess.Popen(arguments, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE, env=environment)
+	(stdout, stderr)=process.communicate()
+
+	return parse_importtime(stderr.decode('utf-8', 'replace'))
+
+def median(values):
+	values=sorted(values)
+	return values[len(values)//2]
+
+def main(arguments):
+	import argparse
+
+	parser=argparse.ArgumentParser(description='Measure userapp CLI cold-start import time per command.')
+	parser.add_argument('--python', default=sys.executable, help='interpreter to benchmark')
+	parser.add_argument('--runs', type=int, default=5, help='runs per command, the median is reported')
+	parser.add_argument('--budget', default=BUDGET_PATH, help='budget file to check against')
+	parser.add_argument('--update', action='store_true', help='write the measured values to the budget file')
+	parser.add_argument('--json', dest='json_path', help='write the results as JSON to this file')
+	options=parser.parse_args(arguments)
+
+	importtime=supports_importtime(options.python)
+	temp_dir=tempfile.mkdtemp()
+
+	environment=dict(os.environ)
+	environment['HOME']=temp_dir
+	environment['USERAPP_CONFIG']=create_config(temp_dir)
+	environment['PYTHONPATH']=ROOT_DIR+os.pathsep+environment.get('PYTHONPATH', '')
+
+	results={}
+
+	try:
+		for command in COMMANDS:
+			name=' '.join(command)
+			totals=[]
+			modules=set()
+
+			for run in range(options.runs):
+				(total, modules)=run_command(options.python, command, environment, importtime)
+				totals.append(total)
+
+			results[name]={'import_ms':round(median(totals)/1000.0, 1), 'modules':sorted(modules)}
+	finally:
+		shutil.rmtree(temp_dir, True)
+
+	try:
+		with open(options.budget, 'r') as handle:
+			budget=json.load(handle)
+	except IOError:
+		budget={}
+
+	failures=[]
+
+	for command in COMMANDS:
+		name=' '.join(command)
+		result=results[name]
+		limits=budget.get(name, {})
+
+		status='ok'
+
+		if 'import_ms' in limits and result['import_ms'] > limits['import_ms']:
+			status='over budget ({b} ms)'.format(b=limits['import_ms'])
+
+		forbidden=[module for module in limits.get('forbidden', []) if module in result['modules']]
+
+		if len(forbidden) > 0:
+			status='imports ' + ', '.join(forbidden)
+
+		if status != 'ok':
+			failures.append(name)
+
+		print('{n:<24} {t:>8.1f} ms {m:>5} modules  {s}'.format(n=name, t=result['import_ms'], m=len(result['modules']), s=status))
+
+	if options.json_path is not None:
+		with open(options.json_path, 'w') as handle:
+			json.dump({'python':options.python, 'importtime':importtime, 'results':results}, handle, sort_keys=True, indent=4, separators=(',', ': '))
+
+	if options.update:
+		for (name, result) in results.items():
+			# Leave headroom for machine noise, keep the forbidden module lists as they are
+			budget.setdefault(name, {})['import_ms']=round(result['import_ms']*1.5, 1)
+
+		with open(options.budget, 'w') as handle:
+			json.dump(budget, handle, sort_keys=True, indent=4, separators=(',', ': '))
+
+		return 0
+
+	return 1 if len(failures) > 0 else 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,226 @@
+#!/usr/bin/env python
+"""
+A local stand-in for the UserApp API, for benchmarks.
+
+Emulates user.login, app.get, token.search, token.save, user.get and user.search
+with a configurable response latency, number of users and payload size per user.
+Any other method echoes its arguments. Files added with serve_file are served on
+GET and HEAD, as ranges when requested (see ranges).
+
+    python benchmarks/stub_server.py --port 8080 --latency 0.02 --users 10000
+"""
+import sys
+import json
+import time
+import threading
+
+try:
+	from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+	from SocketServer import ThreadingMixIn
+except ImportError:
+	from http.server import BaseHTTPRequestHandler, HTTPServer
+	from socketserver import ThreadingMixIn
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+	protocol_version='HTTP/1.1'
+
+	# Buffer the response so it leaves in one segment instead of one per header line
+	wbufsize=-1
+
+	def log_message(self, format, *arguments):
+		pass
+
+	def do_POST(self):
+		length=int(self.headers.get('Content-Length') or 0)
+		body=self.rfile.read(length) if length > 0 else b''
+
+		try:
+			arguments=json.loads(body.decode('utf-8')) if len(body) > 0 else {}
+		except ValueError:
+			arguments={}
+
+		method=self.path.rsplit('/', 1)[-1]
+		result=self.server.stub.handle(method, arguments or {})
+
+		data=json.dumps(result).encode('utf-8')
+
+		self.send_response(200)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+		self.wfile.write(data)
+		self.wfile.flush()
+
+	def do_GET(self):
+		self.send_file(True)
+
+	def do_HEAD(self):
+		self.send_file(False)
+
+	def send_file(self, include_body):
+		(status, headers, data)=self.server.stub.get_file(self.command, self.path, self.headers.get('Range'), self.headers.get('If-Range'))
+
+		self.send_response(status)
+
+		for (name, value) in headers.items():
+			self.send_header(name, value)
+
+		self.send_header('Content-Length', str(len(data)))
+		self.end_headers()
+
+		if include_body:
+			self.wfile.write(data)
+
+		self.wfile.flush()
+
+class ThreadingHTTPServer(ThreadingMixIn, HTTPServer):
+	daemon_threads=True
+	allow_reuse_address=True
+
+class StubServer(object):
+	"""
+	Runs the stub API on a background thread. With port 0 a free port is picked,
+	see base_address.
+	"""
+	def __init__(self, port=0, latency=0.0, users=1000, payload_size=256):
+		self.latency=latency
+		self.users=users
+		self.payload='x'*payload_size
+		self.counts={}
+		self.lock=threading.Lock()
+
+		# Path to content, and the (command, path, Range, If-Range) of every file request
+		self.files={}
+		self.file_requests=[]
+
+		# Whether Range headers are honoured, or the whole file is always sent
+		self.ranges=True
+
+		self.server=ThreadingHTTPServer(('127.0.0.1', port), StubRequestHandler)
+		self.server.stub=self
+		self.thread=None
+
+	@property
+	def base_address(self):
+		return '127.0.0.1:{p}'.format(p=self.server.server_address[1])
+
+	def start(self):
+		self.thread=threading.Thread(target=self.server.serve_forever)
+		self.thread.daemon=True
+		self.thread.start()
+
+		return self
+
+	def stop(self):
+		self.server.shutdown()
+		self.server.server_close()
+
+	def reset_counts(self):
+		with self.lock:
+			counts=self.counts
+			self.counts={}
+
+		return counts
+
+	def serve_file(self, path, content):
+		with self.lock:
+			self.files[path]=content
+
+	def get_file(self, command, path, range_spec, if_range):
+		"""
+		The (status, headers, data) of a request for a file. The ETag of a file is
+		derived from its content, so replacing the content changes it.
+		"""
+		import hashlib
+
+		with self.lock:
+			self.file_requests.append((command, path, range_spec, if_range))
+			content=self.files.get(path)
+
+		if content is None:
+			return (404, {}, b'')
+
+		etag='"{d}"'.format(d=hashlib.sha1(content).hexdigest()[:16])
+		headers={'ETag':etag, 'Accept-Ranges':'bytes' if self.ranges else 'none'}
+
+		# A range of a changed file (If-Range) is answered with the whole file
+		if not self.ranges or range_spec is None or not range_spec.startswith('bytes=') or if_range not in [None, etag]:
+			return (200, headers, content)
+
+		(first, last)=range_spec[len('bytes='):].split('-', 1)
+
+		if first == '':
+			(first, last)=(max(0, len(content)-int(last)), len(content)-1)
+		else:
+			(first, last)=(int(first), min(int(last), len(content)-1) if last != '' else len(content)-1)
+
+		headers['Content-Range']='bytes {f}-{l}/{s}'.format(f=first, l=last, s=len(content))
+
+		return (206, headers, content[first:last+1])
+
+	def get_user(self, index):
+		return {
+			'user_id':'user{i}'.format(i=index),
+			'login':'user{i}@example.com'.format(i=index),
+			'email':'user{i}@example.com'.format(i=index),
+			'first_name':'First{i}'.format(i=index),
+			'last_name':'Last{i}'.format(i=index),
+			'properties':{'payload':{'value':self.payload, 'override':False}},
+			'created_at':1400000000+index
+		}
+
+	def handle(self, method, arguments):
+		with self.lock:
+			self.counts[method]=self.counts.get(method, 0)+1
+
+		if self.latency > 0:
+			time.sleep(self.latency)
+
+		if method == 'user.login':
+			return {'token':'stub-session', 'user_id':'owner', 'locks':[]}
+
+		if method == 'app.get':
+			return {'app_id':'stub-app', 'name':'Stub'}
+
+		if method == 'token.search':
+			return {'items':[{'token_id':'stub-token-id', 'name':'UserApp CLI', 'value':'stub-token', 'enabled':True}], 'total_items':1}
+
+		if method == 'token.save':
+			return {'token_id':'stub-token-id', 'name':arguments.get('name'), 'value':'stub-token', 'enabled':True}
+
+		if method == 'user.get':
+			return self.get_user(0)
+
+		if method == 'user.search':
+			page_size=int(arguments.get('page_size', 10))
+			page=int(arguments.get('page', 1))
+
+			first=(page-1)*page_size
+			last=min(first+page_size, self.users)
+
+			return {'items':[self.get_user(index) for index in range(first, last)], 'total_items':self.users}
+
+		return {'method':method, 'arguments':arguments}
+
+def main(arguments):
+	import argparse
+
+	parser=argparse.ArgumentParser(description='Run a local stand-in for the UserApp API.')
+	parser.add_argument('--port', type=int, default=8080)
+	parser.add_argument('--latency', type=float, default=0.0, help='seconds to wait before each response')
+	parser.add_argument('--users', type=int, default=1000, help='number of users returned by user.search')
+	parser.add_argument('--payload-size', type=int, default=256, help='bytes of padding per user')
+	options=parser.parse_args(arguments)
+
+	stub=StubServer(options.port, options.latency, options.users, options.payload_size)
+	print('Serving the stub UserApp API on {a}'.format(a=stub.base_address))
+
+	try:
+		stub.server.serve_forever()
+	except KeyboardInterrupt:
+		pass
+
+	return 0
+
+if __name__ == '__main__':
+	sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,222 @@
+import os
+import sys
+import shutil
+import hashlib
+import urllib2
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from stub_server import StubServer
+
+from userapp.cli.cache import ResponseCache
+from userapp.cli.cache import TemplateCache
+from userapp.cli.core import ServiceLocator
+
+class ResponseCacheTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.cache=ResponseCache(self.directory)
+		self.scope=ResponseCache.get_scope('a@x', 'app1')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, True)
+
+	def put(self, service, parameters, result, ttl=300, max_size=1024*1024):
+		key=ResponseCache.get_key(service, 'get', parameters)
+		self.cache.put(self.scope, service, key, result, ttl, max_size)
+		return key
+
+	def test_key_ignores_parameter_order(self):
+		self.assertEqual(
+			ResponseCache.get_key('user', 'get', {'user_id':'u1', 'fields':'*'}),
+			ResponseCache.get_key('user', 'get', {'fields':'*', 'user_id':'u1'})
+		)
+
+	def test_key_depends_on_method_and_parameters(self):
+		keys=set([
+			ResponseCache.get_key('user', 'get', {'user_id':'u1'}),
+			ResponseCache.get_key('user', 'get', {'user_id':'u2'}),
+			ResponseCache.get_key('user', 'search', {'user_id':'u1'}),
+			ResponseCache.get_key('user', 'get', None)
+		])
+
+		self.assertEqual(len(keys), 4)
+		self.assertEqual(ResponseCache.get_key('user', 'get', None), ResponseCache.get_key('user', 'get', {}))
+
+	def test_scope_depends_on_login_and_app(self):
+		self.assertNotEqual(ResponseCache.get_scope('a@x', 'app1'), ResponseCache.get_scope('a@x', 'app2'))
+		self.assertNotEqual(ResponseCache.get_scope('a@x', 'app1'), ResponseCache.get_scope('b@x', 'app1'))
+
+	def test_put_and_get(self):
+		key=self.put('user', {'user_id':'u1'}, {'user_id':'u1', 'login':'l1'})
+
+		self.assertEqual(self.cache.get(self.scope, 'user', key), {'user_id':'u1', 'login':'l1'})
+		self.assertEqual(self.cache.get(ResponseCache.get_scope('b@x', 'app1'), 'user', key), None)
+
+	def test_expired_entry_is_a_miss_and_removed(self):
+		key=self.put('user', {'user_id':'u1'}, {'user_id':'u1'}, ttl=-1)
+
+		self.assertEqual(self.cache.get(self.scope, 'user', key), None)
+		self.assertFalse(os.path.exists(self.cache.get_path(self.scope, 'user', key)))
+
+	def test_evicts_least_recently_used(self):
+		keys=[self.put('user', {'user_id':'u{i}'.format(i=index)}, {'payload':'x'*100}) for index in range(3)]
+		paths=[self.cache.get_path(self.scope, 'user', key) for key in keys]
+
+		# u0 is the oldest entry but was read last
+		for (index, path) in enumerate(paths):
+			os.utime(path, (1000+index, 1000+index))
+
+		self.assertNotEqual(self.cache.get(self.scope, 'user', keys[0]), None)
+
+		self.cache.evict(sum([os.path.getsize(path) for path in paths])-1)
+
+		self.assertTrue(os.path.exists(paths[0]))
+		self.assertFalse(os.path.exists(paths[1]))
+		self.assertTrue(os.path.exists(paths[2]))
+
+	def test_invalidate_removes_the_root_service_only(self):
+		user_key=self.put('user', {'user_id':'u1'}, {'user_id':'u1'})
+		plan_key=self.put('price_list.plan', {'plan_id':'p1'}, {'plan_id':'p1'})
+		app_key=self.put('app', None, {'app_id':'app1'})
+
+		self.cache.invalidate(self.scope, 'price_list')
+		self.cache.invalidate(self.scope, 'user')
+
+		self.assertEqual(self.cache.get(self.scope, 'user', user_key), None)
+		self.assertEqual(self.cache.get(self.scope, 'price_list.plan', plan_key), None)
+		self.assertEqual(self.cache.get(self.scope, 'app', app_key), {'app_id':'app1'})
+
+	def test_mutating_methods(self):
+		# The mutating methods of the UserApp API (v1)
+		for method in ['save', 'remove', 'changePassword', 'resetPassword', 'verifyEmail', 'lock', 'unlock', 'setPassword', 'reset_password']:
+			self.assertTrue(ResponseCache.is_mutating(method), method)
+
+		for method in ['get', 'search', 'count', 'hasFeature', 'hasPermission', 'heartbeat', 'getAccessToken', 'getAuthorizationUrl', 'login']:
+			self.assertFalse(ResponseCache.is_mutating(method), method)
+
+class CallCacheTest(unittest.TestCase):
+	"""
+	The response cache as used by 'call'.
+	"""
+	class Client(object):
+		def __init__(self):
+			self.calls=[]
+
+		def call(self, version, service, method, parameters):
+			self.calls.append(service + '.' + method)
+			return {'service':service + '.' + method}
+
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.cache=ResponseCache(self.directory)
+		self.profile={
+			'user':{'login':'a@x', 'app_id':'app1'},
+			'cache':{'cache_enabled':True, 'cache_ttl':300, 'cache_max_size':1024*1024, 'cache_methods':'user.get'}
+		}
+
+		ServiceLocator._instance=None
+		ServiceLocator.get_instance().register('response_cache', self.cache)
+
+	def tearDown(self):
+		ServiceLocator._instance=None
+		shutil.rmtree(self.directory, True)
+
+	def call(self, arguments):
+		from userapp.cli.commands.call import UserAppApiCallCommand
+
+		client=CallCacheTest.Client()
+		result=UserAppApiCallCommand(arguments).call_cached(client, self.profile)
+
+		return (result, client.calls)
+
+	def test_read_is_cached(self):
+		self.assertEqual(self.call(['user.get', 'user_id=u1'])[1], ['user.get'])
+		self.assertEqual(self.call(['user.get', 'user_id=u1'])[1], [])
+		self.assertEqual(self.call(['user.get', 'user_id=u1', '--no-cache'])[1], ['user.get'])
+		self.assertEqual(self.call(['user.get', 'user_id=u1', '--refresh'])[1], ['user.get'])
+
+	def test_mutation_invalidates_the_service(self):
+		for arguments in [['user.changePassword'], ['user.save', '--no-cache'], ['user.verifyEmail']]:
+			self.call(['user.get', 'user_id=u1'])
+			self.call(arguments)
+
+			self.assertEqual(self.call(['user.get', 'user_id=u1'])[1], ['user.get'], arguments)
+
+	def test_mutation_invalidates_while_the_cache_is_disabled(self):
+		self.call(['user.get', 'user_id=u1'])
+
+		self.profile['cache']['cache_enabled']=False
+		self.call(['user.remove', 'user_id=u1'])
+		self.profile['cache']['cache_enabled']=True
+
+		self.assertEqual(self.call(['user.get', 'user_id=u1'])[1], ['user.get'])
+
+class TemplateCacheTest(unittest.TestCase):
+	"""
+	Revalidating cached archives, against a server that ignores conditional requests.
+	"""
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.cache=TemplateCache(os.path.join(self.directory, 'templates'))
+
+		self.stub=StubServer().start()
+		self.url='http://{a}/templates/archive.zip'.format(a=self.stub.base_address)
+		self.stub.serve_file('/templates/archive.zip', 'archive')
+
+	def tearDown(self):
+		self.stub.stop()
+		shutil.rmtree(self.directory, True)
+
+	def store(self, content, etag=None, last_modified=None):
+		temp_path=os.path.join(self.directory, 'archive.zip.part')
+
+		with open(temp_path, 'wb') as handle:
+			handle.write(content)
+
+		return self.cache.store(self.url, temp_path, {
+			'sha256':hashlib.sha256(content).hexdigest(),
+			'size':len(content),
+			'etag':etag,
+			'last_modified':last_modified
+		})
+
+	def get_etag(self):
+		request=urllib2.Request(self.url)
+		request.get_method=lambda: 'HEAD'
+
+		return urllib2.urlopen(request).info().getheader('ETag')
+
+	def test_unchanged_etag(self):
+		path=self.store('archive', self.get_etag())
+
+		self.assertEqual(self.cache.get_current_path(self.url), path)
+		self.assertEqual(self.stub.file_requests[-1][0], 'HEAD')
+
+	def test_changed_etag(self):
+		self.store('archive', self.get_etag())
+		self.stub.serve_file('/templates/archive.zip', 'changed archive')
+
+		self.assertEqual(self.cache.get_current_path(self.url), None)
+
+	def test_without_validators(self):
+		# Neither an ETag nor a Last-Modified to compare: downloaded again
+		self.store('archive')
+		self.assertEqual(self.cache.get_current_path(self.url), None)
+
+	def test_unreachable_server(self):
+		path=self.store('archive', self.get_etag())
+		self.stub.stop()
+
+		self.assertEqual(self.cache.get_current_path(self.url), path)
+
+	def test_offline(self):
+		self.assertRaises(IOError, self.cache.get_current_path, self.url, True)
+
+		path=self.store('archive', '"other"')
+		self.assertEqual(self.cache.get_current_path(self.url, True), path)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,114 @@
+import os
+import sys
+import json
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from userapp.cli.core import ServiceLocator
+
+class BatchCallTest(unittest.TestCase):
+	"""
+	'call --batch', against a fake client.
+	"""
+	class Client(object):
+		def call(self, version, service, method, parameters):
+			if method == 'fail':
+				raise ValueError('Method failed.')
+
+			return {'method':service + '.' + method, 'params':parameters}
+
+	class ClientPool(object):
+		def create_client(self, profile, connections=None):
+			return BatchCallTest.Client()
+
+	class FailingInput(object):
+		"""
+		Stands in for stdin when it fails after some lines, e.g. on a read error.
+		"""
+		def __init__(self, lines):
+			self.lines=lines
+
+		def __iter__(self):
+			for line in self.lines:
+				yield line
+
+			raise IOError('Input/output error')
+
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.profile={'user':{'login':'a@x', 'app_id':'app1', 'token':'tok'}}
+
+		ServiceLocator._instance=None
+		ServiceLocator.get_instance().register('client_pool', BatchCallTest.ClientPool())
+
+		(self.stdout, self.stderr, self.stdin)=(sys.stdout, sys.stderr, sys.stdin)
+		(sys.stdout, sys.stderr)=(StringIO(), StringIO())
+
+	def tearDown(self):
+		(sys.stdout, sys.stderr, sys.stdin)=(self.stdout, self.stderr, self.stdin)
+		ServiceLocator._instance=None
+		shutil.rmtree(self.directory, True)
+
+	def batch(self, source, engine='sync'):
+		from userapp.cli.commands.call import UserAppApiCallCommand
+
+		command=UserAppApiCallCommand(['--batch', source, '--engine', engine, '--concurrency', '4'])
+		status=command.execute_batch(self.profile, source)
+
+		return (status, [json.loads(line) for line in sys.stdout.getvalue().splitlines()])
+
+	def write_file(self, lines):
+		path=os.path.join(self.directory, 'batch.jsonl')
+
+		with open(path, 'w') as handle:
+			handle.write(''.join([line + '\n' for line in lines]))
+
+		return path
+
+	def test_ordered_batch_with_a_bad_line(self):
+		path=self.write_file([
+			'{"service":"user", "method":"get", "params":{"user_id":"u1"}}',
+			'{"service":"user", "method":',
+			'',
+			'{"service":"user", "method":"fail"}',
+			'{"service":"user", "method":"get", "params":{"user_id":"u2"}}'
+		])
+
+		(status, outputs)=self.batch(path)
+
+		# One output line per non-blank input line, in order
+		self.assertEqual([output['index'] for output in outputs], [0, 1, 2, 3])
+
+		self.assertEqual(status, 1)
+		self.assertEqual(outputs[0]['result'], {'method':'user.get', 'params':{'user_id':'u1'}})
+		self.assertTrue('error' in outputs[1])
+		self.assertEqual(outputs[2]['error']['message'], 'Method failed.')
+		self.assertEqual(outputs[3]['result'], {'method':'user.get', 'params':{'user_id':'u2'}})
+
+	def test_successful_batch(self):
+		path=self.write_file([json.dumps({'service':'user', 'method':'get', 'params':{'user_id':'u{i}'.format(i=index)}}) for index in range(20)])
+
+		(status, outputs)=self.batch(path, 'concurrent')
+		outputs.sort(key=lambda output: output['index'])
+
+		self.assertEqual(status, None)
+		self.assertEqual([output['result']['params']['user_id'] for output in outputs], ['u{i}'.format(i=index) for index in range(20)])
+
+	def test_input_failing_partway(self):
+		sys.stdin=BatchCallTest.FailingInput(['{"service":"user", "method":"get"}\n']*3)
+
+		for engine in ['sync', 'concurrent']:
+			sys.stdout.truncate(0)
+			sys.stderr.truncate(0)
+
+			(status, outputs)=self.batch('-', engine)
+
+			# The lines read before are executed, the failure is reported
+			self.assertEqual(status, 1, engine)
+			self.assertEqual(sorted([output['index'] for output in outputs]), [0, 1, 2])
+			self.assertTrue(sys.stderr.getvalue().startswith("(error) Unable to read batch file '-': Input/output error"), sys.stderr.getvalue())
+
+if __name__ == '__main__':
+	unittest.main()
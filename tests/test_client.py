@@ -0,0 +1,104 @@
+import os
+import sys
+import unittest
+
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from stub_server import StubServer
+
+from userapp.cli.client import ClientPool
+from userapp.cli.core import ServiceLocator
+from userapp.cli.concurrency import WorkerPool
+
+def make_profile(login, base_address, secure=False):
+	return {
+		'user':{'login':login, 'app_id':'app1', 'token':'tok'},
+		'server':{'base_address':base_address, 'secure':secure, 'debug':False}
+	}
+
+class ClientPoolTest(unittest.TestCase):
+	class Session(requests.Session):
+		"""
+		Records which sessions were closed.
+		"""
+		closed=[]
+
+		def close(self):
+			ClientPoolTest.Session.closed.append(self)
+			super(ClientPoolTest.Session, self).close()
+
+	def setUp(self):
+		ServiceLocator._instance=None
+		ClientPoolTest.Session.closed=[]
+
+		self.session_class=requests.Session
+		requests.Session=ClientPoolTest.Session
+
+		self.pool=ClientPool()
+
+	def tearDown(self):
+		requests.Session=self.session_class
+		self.pool.invalidate()
+		ServiceLocator._instance=None
+
+	def get_session(self, profile):
+		return self.pool.get_transport(profile)[0].session
+
+	def test_reuses_the_session_of_a_profile(self):
+		profile=make_profile('a@x', '127.0.0.1:1')
+
+		(transport, reuses)=self.pool.get_transport(profile)
+		self.assertEqual(reuses, 0)
+
+		self.assertEqual(self.pool.get_transport(profile), (transport, 1))
+		self.assertEqual(self.pool.get_transport(make_profile('a@x', '127.0.0.1:1')), (transport, 2))
+
+	def test_targets_of_a_login_have_sessions_of_their_own(self):
+		profiles=[make_profile('a@x', '127.0.0.1:1'), make_profile('a@x', '127.0.0.1:2'), make_profile('a@x', '127.0.0.1:1', True)]
+
+		# Alternating between them, as a fan-out does
+		sessions=[self.get_session(profile) for profile in profiles]
+		sessions_again=[self.get_session(profile) for profile in profiles]
+
+		self.assertEqual(len(set(sessions)), 3)
+		self.assertEqual(sessions, sessions_again)
+		self.assertEqual(ClientPoolTest.Session.closed, [])
+
+		self.assertTrue(self.pool.get_scheduler(profiles[0]) is not self.pool.get_scheduler(profiles[1]))
+
+	def test_invalidate_closes_every_target_of_the_login(self):
+		profile=make_profile('a@x', '127.0.0.1:1')
+		sessions=[self.get_session(profile), self.get_session(make_profile('a@x', '127.0.0.1:2'))]
+		other=self.get_session(make_profile('b@x', '127.0.0.1:1'))
+
+		# After 'config set base_address', the profile already has its new target
+		profile['server']['base_address']='127.0.0.1:3'
+		self.pool.invalidate(profile)
+
+		self.assertEqual(sorted(ClientPoolTest.Session.closed), sorted(sessions))
+		self.assertTrue(self.get_session(make_profile('a@x', '127.0.0.1:1')) not in sessions)
+		self.assertTrue(self.get_session(make_profile('b@x', '127.0.0.1:1')) is other)
+
+	def test_fan_out_over_targets(self):
+		stubs=[StubServer().start() for index in range(2)]
+
+		try:
+			profiles=[make_profile('a@x', stub.base_address) for stub in stubs]
+
+			def call(index):
+				client=self.pool.create_client(profiles[index % 2])
+				return client.call(1, 'user', 'get', {'user_id':'user0'})['user_id']
+
+			results=list(WorkerPool(8).imap_unordered(call, range(40)))
+
+			self.assertEqual([error for (index, result, error) in results if error is not None], [])
+			self.assertEqual([stub.reset_counts().get('user.get') for stub in stubs], [20, 20])
+			self.assertEqual(ClientPoolTest.Session.closed, [])
+		finally:
+			for stub in stubs:
+				stub.stop()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,59 @@
+import time
+import unittest
+
+from userapp.cli.concurrency import WorkerPool
+
+def failing_input(count):
+	"""
+	Yields count items, then fails like a file that can't be read any further.
+	"""
+	for index in range(count):
+		yield index
+
+	raise IOError('Input/output error')
+
+def slow_square(item):
+	time.sleep(0.01)
+	return item*item
+
+class WorkerPoolTest(unittest.TestCase):
+	def test_imap_unordered(self):
+		results=list(WorkerPool(4).imap_unordered(slow_square, range(20)))
+
+		self.assertEqual(sorted(results), [(index, index*index, None) for index in range(20)])
+
+	def test_imap_keeps_the_order(self):
+		results=list(WorkerPool(4).imap(slow_square, range(20)))
+
+		self.assertEqual(results, [(index, index*index, None) for index in range(20)])
+
+	def test_errors_of_the_function_are_yielded(self):
+		def function(item):
+			if item == 3:
+				raise ValueError('bad item')
+
+			return item
+
+		for imap in [WorkerPool(4).imap_unordered, WorkerPool(4).imap]:
+			results=sorted(imap(function, range(5)))
+
+			self.assertEqual([(index, result) for (index, result, error) in results], [(0, 0), (1, 1), (2, 2), (3, None), (4, 4)])
+			self.assertTrue(isinstance(results[3][2], ValueError))
+
+	def test_input_errors_are_raised_after_the_items_read_before(self):
+		for imap in [WorkerPool(4).imap_unordered, WorkerPool(4).imap]:
+			results=[]
+
+			def consume():
+				for result in imap(slow_square, failing_input(10)):
+					results.append(result)
+
+			self.assertRaises(IOError, consume)
+			self.assertEqual(sorted(results), [(index, index*index, None) for index in range(10)])
+
+	def test_input_error_before_any_item(self):
+		for imap in [WorkerPool(4).imap_unordered, WorkerPool(4).imap]:
+			self.assertRaises(IOError, list, imap(slow_square, failing_input(0)))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,148 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from userapp.cli.core import Configuration
+
+class ConfigurationTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.file_path=os.path.join(self.directory, 'config.json')
+
+		config=Configuration(file_path=self.file_path)
+		config.get_profile('a@x')['user']['app_id']='app1'
+		config.get_profile('b@x')['user']['app_id']='app2'
+		config.save()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, True)
+
+	def load(self):
+		config=Configuration(file_path=self.file_path)
+		config.load()
+		return config
+
+	def read_file(self):
+		with open(self.file_path, 'r') as handle:
+			return json.load(handle)['profiles']
+
+	def test_reloads_when_the_file_changed(self):
+		config=self.load()
+		other=self.load()
+
+		other.get_profile('c@x')['user']['app_id']='app3'
+		other.save()
+
+		config.load()
+		self.assertEqual(config.get_profile_names(), ['a@x', 'b@x', 'c@x'])
+
+	def test_skips_reading_an_unchanged_file(self):
+		# Whole seconds, so that setting the modification time back restores it exactly
+		os.utime(self.file_path, (1000000, 1000000))
+
+		config=self.load()
+		stat=os.stat(self.file_path)
+
+		# Same size and modification time: not read again
+		with open(self.file_path, 'r') as handle:
+			content=handle.read()
+
+		with open(self.file_path, 'w') as handle:
+			handle.write(content.replace('app1', 'appX'))
+
+		os.utime(self.file_path, (stat.st_atime, stat.st_mtime))
+
+		config.load()
+		self.assertEqual(config.get_profile('a@x')['user']['app_id'], 'app1')
+
+		os.utime(self.file_path, (stat.st_atime, stat.st_mtime+1))
+
+		config.load()
+		self.assertEqual(config.get_profile('a@x')['user']['app_id'], 'appX')
+
+	def test_save_keeps_profiles_changed_on_disk(self):
+		config=self.load()
+		other=self.load()
+
+		other.get_profile('b@x')['user']['app_id']='app2-other'
+		other.get_profile('c@x')['user']['app_id']='app3'
+		other.save()
+
+		# Make sure the change is visible through the stat key
+		stat=os.stat(self.file_path)
+		os.utime(self.file_path, (stat.st_atime, stat.st_mtime+1))
+
+		profile_b=config.get_profile('b@x')
+		config.get_profile('a@x')['user']['app_id']='app1-mine'
+		config.save()
+
+		profiles=self.read_file()
+		self.assertEqual(profiles['a@x']['user']['app_id'], 'app1-mine')
+		self.assertEqual(profiles['b@x']['user']['app_id'], 'app2-other')
+		self.assertEqual(profiles['c@x']['user']['app_id'], 'app3')
+
+		# The merged profiles are also updated in memory, in place
+		self.assertEqual(profile_b['user']['app_id'], 'app2-other')
+		self.assertEqual(config.get_profile('c@x')['user']['app_id'], 'app3')
+
+	def test_save_overrides_profiles_changed_in_both(self):
+		config=self.load()
+		other=self.load()
+
+		other.get_profile('a@x')['user']['app_id']='app1-other'
+		other.save()
+
+		stat=os.stat(self.file_path)
+		os.utime(self.file_path, (stat.st_atime, stat.st_mtime+1))
+
+		config.get_profile('a@x')['user']['app_id']='app1-mine'
+		config.save()
+
+		self.assertEqual(self.read_file()['a@x']['user']['app_id'], 'app1-mine')
+
+	def test_deferred_saves_write_once_at_the_end(self):
+		config=self.load()
+		stat_key=config.get_stat_key()
+
+		with config.deferred_saves():
+			config.get_profile('a@x')['user']['app_id']='app1-first'
+			config.save()
+
+			with config.deferred_saves():
+				config.get_profile('a@x')['user']['app_id']='app1-second'
+				config.save()
+
+			self.assertEqual(config.get_stat_key(), stat_key)
+			self.assertEqual(self.read_file()['a@x']['user']['app_id'], 'app1')
+
+		self.assertEqual(self.read_file()['a@x']['user']['app_id'], 'app1-second')
+
+	def test_deferred_save_merges_profiles_changed_on_disk(self):
+		config=self.load()
+		other=self.load()
+
+		with config.deferred_saves():
+			config.get_profile('a@x')['user']['app_id']='app1-mine'
+			config.save()
+
+			other.get_profile('c@x')['user']['app_id']='app3'
+			other.save()
+
+			stat=os.stat(self.file_path)
+			os.utime(self.file_path, (stat.st_atime, stat.st_mtime+1))
+
+		profiles=self.read_file()
+		self.assertEqual(profiles['a@x']['user']['app_id'], 'app1-mine')
+		self.assertEqual(profiles['c@x']['user']['app_id'], 'app3')
+
+	def test_unchanged_profiles_are_not_written(self):
+		config=self.load()
+		os.unlink(self.file_path)
+
+		config.save()
+		self.assertFalse(os.path.exists(self.file_path))
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,191 @@
+import os
+import sys
+import shutil
+import hashlib
+import zipfile
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'benchmarks'))
+
+from stub_server import StubServer
+
+from userapp.cli.core import ServiceLocator
+from userapp.cli.helper import FileHelper
+from userapp.cli.download import ArchiveDownload
+from userapp.cli.download import DownloadProgress
+
+def make_archive(path, members):
+	with zipfile.ZipFile(path, 'w', zipfile.ZIP_STORED) as archive:
+		for (name, data) in members:
+			archive.writestr(name, data)
+
+	with open(path, 'rb') as handle:
+		return handle.read()
+
+class CancellingProgress(DownloadProgress):
+	"""
+	Cancels the download once received bytes have arrived, like Ctrl-C would.
+	"""
+	def __init__(self, received):
+		DownloadProgress.__init__(self, interval=3600)
+		self.received=received
+
+	def update(self, url, received, size):
+		if received >= self.received:
+			self.cancel()
+
+class ArchiveDownloadTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.target_dir=os.path.join(self.directory, 'target')
+		self.part_path=os.path.join(self.directory, 'archive.zip.part')
+
+		self.stub=StubServer().start()
+		self.url='http://{a}/templates/archive.zip'.format(a=self.stub.base_address)
+
+		self.members=[('app/part{i}.bin'.format(i=index), os.urandom(100*1024)) for index in range(8)]
+		self.serve(self.members)
+
+	def tearDown(self):
+		self.stub.stop()
+		shutil.rmtree(self.directory, True)
+
+	def serve(self, members):
+		self.content=make_archive(os.path.join(self.directory, 'source.zip'), members)
+		self.stub.serve_file('/templates/archive.zip', self.content)
+
+	def download(self, progress=None):
+		return ArchiveDownload(self.url, self.part_path, self.target_dir, progress).run()
+
+	def interrupt(self, received):
+		self.assertRaises(IOError, self.download, CancellingProgress(received))
+
+	def assertExtracted(self, members):
+		for (name, data) in members:
+			with open(os.path.join(self.target_dir, name), 'rb') as handle:
+				self.assertEqual(handle.read(), data, name)
+
+	def get_ranges(self):
+		return [(range_spec, if_range) for (command, path, range_spec, if_range) in self.stub.file_requests]
+
+	def test_downloads_the_tail_then_the_body(self):
+		state=self.download()
+
+		self.assertExtracted(self.members)
+		self.assertEqual(state['sha256'], hashlib.sha256(self.content).hexdigest())
+		self.assertEqual(state['size'], len(self.content))
+		self.assertFalse(os.path.exists(self.part_path + '.json'))
+
+		tail_start=len(self.content)-ArchiveDownload.TAIL_SIZE
+
+		self.assertEqual(self.get_ranges(), [
+			('bytes=-{n}'.format(n=ArchiveDownload.TAIL_SIZE), None),
+			('bytes=0-{l}'.format(l=tail_start-1), state['etag'])
+		])
+
+	def test_resumes_an_interrupted_download(self):
+		self.interrupt(300*1024)
+
+		# The members that were complete have already been extracted
+		self.assertExtracted(self.members[:1])
+		self.assertTrue(os.path.exists(self.part_path + '.json'))
+
+		state=self.download()
+
+		self.assertExtracted(self.members)
+		self.assertEqual(state['sha256'], hashlib.sha256(self.content).hexdigest())
+
+		(range_spec, if_range)=self.get_ranges()[-1]
+		first=int(range_spec[len('bytes='):].split('-')[0])
+
+		self.assertTrue(first > 0, range_spec)
+		self.assertEqual(if_range, state['etag'])
+		self.assertEqual(len(self.stub.file_requests), 3)
+
+	def test_restarts_when_the_archive_changed(self):
+		self.interrupt(300*1024)
+
+		# Same names, other content: If-Range doesn't match and the whole archive is sent
+		members=[(name, os.urandom(100*1024)) for (name, data) in self.members]
+		self.serve(members)
+
+		state=self.download()
+
+		self.assertExtracted(members)
+		self.assertEqual(state['sha256'], hashlib.sha256(self.content).hexdigest())
+		self.assertEqual(len(self.stub.file_requests), 3)
+
+	def test_reads_servers_without_ranges_from_start_to_end(self):
+		self.stub.ranges=False
+
+		state=self.download()
+
+		self.assertExtracted(self.members)
+		self.assertEqual(state['sha256'], hashlib.sha256(self.content).hexdigest())
+		self.assertEqual(len(self.stub.file_requests), 1)
+
+	def test_central_directory_beyond_the_tail(self):
+		# Long names make a central directory larger than the tail
+		members=[('app/{n}/file{i}.txt'.format(n='x'*100, i=index), 'content {i}'.format(i=index)) for index in range(1000)]
+		members.append(('app/large.bin', os.urandom(512*1024)))
+		self.serve(members)
+
+		opened=[]
+		original=zipfile.ZipFile
+
+		class ZipFile(original):
+			def __init__(self, *arguments, **options):
+				opened.append(arguments[0])
+				original.__init__(self, *arguments, **options)
+
+		zipfile.ZipFile=ZipFile
+
+		try:
+			self.download()
+		finally:
+			zipfile.ZipFile=original
+
+		self.assertExtracted(members)
+
+		# Opened once the body is complete, not after every chunk
+		self.assertEqual(opened.count(self.part_path), 1)
+
+	def test_invalid_archive(self):
+		self.stub.serve_file('/templates/archive.zip', os.urandom(200*1024))
+
+		self.assertRaises(zipfile.BadZipfile, self.download)
+		self.assertFalse(os.path.exists(self.part_path))
+
+class UnzipUrlTest(unittest.TestCase):
+	def setUp(self):
+		ServiceLocator._instance=None
+		self.directory=tempfile.mkdtemp()
+		self.stub=StubServer().start()
+
+	def tearDown(self):
+		self.stub.stop()
+		ServiceLocator._instance=None
+		shutil.rmtree(self.directory, True)
+
+	def unzip(self, url):
+		return FileHelper.unzip_url(url, os.path.join(self.directory, 'target'))
+
+	def test_missing_archive(self):
+		self.assertEqual(self.unzip('http://{a}/missing.zip'.format(a=self.stub.base_address)), 'invalid_url')
+
+	def test_unreachable_server(self):
+		address=self.stub.base_address
+		self.stub.stop()
+
+		(error, reason)=self.unzip('http://{a}/archive.zip'.format(a=address))
+
+		self.assertEqual(error, 'download_failed')
+		self.assertTrue('refused' in reason, reason)
+
+	def test_invalid_archive(self):
+		self.stub.serve_file('/archive.zip', os.urandom(1024))
+		self.assertEqual(self.unzip('http://{a}/archive.zip'.format(a=self.stub.base_address)), 'invalid_zip')
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,116 @@
+import os
+import sys
+import shutil
+import tempfile
+import unittest
+from StringIO import StringIO
+
+from userapp.cli.core import ServiceLocator
+from userapp.cli.scheduler import RequestScheduler
+
+class ImportTest(unittest.TestCase):
+	"""
+	'import users', against a fake client.
+	"""
+	class Client(object):
+		def __init__(self):
+			self.saved=[]
+
+		def call(self, version, service, method, parameters):
+			self.saved.append(parameters['login'])
+			return parameters
+
+	class ClientPool(object):
+		def __init__(self):
+			self.client=ImportTest.Client()
+			self.scheduler=RequestScheduler()
+
+		def create_client(self, profile, connections=None):
+			return self.client
+
+		def get_scheduler(self, profile):
+			return self.scheduler
+
+	class Config(object):
+		def get_selected_profile(self):
+			return {'user':{'login':'a@x', 'app_id':'app1', 'token':'tok'}}
+
+	class FailingInput(object):
+		"""
+		Stands in for stdin when it fails after some lines, e.g. on a read error.
+		"""
+		def __init__(self, lines):
+			self.lines=lines
+
+		def __iter__(self):
+			for line in self.lines:
+				yield line
+
+			raise IOError('Input/output error')
+
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.client_pool=ImportTest.ClientPool()
+
+		ServiceLocator._instance=None
+		ServiceLocator.get_instance().register('config', ImportTest.Config())
+		ServiceLocator.get_instance().register('client_pool', self.client_pool)
+
+		(self.stdout, self.stderr, self.stdin)=(sys.stdout, sys.stderr, sys.stdin)
+		(sys.stdout, sys.stderr)=(StringIO(), StringIO())
+
+	def tearDown(self):
+		(sys.stdout, sys.stderr, sys.stdin)=(self.stdout, self.stderr, self.stdin)
+		ServiceLocator._instance=None
+		shutil.rmtree(self.directory, True)
+
+	def run_import(self, arguments):
+		from userapp.cli.commands.imports import ImportCommand
+
+		return ImportCommand(['users']+arguments+['--rate', '1000']).execute()
+
+	def write_file(self, name, content):
+		path=os.path.join(self.directory, name)
+
+		with open(path, 'wb') as handle:
+			handle.write(content)
+
+		return path
+
+	def read_file(self, name):
+		with open(os.path.join(self.directory, name), 'rb') as handle:
+			return handle.read()
+
+	def test_csv(self):
+		path=self.write_file('users.csv', 'login,email\nu1,u1@x\nu2,u2@x\n')
+
+		self.assertEqual(self.run_import([path]), None)
+		self.assertEqual(sorted(self.client_pool.client.saved), ['u1', 'u2'])
+		self.assertTrue('Imported 2 users, 0 failed' in sys.stdout.getvalue())
+
+	def test_corrupt_csv_row(self):
+		path=self.write_file('users.csv', 'login,email\nu1,u1@x\nu2,u2@x\nu3\0,u3@x\nu4,u4@x\n')
+
+		self.assertEqual(self.run_import([path]), 1)
+
+		# The corrupt row fails on its own, the rows after it are still imported
+		self.assertEqual(sorted(self.client_pool.client.saved), ['u1', 'u2', 'u4'])
+		self.assertTrue('Imported 3 users, 1 failed' in sys.stdout.getvalue(), sys.stdout.getvalue())
+		self.assertTrue('Line 4: Invalid CSV' in self.read_file('users.failures.csv'))
+
+	def test_invalid_rows(self):
+		path=self.write_file('users.jsonl', '{"login":"u1"}\n{"login":\n{"email":"u3@x"}\n')
+
+		self.assertEqual(self.run_import([path]), 1)
+		self.assertEqual(self.client_pool.client.saved, ['u1'])
+		self.assertEqual(len(self.read_file('users.failures.jsonl').splitlines()), 2)
+
+	def test_input_failing_partway(self):
+		sys.stdin=ImportTest.FailingInput(['{{"login":"u{i}"}}\n'.format(i=index) for index in range(3)])
+
+		self.assertEqual(self.run_import(['-', '--format', 'jsonl']), 1)
+		self.assertEqual(sorted(self.client_pool.client.saved), ['u0', 'u1', 'u2'])
+		self.assertTrue("(error) The import stopped before the end of '-': Input/output error" in sys.stdout.getvalue(), sys.stdout.getvalue())
+
+if __name__ == '__main__':
+	unittest.main()
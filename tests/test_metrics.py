@@ -0,0 +1,225 @@
+import os
+import errno
+import fcntl
+import shutil
+import socket
+import tempfile
+import threading
+import unittest
+
+from userapp.cli.metrics import Metrics
+from userapp.cli.metrics import StatsdExporter
+from userapp.cli.metrics import PrometheusTextfileExporter
+
+class PrometheusTextfileExporterTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+		self.file_path=os.path.join(self.directory, 'userapp.prom')
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, True)
+
+	def read_file(self):
+		with open(self.file_path, 'r') as handle:
+			return handle.read().splitlines()
+
+	def get_samples(self):
+		return PrometheusTextfileExporter(self.file_path).read()[0]
+
+	def test_counters_and_histograms(self):
+		exporter=PrometheusTextfileExporter(self.file_path)
+		exporter.increment('requests', 1, {'method':'user.get', 'result':'ok'})
+		exporter.increment('requests', 2, {'method':'user.get', 'result':'ok'})
+		exporter.observe('request_duration', 0.03, {'method':'user.get'})
+		exporter.flush()
+
+		lines=self.read_file()
+
+		self.assertTrue('# TYPE userapp_cli_requests_total counter' in lines)
+		self.assertTrue('userapp_cli_requests_total{method="user.get",result="ok"} 3' in lines)
+		self.assertTrue('# TYPE userapp_cli_request_duration_seconds histogram' in lines)
+
+		# Cumulative buckets, le last among the labels
+		self.assertTrue('userapp_cli_request_duration_seconds_bucket{method="user.get",le="0.025"} 0' in lines)
+		self.assertTrue('userapp_cli_request_duration_seconds_bucket{method="user.get",le="0.05"} 1' in lines)
+		self.assertTrue('userapp_cli_request_duration_seconds_bucket{method="user.get",le="+Inf"} 1' in lines)
+		self.assertTrue('userapp_cli_request_duration_seconds_sum{method="user.get"} 0.03' in lines)
+		self.assertTrue('userapp_cli_request_duration_seconds_count{method="user.get"} 1' in lines)
+
+		# Buckets in increasing order, after the TYPE line of their family
+		buckets=[line for line in lines if line.startswith('userapp_cli_request_duration_seconds_bucket')]
+		self.assertEqual(len(buckets), len(PrometheusTextfileExporter.BUCKETS)+1)
+		self.assertTrue(buckets[-1].endswith('le="+Inf"} 1'))
+		self.assertTrue(lines.index('# TYPE userapp_cli_request_duration_seconds histogram') < lines.index(buckets[0]))
+
+	def test_processes_add_up(self):
+		for index in range(3):
+			# One exporter per process
+			exporter=PrometheusTextfileExporter(self.file_path)
+			exporter.increment('commands', 1, {'command':'call', 'status':'0'})
+			exporter.observe('command_duration', 2.0, {'command':'call'})
+			exporter.flush()
+
+		exporter=PrometheusTextfileExporter(self.file_path)
+		exporter.increment('commands', 1, {'command':'export', 'status':'1'})
+		exporter.flush()
+
+		samples=self.get_samples()
+
+		self.assertEqual(samples[('userapp_cli_commands_total', (('command', 'call'), ('status', '0')))], 3)
+		self.assertEqual(samples[('userapp_cli_commands_total', (('command', 'export'), ('status', '1')))], 1)
+		self.assertEqual(samples[('userapp_cli_command_duration_seconds_sum', (('command', 'call'),))], 6)
+		self.assertEqual(samples[('userapp_cli_command_duration_seconds_bucket', (('command', 'call'), ('le', '2.5')))], 3)
+		self.assertEqual(samples[('userapp_cli_command_duration_seconds_bucket', (('command', 'call'), ('le', '1')))], 0)
+
+	def test_escaped_labels_are_merged(self):
+		for index in range(2):
+			exporter=PrometheusTextfileExporter(self.file_path)
+			exporter.increment('requests', 1, {'method':'a"b\\c\nd'})
+			exporter.flush()
+
+		self.assertEqual(self.read_file(), [
+			'# TYPE userapp_cli_requests_total counter',
+			'userapp_cli_requests_total{method="a\\"b\\\\c\\nd"} 2'
+		])
+
+	def test_the_file_is_replaced(self):
+		exporter=PrometheusTextfileExporter(self.file_path)
+		exporter.increment('requests', 1, {})
+		exporter.flush()
+
+		# A reader holding the previous file keeps reading it whole
+		with open(self.file_path, 'r') as handle:
+			exporter.increment('requests', 1, {})
+			exporter.flush()
+
+			self.assertEqual(handle.read().splitlines()[-1], 'userapp_cli_requests_total 1')
+
+		self.assertEqual(self.read_file()[-1], 'userapp_cli_requests_total 2')
+		self.assertEqual(sorted(os.listdir(self.directory)), ['userapp.prom', 'userapp.prom.lock'])
+
+	def test_flush_waits_for_the_lock(self):
+		exporter=PrometheusTextfileExporter(self.file_path)
+		exporter.increment('requests', 1, {})
+
+		with open(self.file_path + '.lock', 'a') as lock_handle:
+			fcntl.flock(lock_handle.fileno(), fcntl.LOCK_EX)
+
+			thread=threading.Thread(target=exporter.flush)
+			thread.start()
+			thread.join(0.2)
+
+			self.assertTrue(thread.is_alive())
+			self.assertFalse(os.path.exists(self.file_path))
+
+			fcntl.flock(lock_handle.fileno(), fcntl.LOCK_UN)
+
+		thread.join()
+		self.assertEqual(self.read_file()[-1], 'userapp_cli_requests_total 1')
+
+	def test_nothing_recorded(self):
+		PrometheusTextfileExporter(self.file_path).flush()
+		self.assertFalse(os.path.exists(self.file_path))
+
+class StatsdExporterTest(unittest.TestCase):
+	def setUp(self):
+		self.server=socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+		self.server.bind(('127.0.0.1', 0))
+		self.server.settimeout(1)
+
+		self.exporter=StatsdExporter('127.0.0.1:{p}'.format(p=self.server.getsockname()[1]))
+
+	def tearDown(self):
+		self.server.close()
+
+	def receive(self):
+		"""
+		The packets sent so far.
+		"""
+		packets=[]
+		self.server.settimeout(0.2)
+
+		try:
+			while True:
+				packets.append(self.server.recv(65536))
+		except socket.timeout:
+			pass
+
+		return packets
+
+	def test_counters_and_timers(self):
+		self.exporter.increment('requests', 1, {'method':'user.get', 'result':'ok'})
+		self.exporter.observe('request_duration', 0.0125, {'method':'user.get'})
+		self.exporter.flush()
+
+		self.assertEqual(self.receive(), ['userapp.cli.requests.user.get.ok:1|c\nuserapp.cli.request_duration.user.get:12.500|ms'])
+
+	def test_invalid_characters_are_replaced(self):
+		self.exporter.increment('commands', 1, {'command':'config set', 'status':'0'})
+		self.exporter.flush()
+
+		self.assertEqual(self.receive(), ['userapp.cli.commands.config_set.0:1|c'])
+
+	def test_lines_are_batched_into_packets(self):
+		lines=[]
+
+		for index in range(200):
+			self.exporter.increment('requests', index, {'method':'user.get'})
+			lines.append('userapp.cli.requests.user.get:{i}|c'.format(i=index))
+
+		# Full packets leave as they fill up, the rest on flush
+		sent=self.receive()
+		self.exporter.flush()
+		packets=sent+self.receive()
+
+		self.assertTrue(len(sent) > 0)
+		self.assertTrue(len(packets) < 20)
+		self.assertTrue(max([len(packet) for packet in packets]) <= StatsdExporter.MAX_PACKET_SIZE)
+		self.assertEqual([line for packet in packets for line in packet.split('\n')], lines)
+
+	def test_sends_never_block_or_raise(self):
+		self.exporter.increment('requests', 1, {})
+		self.exporter.flush()
+
+		self.assertEqual(self.exporter.socket.gettimeout(), 0.0)
+
+		class FullSocket(object):
+			def sendto(self, packet, target):
+				raise socket.error(errno.EAGAIN, 'Resource temporarily unavailable')
+
+		# A packet that can't be sent right away is dropped
+		self.exporter.socket=FullSocket()
+		self.exporter.increment('requests', 1, {})
+		self.exporter.flush()
+
+		self.assertEqual(self.exporter.buffer, [])
+
+	def test_default_port(self):
+		exporter=StatsdExporter('localhost')
+		self.assertEqual((exporter.host, exporter.port), ('localhost', 8125))
+
+class MetricsTest(unittest.TestCase):
+	def setUp(self):
+		self.directory=tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.directory, True)
+
+	def test_from_environment(self):
+		self.assertFalse(Metrics.from_environment({}).enabled)
+
+		metrics=Metrics.from_environment({
+			'USERAPP_METRICS_TEXTFILE':os.path.join(self.directory, 'userapp.prom'),
+			'USERAPP_STATSD':'127.0.0.1:9125'
+		})
+
+		self.assertTrue(metrics.enabled)
+		self.assertEqual([exporter.__class__ for exporter in metrics.exporters], [PrometheusTextfileExporter, StatsdExporter])
+
+	def test_export_errors_are_ignored(self):
+		metrics=Metrics([PrometheusTextfileExporter(os.path.join(self.directory, 'missing', 'userapp.prom'))])
+		metrics.increment('requests')
+		metrics.flush()
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,58 @@
+import csv
+import unittest
+from StringIO import StringIO
+
+from userapp.cli.output import CsvResultWriter
+
+class CsvResultWriterTest(unittest.TestCase):
+	def setUp(self):
+		self.stream=StringIO()
+		self.writer=CsvResultWriter(self.stream)
+
+	def read_rows(self):
+		return list(csv.DictReader(StringIO(self.stream.getvalue())))
+
+	def test_columns_are_the_fields_of_all_first_records(self):
+		self.writer.write_items([
+			{'user_id':'u1', 'login':'l1'},
+			{'user_id':'u2', 'login':'l2', 'properties':{'age':30}},
+			{'user_id':'u3', 'email':'u3@x'}
+		])
+
+		self.assertEqual(self.writer.columns, ['email', 'login', 'properties', 'user_id'])
+		self.assertEqual(self.read_rows(), [
+			{'user_id':'u1', 'login':'l1', 'properties':'', 'email':''},
+			{'user_id':'u2', 'login':'l2', 'properties':'{"age":30}', 'email':''},
+			{'user_id':'u3', 'login':'', 'properties':'', 'email':'u3@x'}
+		])
+
+	def test_later_pages_with_other_fields_fail(self):
+		self.writer.write_items([{'user_id':'u1', 'login':'l1'}])
+		self.writer.write_items([{'user_id':'u2', 'login':'l2'}])
+
+		self.assertRaises(ValueError, self.writer.write_items, [{'user_id':'u3', 'properties':{}}])
+		self.assertEqual([row['user_id'] for row in self.read_rows()], ['u1', 'u2'])
+
+	def test_fields_beyond_the_records_read_ahead_fail(self):
+		records=[{'user_id':'u{i}'.format(i=index)} for index in range(CsvResultWriter.HEADER_RECORDS)]
+		records.append({'user_id':'last', 'login':'l'})
+
+		self.assertRaises(ValueError, self.writer.write_items, iter(records))
+
+	def test_resume_keeps_the_columns(self):
+		self.writer.resume(['login', 'user_id'])
+		self.writer.write_items([{'user_id':'u1'}])
+
+		self.assertEqual(self.stream.getvalue(), ',u1\r\n')
+		self.assertRaises(ValueError, self.writer.write_items, [{'user_id':'u2', 'email':'u2@x'}])
+
+	def test_values(self):
+		self.writer.write_items([{'name':u'J\xf6rg', 'enabled':True, 'locks':[], 'note':None}, 'plain'])
+
+		self.assertEqual(self.read_rows(), [
+			{'enabled':'true', 'locks':'[]', 'name':'J\xc3\xb6rg', 'note':'', 'value':''},
+			{'enabled':'', 'locks':'', 'name':'', 'note':'', 'value':'plain'}
+		])
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,223 @@
+import json
+import unittest
+
+import requests
+from requests.packages.urllib3.exceptions import MaxRetryError
+from requests.packages.urllib3.exceptions import NewConnectionError
+from requests.packages.urllib3.exceptions import ProtocolError
+
+from userapp.cli.scheduler import RequestScheduler
+
+class Response(object):
+	def __init__(self, status_code=200, result=None, headers=None):
+		self.status_code=status_code
+		self.content=json.dumps({} if result is None else result)
+		self.headers={} if headers is None else headers
+
+def api_error(error_code):
+	return Response(200, {'error_code':error_code, 'message':'Failed.'})
+
+def refused():
+	reason=NewConnectionError(None, 'Failed to establish a new connection: [Errno 111] Connection refused')
+	return requests.ConnectionError(MaxRetryError(None, '/v1/user.save', reason))
+
+class Sender(object):
+	"""
+	A fake send() that returns or raises the given outcomes in turn.
+	"""
+	def __init__(self, outcomes):
+		self.outcomes=list(outcomes)
+		self.count=0
+
+	def __call__(self):
+		outcome=self.outcomes[min(self.count, len(self.outcomes)-1)]
+		self.count += 1
+
+		if isinstance(outcome, Exception):
+			raise outcome
+
+		return outcome
+
+class ClassifyTest(unittest.TestCase):
+	def test_responses(self):
+		cases=[
+			(Response(200, {'user_id':'u1'}), None),
+			(Response(429), RequestScheduler.THROTTLED),
+			(Response(503), RequestScheduler.THROTTLED),
+			(Response(500), RequestScheduler.SERVER),
+			(Response(502), RequestScheduler.SERVER),
+			(api_error('RATE_LIMIT_EXCEEDED'), RequestScheduler.THROTTLED),
+			(api_error('INTERNAL_ERROR'), RequestScheduler.SERVER),
+			(api_error('INVALID_CREDENTIALS'), RequestScheduler.AUTH),
+			(api_error('INVALID_ARGUMENT'), RequestScheduler.VALIDATION)
+		]
+
+		for (response, category) in cases:
+			self.assertEqual(RequestScheduler.classify(response), category, response.content)
+
+	def test_large_bodies_are_not_parsed(self):
+		response=Response(200, {'error_code':'INVALID_ARGUMENT', 'padding':'x'*5000})
+		self.assertEqual(RequestScheduler.classify(response), None)
+
+	def test_errors(self):
+		cases=[
+			(requests.ConnectTimeout(), RequestScheduler.CONNECT),
+			(refused(), RequestScheduler.CONNECT),
+			(requests.ReadTimeout(), RequestScheduler.NETWORK),
+			(requests.ConnectionError(ProtocolError('Connection aborted.', IOError(104, 'Connection reset by peer'))), RequestScheduler.NETWORK),
+			(ValueError('No JSON object could be decoded'), RequestScheduler.VALIDATION)
+		]
+
+		for (error, category) in cases:
+			self.assertEqual(RequestScheduler.classify(error=error), category, repr(error))
+
+	def test_idempotent_methods(self):
+		for method in ['user.get', 'user.search', 'user.count', 'user.hasPermission', 'token.heartbeat', 'price_list.plan.get']:
+			self.assertTrue(RequestScheduler.is_idempotent(method), method)
+
+		for method in ['user.save', 'invoice.save', 'user.remove', 'user.changePassword', 'user.login', None]:
+			self.assertFalse(RequestScheduler.is_idempotent(method), method)
+
+class ConcurrencyTest(unittest.TestCase):
+	def test_throttling_halves_the_limit_once_per_second(self):
+		scheduler=RequestScheduler(max_concurrency=16)
+
+		scheduler.acquire()
+		scheduler.release(RequestScheduler.THROTTLED)
+		self.assertEqual(scheduler.limit, 8)
+
+		# Requests that were in flight with it don't decrease the limit again
+		scheduler.acquire()
+		scheduler.release(RequestScheduler.THROTTLED)
+		self.assertEqual(scheduler.limit, 8)
+		self.assertEqual(scheduler.throttled, 2)
+
+		scheduler.decreased -= 1
+		scheduler.acquire()
+		scheduler.release(RequestScheduler.THROTTLED)
+		self.assertEqual(scheduler.limit, 4)
+
+	def test_limit_never_drops_below_one(self):
+		scheduler=RequestScheduler(max_concurrency=2)
+
+		for i in range(4):
+			scheduler.decreased=0
+			scheduler.acquire()
+			scheduler.release(RequestScheduler.THROTTLED)
+
+		self.assertEqual(scheduler.limit, 1)
+
+	def test_success_increases_the_limit_additively(self):
+		scheduler=RequestScheduler(max_concurrency=16)
+		scheduler.limit=4.0
+
+		# One per window of limit successful requests
+		for i in range(4):
+			scheduler.acquire()
+			scheduler.release(None)
+
+		self.assertTrue(4.9 < scheduler.limit < 5.0, scheduler.limit)
+
+		for i in range(200):
+			scheduler.acquire()
+			scheduler.release(None)
+
+		self.assertEqual(scheduler.limit, 16)
+
+	def test_other_errors_keep_the_limit(self):
+		scheduler=RequestScheduler(max_concurrency=16)
+		scheduler.limit=4.0
+
+		for category in [RequestScheduler.SERVER, RequestScheduler.NETWORK, RequestScheduler.VALIDATION]:
+			scheduler.acquire()
+			scheduler.release(category)
+
+		self.assertEqual(scheduler.limit, 4)
+		self.assertEqual(scheduler.active, 0)
+
+class RetryAfterTest(unittest.TestCase):
+	def test_retry_after_is_a_lower_bound(self):
+		scheduler=RequestScheduler(base_delay=0.25, max_delay=30.0)
+		self.assertEqual(scheduler.get_delay(1, Response(429, headers={'Retry-After':'5'})), 5)
+
+	def test_retry_after_is_capped(self):
+		scheduler=RequestScheduler(base_delay=0.25, max_delay=30.0)
+		self.assertEqual(scheduler.get_delay(1, Response(429, headers={'Retry-After':'3600'})), 30)
+
+	def test_backoff_without_retry_after(self):
+		scheduler=RequestScheduler(base_delay=0.25, max_delay=30.0)
+
+		for response in [None, Response(500), Response(429, headers={'Retry-After':'Wed, 21 Oct 2026 07:28:00 GMT'})]:
+			for attempt in [1, 2, 3]:
+				self.assertTrue(0 <= scheduler.get_delay(attempt, response) <= 0.25*(2**(attempt-1)))
+
+class ExecuteTest(unittest.TestCase):
+	def setUp(self):
+		self.scheduler=RequestScheduler(retries=3, base_delay=0)
+
+	def test_retries_transient_errors_of_reads(self):
+		for error in [Response(500), Response(429), requests.ReadTimeout(), refused()]:
+			send=Sender([error, error, Response(200, {'user_id':'u1'})])
+
+			self.assertEqual(self.scheduler.execute(send, method='user.get').status_code, 200)
+			self.assertEqual(send.count, 3)
+
+	def test_gives_up_after_the_retries(self):
+		send=Sender([Response(500)])
+
+		self.assertEqual(self.scheduler.execute(send, method='user.get').status_code, 500)
+		self.assertEqual(send.count, 4)
+		self.assertEqual(self.scheduler.retried, 3)
+
+		send=Sender([requests.ReadTimeout()])
+		self.assertRaises(requests.ReadTimeout, self.scheduler.execute, send, None, 'user.get')
+
+	def test_does_not_resend_writes_that_may_have_been_processed(self):
+		for method in ['user.save', 'invoice.save', 'user.login']:
+			for error in [Response(500), api_error('INTERNAL_ERROR'), requests.ReadTimeout(), requests.ConnectionError(ProtocolError('Connection aborted.'))]:
+				send=Sender([error, Response(200)])
+
+				try:
+					self.scheduler.execute(send, method=method)
+				except requests.RequestException:
+					pass
+
+				self.assertEqual(send.count, 1, (method, error))
+
+	def test_retries_writes_that_were_not_processed(self):
+		for error in [Response(429), api_error('RATE_LIMIT_EXCEEDED'), requests.ConnectTimeout(), refused()]:
+			send=Sender([error, Response(200, {'user_id':'u1'})])
+
+			self.assertEqual(self.scheduler.execute(send, method='user.save').status_code, 200)
+			self.assertEqual(send.count, 2)
+
+	def test_validation_errors_are_not_retried(self):
+		send=Sender([api_error('INVALID_ARGUMENT')])
+
+		self.scheduler.execute(send, method='user.get')
+		self.assertEqual(send.count, 1)
+
+	def test_reauthenticates_once(self):
+		refreshed=[]
+
+		def reauthenticate():
+			refreshed.append(True)
+			return True
+
+		send=Sender([api_error('INVALID_CREDENTIALS'), Response(200)])
+		self.assertEqual(self.scheduler.execute(send, reauthenticate, 'user.save').status_code, 200)
+		self.assertEqual((send.count, len(refreshed)), (2, 1))
+
+		send=Sender([api_error('INVALID_CREDENTIALS')])
+		refreshed=[]
+		self.scheduler.execute(send, reauthenticate, 'user.get')
+		self.assertEqual((send.count, len(refreshed)), (2, 1))
+
+	def test_releases_every_request(self):
+		send=Sender([Response(500), requests.ReadTimeout(), Response(200)])
+
+		self.scheduler.execute(send, method='user.get')
+		self.assertEqual(self.scheduler.active, 0)
+
+if __name__ == '__main__':
+	unittest.main()
@@ -0,0 +1,297 @@
+import os
+import sys
+import json
+import time
+import errno
+import socket
+import struct
+import traceback
+
+from core import ServiceLocator
+from timing import Tracer
+from metrics import Metrics
+
+class InteractionRequired(BaseException):
+	"""
+	Raised when a command run by the agent reads from a terminal it doesn't have. A
+	BaseException, so that commands handling Exception don't swallow it.
+	"""
+	pass
+
+class AgentProtocol(object):
+	"""
+	Frames exchanged over the agent socket: one kind byte, a 4 byte big endian length
+	and the payload. 'J' frames hold JSON messages, 'O' and 'E' frames raw stdout and
+	stderr output. bin/userapp implements the client side without importing userapp,
+	keep both in sync.
+
+	The client sends a request {argv, cwd, config_path, env, stdin} and receives output
+	frames followed by {exit: status}, or {fallback: true} if the command has to run in
+	the client's process instead. Control requests {control: status|stop} are answered
+	with a single message.
+	"""
+	HEADER=struct.Struct('>cI')
+
+	@staticmethod
+	def send(connection, kind, payload):
+		connection.sendall(AgentProtocol.HEADER.pack(kind, len(payload)) + payload)
+
+	@staticmethod
+	def send_message(connection, message):
+		AgentProtocol.send(connection, 'J', json.dumps(message))
+
+	@staticmethod
+	def receive_exactly(connection, size):
+		chunks=[]
+
+		while size > 0:
+			chunk=connection.recv(min(size, 65536))
+
+			if len(chunk) == 0:
+				raise EOFError()
+
+			chunks.append(chunk)
+			size -= len(chunk)
+
+		return ''.join(chunks)
+
+	@staticmethod
+	def receive(connection):
+		(kind, size)=AgentProtocol.HEADER.unpack(AgentProtocol.receive_exactly(connection, AgentProtocol.HEADER.size))
+		payload=AgentProtocol.receive_exactly(connection, size)
+
+		return (kind, json.loads(payload) if kind == 'J' else payload)
+
+	@staticmethod
+	def get_socket_path():
+		return os.environ.get('USERAPP_AGENT_SOCKET') or os.path.expanduser('~/.userapp/agent.sock')
+
+	@staticmethod
+	def request(message, socket_path=None):
+		"""
+		Send a control message to the agent and return its reply, or None if no agent is
+		listening.
+		"""
+		connection=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+		try:
+			connection.connect(AgentProtocol.get_socket_path() if socket_path is None else socket_path)
+			AgentProtocol.send_message(connection, message)
+
+			return AgentProtocol.receive(connection)[1]
+		except (socket.error, EOFError):
+			return None
+		finally:
+			connection.close()
+
+class FrameWriter(object):
+	"""
+	A file-like stream that forwards what is written to the client in buffered frames.
+	"""
+	BUFFER_SIZE=65536
+
+	def __init__(self, connection, kind):
+		self.connection=connection
+		self.kind=kind
+		self.chunks=[]
+		self.size=0
+		self.sent=False
+		self.softspace=0
+
+	def write(self, data):
+		if isinstance(data, unicode):
+			data=data.encode('utf-8')
+
+		self.chunks.append(data)
+		self.size += len(data)
+
+		if self.size >= FrameWriter.BUFFER_SIZE:
+			self.flush()
+
+	def writelines(self, lines):
+		for line in lines:
+			self.write(line)
+
+	def flush(self):
+		if self.size == 0:
+			return
+
+		data=''.join(self.chunks)
+		self.chunks=[]
+		self.size=0
+
+		try:
+			AgentProtocol.send(self.connection, self.kind, data)
+		except socket.error, e:
+			raise IOError(e.errno, 'The client has disconnected')
+
+		self.sent=True
+
+	def discard(self):
+		self.chunks=[]
+		self.size=0
+
+	def isatty(self):
+		return False
+
+class NoInput(object):
+	"""
+	The stdin of commands run without input from the client.
+	"""
+	def read(self, size=-1):
+		raise InteractionRequired()
+
+	def readline(self, size=-1):
+		raise InteractionRequired()
+
+	def isatty(self):
+		return False
+
+class Agent(object):
+	"""
+	Keeps the services of the CLI (configuration, warm HTTP clients, session cache)
+	resident and executes the commands forwarded by bin/userapp over a Unix socket.
+	Commands are executed one at a time, as they share the process' stdout and
+	working directory.
+	"""
+	def __init__(self, socket_path, config_path, idle_timeout=0):
+		self.socket_path=socket_path
+		self.config_path=config_path
+		self.idle_timeout=idle_timeout
+		self.started=time.time()
+		self.requests=0
+		self.running=False
+
+	def is_listening(self):
+		return AgentProtocol.request({'control':'status'}, self.socket_path) is not None
+
+	def listen(self):
+		socket_dir_path=os.path.dirname(self.socket_path)
+
+		if not os.path.exists(socket_dir_path):
+			os.makedirs(socket_dir_path, 0700)
+
+		if os.path.exists(self.socket_path):
+			# Left behind by an agent that didn't exit cleanly
+			os.remove(self.socket_path)
+
+		server=socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+
+		# The socket runs commands with the user's credentials, keep it private
+		umask=os.umask(0177)
+
+		try:
+			server.bind(self.socket_path)
+		finally:
+			os.umask(umask)
+
+		server.listen(16)
+
+		return server
+
+	def serve(self, server):
+		self.running=True
+
+		if self.idle_timeout > 0:
+			server.settimeout(self.idle_timeout)
+
+		try:
+			while self.running:
+				try:
+					(connection, address)=server.accept()
+				except socket.timeout:
+					break
+				except socket.error, e:
+					if e.errno == errno.EINTR:
+						continue
+					raise
+
+				connection.settimeout(None)
+
+				try:
+					self.handle(connection)
+				except (socket.error, IOError, EOFError):
+					pass
+				finally:
+					connection.close()
+		finally:
+			server.close()
+
+			if os.path.exists(self.socket_path):
+				os.remove(self.socket_path)
+
+	def handle(self, connection):
+		(kind, request)=AgentProtocol.receive(connection)
+
+		control=request.get('control')
+
+		if control == 'status':
+			AgentProtocol.send_message(connection, {'pid':os.getpid(), 'uptime':round(time.time()-self.started, 1), 'requests':self.requests, 'config_path':self.config_path})
+		elif control == 'stop':
+			self.running=False
+			AgentProtocol.send_message(connection, {'stopped':True})
+		elif request.get('config_path') != self.config_path:
+			AgentProtocol.send_message(connection, {'fallback':True})
+		else:
+			self.requests += 1
+			self.execute(connection, request)
+
+	def execute(self, connection, request):
+		import clidriver
+
+		from StringIO import StringIO
+
+		stdout=FrameWriter(connection, 'O')
+		stderr=FrameWriter(connection, 'E')
+
+		saved=(sys.stdin, sys.stdout, sys.stderr, os.getcwd())
+		status=0
+
+		try:
+			sys.stdin=NoInput() if request.get('stdin') is None else StringIO(request['stdin'])
+			sys.stdout=stdout
+			sys.stderr=stderr
+			os.chdir(request.get('cwd') or saved[3])
+
+			self.prepare(request)
+
+			arguments=list(request['argv'])
+			global_options=clidriver.parse_global_options(arguments)
+
+			tracer=Tracer.from_environment(request.get('env') or {}, 'timing' in global_options)
+			ServiceLocator.get_instance().register('tracer', tracer)
+			ServiceLocator.get_instance().register('metrics', Metrics.from_environment(request.get('env') or {}))
+
+			status=clidriver.execute_command(arguments)
+		except InteractionRequired:
+			if not stdout.sent and not stderr.sent:
+				stdout.discard()
+				stderr.discard()
+				AgentProtocol.send_message(connection, {'fallback':True})
+				return
+
+			stderr.write("(error) The command needs a terminal, stop the agent to run it.\n")
+			status=1
+		except Exception:
+			stderr.write(traceback.format_exc())
+			status=1
+		finally:
+			(sys.stdin, sys.stdout, sys.stderr, cwd)=saved
+			os.chdir(cwd)
+
+		stdout.flush()
+		stderr.flush()
+
+		AgentProtocol.send_message(connection, {'exit':status})
+
+	def prepare(self, request):
+		"""
+		Refresh the per command state: a new console context, and the configuration and
+		session cache as other processes may have changed them.
+		"""
+		from clidriver import CliContext
+
+		service_locator=ServiceLocator.get_instance()
+		service_locator.register('cli_context', CliContext())
+		service_locator.resolve('config').load()
+		service_locator.resolve('session_cache').reload()
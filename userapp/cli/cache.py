@@ -0,0 +1,334 @@
+import os
+import re
+import json
+import time
+import hashlib
+import threading
+
+class ResponseCache(object):
+	"""
+	An on-disk cache of API responses. Entries are stored per scope (profile and app)
+	and root service, expire after a ttl and are evicted least recently used first
+	once the cache grows beyond its size limit.
+	"""
+	MUTATING_VERBS=['save', 'remove', 'delete', 'update', 'set', 'add', 'lock', 'unlock',
+		'regenerate', 'change', 'reset', 'verify', 'import', 'create']
+
+	# The leading verb of camelCase (changePassword) and snake_case (reset_password) names
+	VERB_PATTERN=re.compile(r'[a-z]+')
+
+	def __init__(self, directory):
+		self.directory=directory
+
+	@staticmethod
+	def is_mutating(method):
+		match=ResponseCache.VERB_PATTERN.match(method)
+		return match is not None and match.group(0) in ResponseCache.MUTATING_VERBS
+
+	@staticmethod
+	def get_scope(login, app_id):
+		return hashlib.sha1(json.dumps([login, app_id])).hexdigest()[:16]
+
+	@staticmethod
+	def get_key(service, method, parameters):
+		normalized=json.dumps([service, method, {} if parameters is None else parameters], sort_keys=True, separators=(',', ':'))
+		return hashlib.sha1(normalized).hexdigest()
+
+	def get_service_dir(self, scope, service):
+		return os.path.join(self.directory, scope, service.split('.')[0])
+
+	def get_path(self, scope, service, key):
+		return os.path.join(self.get_service_dir(scope, service), key + '.json')
+
+	def get(self, scope, service, key):
+		"""
+		Returns the cached result as a plain value, or None on a miss.
+		"""
+		path=self.get_path(scope, service, key)
+
+		try:
+			with open(path, 'r') as handle:
+				entry=json.load(handle)
+		except (IOError, ValueError):
+			return None
+
+		if entry.get('expires', 0) < time.time():
+			self.remove(path)
+			return None
+
+		try:
+			# The modification time is the last use, for LRU eviction
+			os.utime(path, None)
+		except OSError:
+			pass
+
+		return entry.get('result')
+
+	def put(self, scope, service, key, result, ttl, max_size):
+		import userapp
+
+		service_dir=self.get_service_dir(scope, service)
+		path=self.get_path(scope, service, key)
+
+		try:
+			if not os.path.exists(service_dir):
+				os.makedirs(service_dir, 0700)
+
+			# Write to a temporary file first so readers never see a partial entry
+			temp_path='{p}.{i}.tmp'.format(p=path, i=os.getpid())
+
+			with open(temp_path, 'w') as handle:
+				json.dump({'expires':time.time()+ttl, 'result':result}, handle, cls=userapp.IterableObjectEncoder)
+
+			os.rename(temp_path, path)
+		except (IOError, OSError):
+			return
+
+		self.evict(max_size)
+
+	def invalidate(self, scope, service):
+		"""
+		Remove all entries of the root service of service.
+		"""
+		import shutil
+
+		shutil.rmtree(self.get_service_dir(scope, service), True)
+
+	def evict(self, max_size):
+		entries=[]
+		total_size=0
+
+		for (dir_path, dir_names, file_names) in os.walk(self.directory):
+			for file_name in file_names:
+				path=os.path.join(dir_path, file_name)
+
+				try:
+					stat=os.stat(path)
+				except OSError:
+					continue
+
+				entries.append((stat.st_mtime, stat.st_size, path))
+				total_size += stat.st_size
+
+		if total_size <= max_size:
+			return
+
+		entries.sort()
+
+		for (mtime, size, path) in entries:
+			if total_size <= max_size:
+				break
+
+			self.remove(path)
+			total_size -= size
+
+	def remove(self, path):
+		try:
+			os.unlink(path)
+		except OSError:
+			pass
+
+class TemplateCache(object):
+	"""
+	An on-disk cache of downloaded archives (e.g. the quickstart templates of
+	'init'). Archives are stored by the SHA-256 of their content, and an index maps
+	every URL to its archive and the ETag and Last-Modified headers it was served
+	with, so that a cached archive is revalidated with a conditional request instead
+	of downloaded again. When the server can't be reached, or when offline, cached
+	archives are used as they are. Archives are evicted least recently used first
+	once the cache grows beyond max_size bytes. Downloads in progress are kept in
+	partial/ until complete, so that interrupted downloads can be resumed.
+	"""
+	def __init__(self, directory, max_size=64*1024*1024):
+		self.directory=directory
+		self.max_size=max_size
+
+		# Archives are stored from concurrent downloads
+		self.lock=threading.Lock()
+
+	def get_index_path(self):
+		return os.path.join(self.directory, 'index.json')
+
+	def get_object_path(self, digest):
+		return os.path.join(self.directory, 'objects', digest + '.zip')
+
+	def read_index(self):
+		try:
+			with open(self.get_index_path(), 'r') as handle:
+				return json.load(handle)
+		except (IOError, ValueError):
+			return {}
+
+	def write_index(self, index):
+		temp_path='{p}.{i}.tmp'.format(p=self.get_index_path(), i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			json.dump(index, handle, sort_keys=True, indent=1)
+
+		os.rename(temp_path, self.get_index_path())
+
+	def get_cached_path(self, url):
+		"""
+		The archive cached for url, or None.
+		"""
+		entry=self.read_index().get(url)
+
+		if entry is None or not os.path.exists(self.get_object_path(entry['sha256'])):
+			return None
+
+		return self.get_object_path(entry['sha256'])
+
+	def get_part_path(self, url):
+		"""
+		Where url is downloaded to, the same for every attempt so that an interrupted
+		download can be resumed.
+		"""
+		return os.path.join(self.directory, 'partial', hashlib.sha1(url).hexdigest()[:16] + '.zip.part')
+
+	def get_current_path(self, url, offline=False):
+		"""
+		Returns the path of the archive cached for url if it is still current, or None
+		if it has to be downloaded. Raises IOError if it isn't cached while offline.
+		"""
+		import urllib2
+
+		cached_path=self.get_cached_path(url)
+
+		if offline:
+			if cached_path is None:
+				raise IOError("'{u}' is not cached and can't be downloaded while offline.".format(u=url))
+
+			self.touch(cached_path)
+			return cached_path
+
+		if cached_path is None:
+			return None
+
+		entry=self.read_index()[url]
+		request=urllib2.Request(url)
+
+		# Revalidate without a body, a changed archive is downloaded separately
+		request.get_method=lambda: 'HEAD'
+
+		if entry.get('etag'):
+			request.add_header('If-None-Match', entry['etag'])
+
+		if entry.get('last_modified'):
+			request.add_header('If-Modified-Since', entry['last_modified'])
+
+		try:
+			response=urllib2.urlopen(request, timeout=30)
+		except urllib2.HTTPError, e:
+			if e.code == 304:
+				self.touch(cached_path)
+				return cached_path
+
+			return None
+		except (urllib2.URLError, IOError):
+			# The server can't be reached, the cached archive is better than nothing
+			return cached_path
+
+		try:
+			etag=response.info().getheader('ETag')
+			last_modified=response.info().getheader('Last-Modified')
+		finally:
+			response.close()
+
+		# Servers that ignore conditional requests answer 200, with the same validators
+		# if the archive didn't change. The ETag is compared if there is one.
+		if entry.get('etag'):
+			unchanged=etag == entry['etag']
+		else:
+			unchanged=entry.get('last_modified') is not None and last_modified == entry['last_modified']
+
+		if unchanged:
+			self.touch(cached_path)
+			return cached_path
+
+		return None
+
+	def store(self, url, temp_path, download):
+		"""
+		Move a downloaded archive into the cache and return its path. download holds
+		the sha256, size, etag and last_modified of the archive.
+		"""
+		path=self.get_object_path(download['sha256'])
+
+		try:
+			if not os.path.exists(os.path.dirname(path)):
+				os.makedirs(os.path.dirname(path), 0700)
+
+			# An archive with the same content may already be stored for another URL
+			if os.path.exists(path):
+				os.unlink(temp_path)
+				self.touch(path)
+			else:
+				os.rename(temp_path, path)
+		except (IOError, OSError):
+			self.remove(temp_path)
+			raise
+
+		with self.lock:
+			index=self.read_index()
+			index[url]={
+				'sha256':download['sha256'],
+				'size':download['size'],
+				'etag':download['etag'],
+				'last_modified':download['last_modified'],
+				'fetched_at':time.time()
+			}
+			self.write_index(index)
+
+			self.evict(keep=path)
+
+		return path
+
+	def touch(self, path):
+		try:
+			# The modification time is the last use, for LRU eviction
+			os.utime(path, None)
+		except OSError:
+			pass
+
+	def evict(self, keep=None):
+		object_dir=os.path.dirname(self.get_object_path(''))
+		entries=[]
+		total_size=0
+
+		for file_name in os.listdir(object_dir):
+			path=os.path.join(object_dir, file_name)
+
+			try:
+				stat=os.stat(path)
+			except OSError:
+				continue
+
+			entries.append((stat.st_mtime, stat.st_size, path))
+			total_size += stat.st_size
+
+		if total_size <= self.max_size:
+			return
+
+		entries.sort()
+
+		for (mtime, size, path) in entries:
+			if total_size <= self.max_size:
+				break
+
+			if path != keep:
+				self.remove(path)
+				total_size -= size
+
+		index=self.read_index()
+
+		for (url, entry) in index.items():
+			if not os.path.exists(self.get_object_path(entry['sha256'])):
+				del index[url]
+
+		self.write_index(index)
+
+	def remove(self, path):
+		try:
+			os.unlink(path)
+		except OSError:
+			pass
@@ -1,11 +1,16 @@
 import os
 import sys
-import atexit
-import readline
-import rlcompleter
+import time
 
 from core import Configuration
 from core import ServiceLocator
+from client import ClientPool
+from session import SessionCache
+from cache import ResponseCache
+from cache import TemplateCache
+from timing import Tracer
+from metrics import Metrics
+from profiling import CommandProfiler
 from helper import ConsoleHelper
 from command import CliCommandParser
 from command import CliCommandFactory
@@ -33,58 +38,284 @@ class CliContext(object):
 	def is_interactive(self):
 		return self.interactive
 
-def main():
-	cli_context=CliContext()
+GLOBAL_FLAGS=['--timing', '--continue-on-error']
 
-	historyPath = os.path.expanduser("~/.uahistory")
+GLOBAL_VALUE_OPTIONS=['-f', '--profile-cpu', '--profile-mem']
 
-	def save_history(historyPath=historyPath):
-	    import readline
-	    readline.write_history_file(historyPath)
+def parse_global_options(arguments):
+	"""
+	Remove the global options preceding the command from arguments and return them.
+	A lone '-' reads a script from stdin, like '-f -'.
+	"""
+	options={}
 
-	if os.path.exists(historyPath):
-	    readline.read_history_file(historyPath)
+	while len(arguments) > 0:
+		if arguments[0] in GLOBAL_FLAGS:
+			options[arguments.pop(0).lstrip('-')]=True
+		elif arguments[0] in GLOBAL_VALUE_OPTIONS and len(arguments) > 1:
+			name=arguments.pop(0).lstrip('-')
+			options[name]=arguments.pop(0)
+		elif arguments[0] == '-':
+			options['f']=arguments.pop(0)
+		else:
+			break
+
+	return options
+
+def get_config_path():
+	return os.environ.get('USERAPP_CONFIG', '/etc/userapp/config.json')
 
-	atexit.register(save_history)
+def load_configuration(config_path):
+	store_path=os.path.splitext(config_path)[0] + '.db'
+
+	if os.path.exists(store_path):
+		# Profiles were migrated to the indexed store, see 'config migrate'
+		from store import SqliteConfiguration
+		config=SqliteConfiguration(file_path=store_path)
+	else:
+		config=Configuration(file_path=config_path)
 
-	config=Configuration(file_path='/etc/userapp/config.json')
 	config.load()
 
+	return config
+
+def register_services(tracer):
+	"""
+	Register the services shared by all commands of the process.
+	"""
+	from completion import CompletionIndex
+
 	service_locator=ServiceLocator.get_instance()
+	service_locator.register('tracer', tracer)
+	service_locator.register('metrics', Metrics.from_environment(os.environ))
+
+	with tracer.span('config.load'):
+		config=load_configuration(get_config_path())
+
 	service_locator.register('config', config)
-	service_locator.register('cli_context', cli_context)
+	service_locator.register('cli_context', CliContext())
+	service_locator.register('client_pool', ClientPool())
+	service_locator.register('session_cache', SessionCache(file_path=os.path.expanduser('~/.userapp/sessions.json')))
+	service_locator.register('response_cache', ResponseCache(directory=os.path.expanduser('~/.userapp/cache/responses')))
+	service_locator.register('template_cache', TemplateCache(directory=os.path.expanduser('~/.userapp/cache/templates')))
+	service_locator.register('completion_index', CompletionIndex(directory=os.path.expanduser('~/.userapp/cache/completion')))
+
+def execute_command(arguments):
+	"""
+	Create and execute a single (non-interactive) command. Returns its exit status.
+	"""
+	service_locator=ServiceLocator.get_instance()
+	tracer=service_locator.resolve('tracer')
+	config=service_locator.resolve('config')
+
+	name=arguments[0] if len(arguments) > 0 else None
+	started=time.time()
+
+	try:
+		with CommandProfiler.get_instance().profile():
+			command=CliCommandFactory().create(arguments)
+
+			# Several saves during one command are written to the file once
+			with tracer.span('command.execute'), config.deferred_saves():
+				status=command.execute()
+	except KeyboardInterrupt:
+		print(" ")
+		status=130
+
+	status=0 if status is None else status
+
+	tracer.report()
+	record_command(name, started, status)
+
+	# Commands may have added or removed profiles
+	service_locator.resolve('completion_index').update_profiles(config)
+
+	return status
+
+def record_command(name, started, status):
+	"""
+	Record the outcome of a command in the metrics and export them.
+	"""
+	from command import CliCommandRegistry
+
+	metrics=Metrics.get_instance()
+
+	if not metrics.enabled:
+		return
+
+	# Unknown commands are grouped, so that typos don't each become a metric
+	if name not in CliCommandRegistry.get_instance().get_names():
+		name='invalid'
+
+	metrics.increment('commands', command=name, status=str(status))
+	metrics.observe('command_duration', time.time()-started, command=name)
+	metrics.flush()
+
+def execute_script(handle, continue_on_error=False):
+	"""
+	Execute the commands read line by line from handle in this process, sharing the
+	configuration and connections. Blank lines and lines starting with '#' are skipped.
+	Stops at the first failing command unless continue_on_error, and writes a summary
+	to stderr. Returns 1 if any command failed.
+	"""
+	import traceback
+
+	parser=CliCommandParser()
+	tracer=ServiceLocator.get_instance().resolve('tracer')
+
+	executed=0
+	failed=0
+
+	for (number, line) in enumerate(handle):
+		line=line.strip()
+
+		if len(line) == 0 or line.startswith('#'):
+			continue
+
+		tracer.reset()
+		executed += 1
+
+		try:
+			status=execute_command(parser.parse(line))
+		except Exception:
+			traceback.print_exc()
+			status=1
+
+		if status != 0:
+			failed += 1
+			sys.stderr.write("(error) Line {n} failed with status {s}: {l}\n".format(n=number+1, s=status, l=line))
+
+			if status == 130 or not continue_on_error:
+				break
+
+	sys.stdout.flush()
+	sys.stderr.write("(result) {e} command(s) executed, {f} failed.\n".format(e=executed, f=failed))
+
+	return 0 if failed == 0 else 1
+
+def install_completer(readline, cli_context):
+	"""
+	Complete commands, subcommands, config keys, profile names and methods on Tab.
+	"""
+	from command import CliCommandRegistry
+	from completion import Completer
+	from completion import MethodCatalog
+
+	catalog=MethodCatalog(
+		os.path.expanduser('~/.userapp/cache/methods.json'),
+		url=os.environ.get('USERAPP_CATALOG_URL'),
+		index=ServiceLocator.get_instance().resolve('completion_index')
+	)
+
+	completer=Completer(CliCommandRegistry.get_instance().get_names()+['clear'], catalog)
+
+	def complete(text, state):
+		line=readline.get_line_buffer()[:readline.get_begidx()]
+		return completer.complete(cli_context.get_scopes(), line, text, state)
+
+	readline.set_completer(complete)
+	readline.set_completer_delims(' \t\n')
+
+	# The readline module of macOS is backed by libedit, which has its own syntax
+	if 'libedit' in (readline.__doc__ or ''):
+		readline.parse_and_bind('bind ^I rl_complete')
+	else:
+		readline.parse_and_bind('tab: complete')
+
+def main(started=None):
+	arguments=sys.argv[1:]
+	global_options=parse_global_options(arguments)
+
+	tracer=Tracer.from_environment(os.environ, 'timing' in global_options)
+
+	if started is not None:
+		tracer.record('import', started, time.time()-started)
+
+	register_services(tracer)
+
+	profiler=CommandProfiler(global_options.get('profile-cpu'), global_options.get('profile-mem'))
+	ServiceLocator.get_instance().register('profiler', profiler)
+
+	# Every command of a script or the console gets its own profile
+	profiler.numbered=len(arguments) == 0
+
+	if 'f' in global_options or (len(arguments) == 0 and not sys.stdin.isatty()):
+		script_path=global_options.get('f', '-')
+
+		if script_path == '-':
+			return execute_script(sys.stdin, 'continue-on-error' in global_options)
+
+		try:
+			handle=open(script_path, 'r')
+		except IOError:
+			print("(error) Unable to open script file '" + script_path + "'.")
+			return 1
+
+		with handle:
+			return execute_script(handle, 'continue-on-error' in global_options)
+
+	if len(arguments) > 0:
+		return execute_command(arguments)
+
+	service_locator=ServiceLocator.get_instance()
+	config=service_locator.resolve('config')
+	cli_context=service_locator.resolve('cli_context')
+	completion_index=service_locator.resolve('completion_index')
 
 	command_factory=CliCommandFactory()
 
-	if len(sys.argv) == 1:
-		ConsoleHelper.clear_console()
+	# Line editing and history are only needed by the interactive console
+	import readline
+
+	historyPath = os.path.expanduser("~/.uahistory")
+
+	if os.path.exists(historyPath):
+	    readline.read_history_file(historyPath)
+
+	ConsoleHelper.clear_console()
+
+	cli_context.set_interactive(True)
 
-		cli_context.set_interactive(True)
+	install_completer(readline, cli_context)
 
-		parser=CliCommandParser()
+	parser=CliCommandParser()
 
+	try:
 		while True:
 			try:
 				cli_scopes=cli_context.get_scopes()
 
 				line=raw_input("userapp" + (' ' + (':'.join(cli_scopes)) if len(cli_scopes) > 0 else '') + "> ")
 
-				arguments=parser.parse(line)
+				tracer.reset()
+				started=time.time()
+
+				arguments=cli_scopes + parser.parse(line)
+				name=arguments[0] if len(arguments) > 0 else None
+
+				with profiler.profile():
+					command=command_factory.create(arguments)
+
+					with tracer.span('command.execute'), config.deferred_saves():
+						status=command.execute()
 
-				command=command_factory.create(cli_scopes + arguments)
-				command.execute()
+				tracer.report()
+				record_command(name, started, 0 if status is None else status)
+
+				# Commands may have added or removed profiles
+				completion_index.update_profiles(config)
 			except KeyboardInterrupt:
 				print(" ")
 				if cli_context.exit() is None:
 					break
-	else:
+			except EOFError:
+				print(" ")
+				break
+	finally:
+		# Saved here rather than at exit, main() may run more than once per process
 		try:
-			arguments=sys.argv
-			arguments.pop(0)
-
-			command=command_factory.create(arguments)
-			command.execute()
-		except KeyboardInterrupt:
-			print(" ")
+			readline.write_history_file(historyPath)
+		except IOError:
+			pass
 
-	return 0
\ No newline at end of file
+	return 0
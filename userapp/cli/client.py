@@ -0,0 +1,274 @@
+import json
+import logging
+import threading
+
+from timing import Tracer
+from scheduler import RequestScheduler
+
+class PooledTransport(object):
+	"""
+	A userapp transport that posts over a shared keep-alive session instead of
+	opening a new connection per call. With a scheduler, requests are retried and
+	throttled by it, and reauthenticate(app_id, token) is asked for a new token when
+	the token of a request is rejected.
+	"""
+	def __init__(self, session, logger=None, scheduler=None, reauthenticate=None):
+		self.session=session
+		self._logger=logging.getLogger('userapp') if logger is None else logger
+		self.scheduler=scheduler
+		self.reauthenticate=reauthenticate
+		self.credentials={}
+
+	def call(self, method, url, headers=None, body=None):
+		if headers is None:
+			headers={}
+
+		if headers.get('Content-Type') == 'application/json':
+			body=json.dumps(body)
+
+		if method != 'post':
+			import userapp
+			raise userapp.UserAppTransportException("Method {m} not supported.".format(m=method))
+
+		self._logger.debug("Calling {m} {u} with headers {h} and body {b}".format(
+			m=method,
+			u=url,
+			h=headers,
+			b=body
+		))
+
+		if self.scheduler is None:
+			return self.post(url, headers, body)
+
+		def send():
+			# Clients created before a re-authentication still send the old token
+			authorization=headers.get('Authorization')
+			headers['Authorization']=self.credentials.get(authorization, authorization)
+
+			return self.post(url, headers, body)
+
+		return self.scheduler.execute(send, lambda: self.refresh_credentials(headers), url.rsplit('/', 1)[-1])
+
+	def post(self, url, headers, body):
+		tracer=Tracer.get_instance()
+
+		if not tracer.enabled:
+			return self.session.post(url=url, data=body, headers=headers, verify=True)
+
+		with tracer.span('http', method=url.rsplit('/', 1)[-1]) as span:
+			pool=self.session.get_adapter(url).poolmanager.connection_from_url(url)
+			connections=pool.num_connections
+
+			response=self.session.post(url=url, data=body, headers=headers, verify=True)
+
+			# elapsed runs until the response headers are parsed, i.e. server time plus transfer
+			span.set('status', response.status_code)
+			span.set('response_ms', round(response.elapsed.total_seconds()*1000, 1))
+			span.set('new_connection', pool.num_connections > connections)
+
+			return response
+
+	def refresh_credentials(self, headers):
+		"""
+		Replace the rejected token in the Authorization header of headers with a new
+		one. Returns whether the request should be sent again.
+		"""
+		import base64
+
+		authorization=headers.get('Authorization') or ''
+
+		if self.reauthenticate is None or not authorization.startswith('Basic '):
+			return False
+
+		try:
+			(app_id, token)=base64.b64decode(authorization[6:]).split(':', 1)
+		except (TypeError, ValueError):
+			return False
+
+		new_token=self.reauthenticate(app_id, token)
+
+		if new_token is None or new_token == token:
+			return False
+
+		self.credentials[authorization]='Basic ' + base64.b64encode('{a}:{t}'.format(a=app_id, t=new_token))
+		headers['Authorization']=self.credentials[authorization]
+
+		return True
+
+class ClientPool(object):
+	"""
+	Keeps one keep-alive HTTP session per login and target (base address and scheme)
+	for the lifetime of the process, so that clients created by successive commands
+	reuse warm connections. Profiles of the same login with different targets, e.g.
+	in a fan-out, get sessions of their own.
+	"""
+	def __init__(self, size=16):
+		self.size=size
+		self.lock=threading.Lock()
+		self.reauthentication_lock=threading.RLock()
+		self.entries={}
+
+	def get_key(self, profile):
+		return (profile['user']['login'],)+self.get_target(profile)
+
+	def get_target(self, profile):
+		return (profile['server']['base_address'], bool(profile['server']['secure']))
+
+	def get_transport(self, profile, connections=None):
+		"""
+		Returns (transport, reuse count) for the profile. With connections, the session
+		opens at most that many connections and further requests wait for a free one.
+		"""
+		key=self.get_key(profile)
+		login=profile['user']['login']
+
+		with self.lock:
+			entry=self.entries.get(key)
+
+			if entry is None:
+				import requests
+
+				session=requests.Session()
+				scheduler=RequestScheduler(max_concurrency=self.size)
+
+				def reauthenticate(app_id, token):
+					return self.reauthenticate(login, app_id, token)
+
+				entry={
+					'session':session,
+					'scheduler':scheduler,
+					'transport':PooledTransport(session, scheduler=scheduler, reauthenticate=reauthenticate),
+					'uses':0,
+					'connections':None
+				}
+				self.entries[key]=entry
+
+				self.mount_adapter(entry, None)
+
+			if connections is not None and connections != entry['connections']:
+				self.mount_adapter(entry, connections)
+
+			entry['uses'] += 1
+
+			return (entry['transport'], entry['uses']-1)
+
+	def mount_adapter(self, entry, connections):
+		from requests.adapters import HTTPAdapter
+
+		if connections is None:
+			adapter=HTTPAdapter(pool_connections=1, pool_maxsize=self.size)
+		else:
+			adapter=HTTPAdapter(pool_connections=1, pool_maxsize=connections, pool_block=True)
+
+		for prefix in ['http://', 'https://']:
+			previous=entry['session'].adapters.get(prefix)
+			entry['session'].mount(prefix, adapter)
+
+			if previous is not None and previous is not adapter:
+				previous.close()
+
+		entry['connections']=connections
+		entry['scheduler'].set_max_concurrency(self.size if connections is None else connections)
+
+	def get_scheduler(self, profile):
+		"""
+		The request scheduler of the profile's pooled session.
+		"""
+		self.get_transport(profile)
+
+		with self.lock:
+			return self.entries[self.get_key(profile)]['scheduler']
+
+	def reauthenticate(self, login, app_id, token):
+		"""
+		Log in again with the saved credentials of the profile of login when its token
+		was rejected, and return the new token. Returns None if the token isn't the
+		profile's or there are no saved credentials.
+		"""
+		from core import ServiceLocator
+
+		config=ServiceLocator.get_instance().resolve('config')
+
+		if config is None or not config.has_profile(login):
+			return None
+
+		profile=config.get_profile(login)
+
+		with self.reauthentication_lock:
+			if app_id != profile['user']['app_id']:
+				return None
+
+			if profile['user']['token'] != token:
+				# Already refreshed for another request
+				return profile['user']['token']
+
+			if profile['user']['password'] is None:
+				return None
+
+			from commands.auth import UserAppLoginCommand
+
+			try:
+				return UserAppLoginCommand([login, profile['user']['password']]).refresh_token(profile)
+			except Exception, e:
+				logging.getLogger('userapp').debug("Re-authentication of '{l}' failed: {e}".format(l=login, e=e))
+				return None
+
+	def create_client(self, profile, app_id=None, token=None, connections=None):
+		"""
+		Create a client for the profile's app (or app_id) that reuses the pooled session.
+		"""
+		import userapp
+
+		(transport, reuses)=self.get_transport(profile, connections)
+
+		client=userapp.Client(
+			app_id=profile['user']['app_id'] if app_id is None else app_id,
+			token=profile['user']['token'] if token is None else token,
+			secure=profile['server']['secure'],
+			base_address=profile['server']['base_address'],
+			debug=profile['server']['debug'],
+			transport=transport
+		)
+
+		self.report_reuse(client.get_logger(), profile, reuses)
+
+		return client
+
+	def create_api(self, profile, app_id, token=""):
+		"""
+		Create an API proxy for app_id that reuses the pooled session.
+		"""
+		import userapp
+
+		(transport, reuses)=self.get_transport(profile)
+
+		api=userapp.API(
+			app_id=app_id,
+			token=token,
+			secure=profile['server']['secure'],
+			base_address=profile['server']['base_address'],
+			debug=profile['server']['debug'],
+			transport=transport
+		)
+
+		self.report_reuse(api.get_logger(), profile, reuses)
+
+		return api
+
+	def report_reuse(self, logger, profile, reuses):
+		if profile['server']['debug'] and reuses > 0:
+			logger.debug("Reusing connection pool for profile '{p}' ({n} reuses)".format(p=profile['user']['login'], n=reuses))
+
+	def invalidate(self, profile=None):
+		"""
+		Close the pooled connections of a profile's login, to any target (the profile
+		may already have a new one), or of all profiles if none is given.
+		"""
+		with self.lock:
+			keys=[key for key in self.entries.keys() if profile is None or key[0] == profile['user']['login']]
+
+			for key in keys:
+				entry=self.entries.pop(key, None)
+
+				if entry is not None:
+					entry['session'].close()
@@ -1,11 +1,6 @@
-import getpass
-import userapp
-import json
-
-from . import __userapp_master_app_id__
 from helper import ConsoleHelper
-from helper import FileHelper
 from core import ServiceLocator
+from timing import Tracer
 
 class CliCommandParser(object):
 	def __init__(self):
@@ -19,347 +14,153 @@ class CliCommandParser(object):
 
 		return result
 
-class CliCommandFactory(object):
-	def __init__(self):
-		self.cli_context=ServiceLocator.get_instance().resolve('cli_context')
-
-	def create(self, arguments):
-		command=InvalidCommand(arguments+[])
-
-		if len(arguments) > 0:
-			command_type=arguments.pop(0)
-
-			if command_type == 'clear' or (len(arguments) > 0 and arguments[len(arguments)-1] == 'clear'):
-				command=ClearConsoleCommand()
-			elif command_type == 'config':
-				command=ConfigCommand(arguments)
-			elif command_type == 'init':
-				command=InitCommand(arguments)
-			elif command_type == 'profile':
-				command=ProfileCommand(arguments)
-			elif command_type == 'login':
-				command=UserAppLoginCommand(arguments)
-			elif command_type == 'register':
-				command=UserAppRegisterCommand(arguments)
-			elif command_type == 'call':
-				if self.cli_context.is_interactive() and len(arguments) == 0 and not self.cli_context.in_scope(command_type):
-					command=EnterScopeCommand([command_type])
-				else:
-					command=UserAppApiCallCommand(arguments)
-			elif command_type == 'dashboard':
-				command=UserAppDashboardLaunchCommand()
-			elif command_type == 'help':
-				command=HelpCommand()
-
-		return command
+	def parse_options(self, arguments, value_options=None, flag_options=None):
+		"""
+		Split '--name value' and '--flag' options from the arguments. Returns a tuple of
+		(options, remaining arguments).
+		"""
+		value_options=[] if value_options is None else value_options
+		flag_options=[] if flag_options is None else flag_options
 
-class UserAppApiCallCommand(object):
-	def __init__(self, arguments):
-		self.config=ServiceLocator.get_instance().resolve('config')
+		options={}
+		remaining=[]
 
-		self.service=None
-		self.method=None
-		self.parameters=None
-
-		if len(arguments) > 0:
-			call=arguments.pop(0)
-
-			call_segments=call.split('.')
-			self.method=call_segments.pop()
-			self.service='.'.join(call_segments)
-
-			if len(arguments) > 0:
-				parameters={}
-
-				for argument in arguments:
-					param_segments=argument.split('=', 1)
-					if len(param_segments) == 2:
-						parameters[param_segments[0]]=param_segments[1]
-
-				self.parameters=parameters
-
-	def execute(self):
-		profile=self.config.get_selected_profile()
-
-		if profile['user']['token'] is None:
-			if profile['user']['login'] is None:
-				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
-			
-			UserAppLoginCommand([profile['user']['login']]).execute()
-
-		client=userapp.Client(
-			app_id=profile['user']['app_id'],
-			token=profile['user']['token'],
-			secure=profile['server']['secure'],
-			base_address=profile['server']['base_address'],
-			debug=profile['server']['debug']
-		)
-
-		try:
-			result=client.call(1, self.service, self.method, self.parameters)
-			print("(result) " + json.dumps(result, cls=userapp.IterableObjectEncoder, sort_keys=True, indent=4))
-		except Exception, e:
-			print("(error) " + str(e.message))
-
-class ConfigCommand(object):
-	def __init__(self, arguments):
-		service_locator=ServiceLocator.get_instance()
-		self.config=service_locator.resolve('config')
-		self.cli_context=service_locator.resolve('cli_context')
-		self.arguments=arguments
-
-	def execute(self):
-		arguments=self.arguments
+		arguments=list(arguments)
 
-		profile=self.config.get_selected_profile()
+		while len(arguments) > 0:
+			argument=arguments.pop(0)
+			name=argument[2:] if argument.startswith('--') else None
 
-		def config_get_section(key):
-			if key in ['app_id', 'token', 'login', 'password']:
-				return 'user'
-
-			if key in ['base_address', 'debug', 'secure']:
-				return 'server'
-
-			return None
-
-		def config_exists(key):
-			section=config_get_section(key)
-
-			if section is None:
-				return False
-
-			return key in profile[section]
-
-		def config_set(key, value):
-			section=config_get_section(key)
-
-			if section is None:
-				return None
-
-			profile[section][key]=value
-
-		def config_get(key):
-			section=config_get_section(key)
-
-			if section is None:
-				return None
-
-			return profile[section][key]
-
-		if len(arguments) > 0:
-			command=arguments.pop(0)
-
-			if command == 'list':
-				result={}
-
-				profile=self.config.get_selected_profile()
-
-				for (key, value) in profile['user'].items():
-					result[key]='' if value is None else value
-
-				for (key, value) in profile['server'].items():
-					result[key]='' if value is None else value
-
-				print("(result) " + json.dumps(result, sort_keys=True, indent=4))
-			elif command == 'get':
-				if len(arguments) == 0:
-					print("(error) Please specify a variable to get (debug, base_address, secure, app_id, token).")
-				elif not config_exists(arguments[0]):
-					print("(error) Invalid config variable '" + (arguments[0]) + "'.")
-				else:
-					current_value=config_get(arguments[0])
-
-					if isinstance(current_value, bool):
-						current_value='true' if current_value else 'false'
-
-					if current_value is None:
-						current_value = ''
-
-					print("(result) " + current_value)
-			elif command == 'set':
-				if len(arguments) == 0:
-					print("(error) Please specify a variable to set (debug, base_address, secure, app_id, token).")
-				if len(arguments) != 2:
-					print("(error) Please specify a value to set.")
-				elif not config_exists(arguments[0]):
-					print("(error) Invalid config variable '" + (arguments[0]) + "'.")
-				else:
-					new_value=arguments[1]
-					current_value=config_get(arguments[0])
-					
-					if arguments[0] in ['debug', 'secure']:
-						new_value=Configuration.parseBooleanString(new_value)
-
-					config_set(arguments[0], new_value)
-
-					print("(result) Changed config '"+arguments[0]+"' from '"+str(current_value)+"' to '"+str(new_value)+"'.")
-
-					if not self.cli_context.is_interactive():
-						self.config.save()
-			elif command == 'save':
-				self.config.save()
-				print("(result) Configuration saved")
+			if name in value_options and len(arguments) > 0:
+				options[name]=arguments.pop(0)
+			elif name in flag_options:
+				options[name]=True
 			else:
-				print("(error) Please specify a command (list, get, set or save).")
-		else:
-			print("(error) Please specify a command (list, get, set or save).")
+				remaining.append(argument)
 
-class InitCommand(object):
+		return (options, remaining)
+
+class CliCommandRegistry(object):
 	"""
-	Currently a bit hacked together. Will have to deal \w all types of backends/frontends in the future.
+	Maps command names to the classes implementing them. Command modules are only
+	imported the first time one of their commands is created, and commands from other
+	packages are found through the 'userapp.cli.commands' entry point group.
 	"""
-	def __init__(self, arguments):
-		service_locator=ServiceLocator.get_instance()
-		self.config=service_locator.resolve('config')
-		self.cli_context=service_locator.resolve('cli_context')
-		self.arguments=arguments
+	_instance=None
 
-	def execute(self):
-		arguments=self.arguments
+	ENTRY_POINT_GROUP='userapp.cli.commands'
 
-		current_dir_path=os.getcwd()
-		profile=self.config.get_selected_profile()
+	def __init__(self):
+		self.table={}
+		self.classes={}
+		self.scopes=set()
+		self.plugins_loaded=False
+
+		self.register('agent', 'userapp.cli.commands.agent', 'AgentCommand')
+		self.register('bench', 'userapp.cli.commands.bench', 'BenchCommand')
+		self.register('call', 'userapp.cli.commands.call', 'UserAppApiCallCommand', scope=True)
+		self.register('completion', 'userapp.cli.commands.completion', 'CompletionCommand')
+		self.register('config', 'userapp.cli.commands.config', 'ConfigCommand')
+		self.register('dashboard', 'userapp.cli.commands.dashboard', 'UserAppDashboardLaunchCommand')
+		self.register('export', 'userapp.cli.commands.export', 'ExportCommand')
+		self.register('help', 'userapp.cli.commands.help', 'HelpCommand')
+		self.register('import', 'userapp.cli.commands.imports', 'ImportCommand')
+		self.register('init', 'userapp.cli.commands.init', 'InitCommand')
+		self.register('login', 'userapp.cli.commands.auth', 'UserAppLoginCommand')
+		self.register('profile', 'userapp.cli.commands.profiles', 'ProfileCommand')
+		self.register('register', 'userapp.cli.commands.auth', 'UserAppRegisterCommand')
+
+	def register(self, name, module_name, class_name, scope=False):
+		"""
+		Register a command. A scope command entered without arguments in the
+		interactive console opens a scope (e.g. 'call') instead of executing.
+		"""
+		self.table[name]=(module_name, class_name)
+		self.classes.pop(name, None)
+
+		if scope:
+			self.scopes.add(name)
+		else:
+			self.scopes.discard(name)
 
-		def inject_app_id(file_path):
-			FileHelper.search_replace_file(file_path, 'YOUR-USERAPP-APP-ID', profile['user']['app_id'])
+	def is_scope(self, name):
+		return name in self.scopes
 
-		if profile['user']['token'] is None:
-			if profile['user']['login'] is None:
-				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
-			
-			UserAppLoginCommand([profile['user']['login']]).execute()
-			profile=self.config.get_selected_profile()
+	def get_names(self):
+		return sorted(self.table.keys())
 
-		if len(arguments) > 1:
-			app_name=arguments.pop(0)
+	def resolve(self, name):
+		"""
+		Returns the command class registered for name, or None.
+		"""
+		command_class=self.classes.get(name)
 
-			target_dir_path=current_dir_path+'/'+app_name
+		if command_class is not None:
+			return command_class
 
-			if not os.path.exists(target_dir_path):
-				os.makedirs(target_dir_path)
+		if name not in self.table:
+			self.load_plugins()
 
-			frontend=arguments.pop(0)
+		if name not in self.table:
+			return None
 
-			frontend_zip_url='https://app.userapp.io/partials/docs/quickstart/{name}/frontend/userapp-{name}-demo.zip'
-			backend_zip_url='https://app.userapp.io/partials/docs/quickstart/{name}/backend/userapp-{name}-backend.zip'
+		(module_name, class_name)=self.table[name]
 
-			frontend_error = FileHelper.unzip_url(frontend_zip_url.format(name=frontend), target_dir_path + '/public')
+		import importlib
+		command_class=getattr(importlib.import_module(module_name), class_name)
+		self.classes[name]=command_class
 
-			if frontend_error == 'invalid_url':
-				print("(error) Frontend '"+frontend+"' does not exist.")
-				return
+		return command_class
 
-			if frontend == 'angularjs':
-				inject_app_id(target_dir_path + '/public/js/app.js')
+	def load_plugins(self):
+		if self.plugins_loaded:
+			return
 
-			if len(arguments) > 0:
-				backend=arguments.pop(0)
-				backend_error = FileHelper.unzip_url(backend_zip_url.format(name=backend), target_dir_path)
+		self.plugins_loaded=True
 
-				if backend_error == 'invalid_url':
-					print("(error) Backend '"+backend+"' does not exist.")
-					return
+		try:
+			import pkg_resources
+		except ImportError:
+			return
 
-				if backend == 'nodejs':
-					inject_app_id(target_dir_path + '/app.js')
+		for entry_point in pkg_resources.iter_entry_points(CliCommandRegistry.ENTRY_POINT_GROUP):
+			if entry_point.name not in self.table:
+				self.register(entry_point.name, entry_point.module_name, '.'.join(entry_point.attrs))
 
-					ProcessHelper.execute('sudo npm install', cwd=target_dir_path+'/')
-					ProcessHelper.execute('nodejs app.js', block=False, wait=False, cwd=target_dir_path+'/')
+	@staticmethod
+	def get_instance():
+		if CliCommandRegistry._instance is None:
+			CliCommandRegistry._instance=CliCommandRegistry()
 
-					WebBrowserHelper.open_url('http://localhost:3000')
-		else:
-			print("(error) Please specify <dir name> <frontend> <backend>. E.g. 'init myapp angularjs nodejs'.")
+		return CliCommandRegistry._instance
 
-class ProfileCommand(object):
-	def __init__(self, arguments):
-		service_locator=ServiceLocator.get_instance()
-		self.config=service_locator.resolve('config')
-		self.cli_context=service_locator.resolve('cli_context')
-		self.arguments=arguments
+class CliCommandFactory(object):
+	def __init__(self):
+		self.cli_context=ServiceLocator.get_instance().resolve('cli_context')
+		self.registry=CliCommandRegistry.get_instance()
+		self.tracer=Tracer.get_instance()
 
-	def execute(self):
-		arguments=self.arguments
+	def create(self, arguments):
+		with self.tracer.span('command.create', command=arguments[0] if len(arguments) > 0 else None):
+			return self.create_command(arguments)
 
-		profile=self.config.get_selected_profile()
+	def create_command(self, arguments):
+		command=InvalidCommand(arguments+[])
 
 		if len(arguments) > 0:
-			command=arguments.pop(0)
-
-			if command == 'list':
-				print("(result) " + json.dumps(config.profiles.keys(), sort_keys=True, indent=4))
-			elif command == 'current':
-				profile_login=profile['user']['login']
-				print("(result) " + ("No profile. Use 'login' or 'register' if you want to create a new profile." if profile_login is None else profile_login))
-			elif command == 'switch':
-				if len(arguments) == 0:
-					print("(error) Please specify a profile to switch to. For valid profiles, try 'profile list'.")
-				elif not self.config.has_profile(arguments[0]):
-					print("(error) Invalid profile name '" + (arguments[0]) + "'.")
-				else:
-					name=arguments[0]
-
-					if raw_input('Set as primary? ').lower() in ['yes', 'y']:
-						profile['primary']=False
-						profile=self.config.get_profile(name)
-						profile['primary']=True
-						self.config.save()
-
-					self.config.set_selected_profile(name)
+			command_type=arguments.pop(0)
+
+			if command_type == 'clear' or (len(arguments) > 0 and arguments[len(arguments)-1] == 'clear'):
+				command=ClearConsoleCommand()
+			elif self.registry.is_scope(command_type) and self.cli_context.is_interactive() and len(arguments) == 0 and not self.cli_context.in_scope(command_type):
+				command=EnterScopeCommand([command_type])
 			else:
-				print("(error) Please specify a command (list, current or switch).")
-		else:
-			print("(error) Please specify a command (list, current or switch).")
+				command_class=self.registry.resolve(command_type)
 
-class HelpCommand(object):
-	def __init__(self):
-		pass
+				if command_class is not None:
+					command=command_class(arguments)
 
-	def execute(self):
-		print("Usage: userapp-cli [COMMAND] [OPTIONS] [OPTIONS...]")
-		print("       userapp-cli signup john@doe.com mysecretpsw999")
-		print("       userapp-cli login john@doe.com mysecretpsw999")
-		print("       userapp-cli config list")
-		print("       userapp-cli config get app_id")
-		print("       userapp-cli config set app_id 123")
-		print("       userapp-cli call")
-		print("       userapp-cli call user.get")
-		print("       userapp-cli call user.get user_id=abc")
-		print("")
-		print("COMMANDS")
-		print("")
-		print("  signup [email] [password]")
-		print("    Sign up for a new UserApp account.")
-		print("")
-		print("  login [email] [password]")
-		print("    Authenticate with UserApp and load your app id and token.")
-		print("")
-		print("  config list")
-		print("    List all config variables.")
-		print("")
-		print("  config get <variable>")
-		print("    Get a config variable. Available: app_id, token, base_address, secure, debug.")
-		print("")
-		print("  profile list")
-		print("    List all profiles.")
-		print("")
-		print("  profile current")
-		print("    Get the name of the current profile.")
-		print("")
-		print("  profile switch <name>")
-		print("    Switch to another profile.")
-		print("")
-		print("  config set <variable> <value>")
-		print("    Set a config variable.")
-		print("")
-		print("  call")
-		print("    Enter the callable scope.")
-		print("")
-		print("  call <service>.<method>")
-		print("    Call a UserApp API method. E.g. 'call user.login'.")
-		print("")
-		print("  call <service>.<method> variable=value other_var=other_val")
-		print("    Call a UserApp API method with arguments. E.g. 'call user.login login=joe83 password=secretpsw999'.")
-		print("")
+		return command
 
 class EnterScopeCommand(object):
 	def __init__(self, arguments):
@@ -370,158 +171,6 @@ class EnterScopeCommand(object):
 		for argument in self.arguments:
 			self.cli_context.enter(argument)
 
-class UserAppDashboardLaunchCommand(object):
-	def __init__(self):
-		self.config=ServiceLocator.get_instance().resolve('config')
-
-	def execute(self):
-		profile=self.config.get_selected_profile()
-		
-		if profile['user']['token'] is None:
-			if profile['user']['login'] is None:
-				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
-			
-			UserAppLoginCommand([profile['user']['login']]).execute()
-			profile=self.config.get_selected_profile()
-
-		api=userapp.API(
-			app_id=__userapp_master_app_id__,
-			secure=profile['server']['secure'],
-			base_address=profile['server']['base_address'],
-			debug=profile['server']['debug']
-		)
-
-		try:
-			login_result=api.user.login(
-				login=profile['user']['login'],
-				password=profile['user']['password']
-			)
-
-			print("(result) Launching dashboard...")
-
-			WebBrowserHelper.open_url('https://app.userapp.io/#/?ua_token='+str(login_result.token))
-		except Exception, e:
-			print("(error) " + str(e.message))
-
-class UserAppLoginCommand(object):
-	def __init__(self, arguments=None):
-		self.config=ServiceLocator.get_instance().resolve('config')
-
-		self.email=None
-		self.password=None
-
-		if arguments is None:
-			arguments=[]
-
-		if len(arguments) > 0:
-			self.email=arguments[0]
-
-		if len(arguments) > 1:
-			self.password=arguments[1]
-
-	def execute(self):
-		if self.email is None and self.password is None:
-			print("Enter your UserApp credentials.")
-
-		if self.email is None:
-			self.email=raw_input('email: ')
-
-		if self.password is None:
-			self.password=getpass.getpass('password: ')
-
-		profile=self.config.get_selected_profile()
-
-		api=userapp.API(
-			app_id=__userapp_master_app_id__,
-			secure=profile['server']['secure'],
-			base_address=profile['server']['base_address'],
-			debug=profile['server']['debug']
-		)
-
-		try:
-			token=None
-			token_identifier='UserApp CLI'
-
-			login_result=api.user.login(login=self.email, password=self.password)
-
-			app=api.app.get()
-			tokens=api.token.search(fields='*')
-
-			for item in tokens.items:
-				if item.name == token_identifier:
-					token=item.value
-
-			if token is None:
-				new_token=api.token.save(name=token_identifier, enabled=True)
-				token=new_token.value
-
-			profile=self.config.get_profile(self.email)
-
-			profile['user']['primary']=False
-			profile['user']['app_id']=app.app_id
-			profile['user']['login']=self.email
-			self.config.save()
-
-			profile['user']['token']=token
-			profile['user']['password']=self.password
-
-			print("(result) Logged in as user " + login_result.user_id)
-
-			if raw_input('Save credentials? ').lower() in ['yes', 'y', '']:
-				self.config.save()
-
-		except Exception, e:
-			print("(error) " + str(e.message))
-
-class UserAppRegisterCommand(object):
-	def __init__(self, arguments=None):
-		self.config=ServiceLocator.get_instance().resolve('config')
-
-		self.email=None
-		self.password=None
-
-		if arguments is None:
-			arguments=[]
-
-		if len(arguments) > 0:
-			self.email=arguments[0]
-
-		if len(arguments) > 1:
-			self.password=arguments[1]
-
-	def execute(self):
-		if self.email is None and self.password is None:
-			print("Create a new UserApp account.")
-
-		if self.email is None:
-			self.email=raw_input('email: ')
-
-		if self.password is None:
-			self.password=getpass.getpass('password: ')
-
-			if self.password != getpass.getpass('retype same password: '):
-				print("(error) Password did not match.")
-				return
-
-		profile=self.config.get_selected_profile()
-
-		api=userapp.API(
-			app_id=USERAPP_MASTER_APP_ID,
-			secure=profile['server']['secure'],
-			base_address=profile['server']['base_address'],
-			debug=profile['server']['debug']
-		)
-
-		try:
-			token=None
-			token_identifier='UserApp CLI'
-
-			signup_login=api.user.save(login=self.email, email=self.email, password=self.password)
-			UserAppLoginCommand([self.email, self.password]).execute()
-
-		except Exception, e:
-			print("(error) " + str(e.message))
-
 class ClearConsoleCommand(object):
 	def __init__(self):
 		pass
@@ -535,6 +184,7 @@ class InvalidCommand(object):
 
 	def execute(self):
 		print("(error) Invalid command '" + (' '.join(self.arguments)) + "'")
+		return 1
 
 class NopCommand(object):
 	def __init__(self):
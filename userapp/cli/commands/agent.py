@@ -0,0 +1,118 @@
+import os
+import sys
+import json
+import signal
+import socket
+
+from ..core import ServiceLocator
+from ..command import CliCommandParser
+
+class AgentCommand(object):
+	def __init__(self, arguments):
+		self.cli_context=ServiceLocator.get_instance().resolve('cli_context')
+
+		(self.options, self.arguments)=CliCommandParser().parse_options(arguments, ['idle-timeout'])
+
+	def execute(self):
+		arguments=self.arguments
+
+		if not hasattr(socket, 'AF_UNIX'):
+			print("(error) The agent requires Unix domain sockets, which this platform does not support.")
+			return 1
+
+		command=arguments.pop(0) if len(arguments) > 0 else None
+
+		if command in ['start', 'run']:
+			try:
+				idle_timeout=int(self.options.get('idle-timeout', 0))
+			except ValueError:
+				print("(error) Please specify the idle timeout in seconds.")
+				return 1
+
+			return self.start(idle_timeout, command == 'run')
+		elif command == 'stop':
+			from ..agent import AgentProtocol
+
+			if AgentProtocol.request({'control':'stop'}) is None:
+				print("(result) The agent is not running.")
+			else:
+				print("(result) Agent stopped.")
+		elif command == 'status':
+			from ..agent import AgentProtocol
+
+			status=AgentProtocol.request({'control':'status'})
+
+			if status is None:
+				print("(result) The agent is not running.")
+			else:
+				print("(result) " + json.dumps(status, sort_keys=True, indent=4))
+		else:
+			print("(error) Please specify a command (start, run, stop or status).")
+			return 1
+
+	def start(self, idle_timeout, foreground):
+		"""
+		Start an agent in this process (run) or in a detached background process (start).
+		"""
+		from ..agent import Agent
+		from ..agent import AgentProtocol
+		from ..clidriver import get_config_path
+
+		if self.cli_context.is_interactive():
+			print("(error) The agent can not be started from the interactive console.")
+			return 1
+
+		agent=Agent(AgentProtocol.get_socket_path(), get_config_path(), idle_timeout)
+
+		if agent.is_listening():
+			print("(error) The agent is already running.")
+			return 1
+
+		server=agent.listen()
+
+		# Stopped by a signal, the agent still removes its socket
+		signal.signal(signal.SIGTERM, lambda number, frame: sys.exit(0))
+
+		if foreground:
+			print("(result) Agent listening on '" + agent.socket_path + "'.")
+			sys.stdout.flush()
+
+			try:
+				agent.serve(server)
+			except KeyboardInterrupt:
+				print(" ")
+			return
+
+		pid=os.fork()
+
+		if pid > 0:
+			server.close()
+			os.waitpid(pid, 0)
+
+			print("(result) Agent listening on '" + agent.socket_path + "'.")
+			return
+
+		# Detach from the terminal and the parent, which waits for the first child only
+		os.setsid()
+
+		if os.fork() > 0:
+			os._exit(0)
+
+		log_path=os.path.join(os.path.dirname(agent.socket_path), 'agent.log')
+		log_fd=os.open(log_path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0600)
+		null_fd=os.open(os.devnull, os.O_RDONLY)
+
+		os.dup2(null_fd, 0)
+		os.dup2(log_fd, 1)
+		os.dup2(log_fd, 2)
+
+		status=0
+
+		try:
+			agent.serve(server)
+		except BaseException:
+			import traceback
+			traceback.print_exc()
+			status=1
+		finally:
+			os._exit(status)
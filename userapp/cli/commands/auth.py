@@ -0,0 +1,196 @@
+from .. import __userapp_master_app_id__
+from ..core import ServiceLocator
+from ..session import SessionCache
+
+class UserAppLoginCommand(object):
+	def __init__(self, arguments=None):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+		self.session_cache=service_locator.resolve('session_cache')
+
+		self.email=None
+		self.password=None
+
+		if arguments is None:
+			arguments=[]
+
+		if len(arguments) > 0:
+			self.email=arguments[0]
+
+		if len(arguments) > 1:
+			self.password=arguments[1]
+
+	def execute(self):
+		import getpass
+		import userapp
+
+		profile=self.config.get_selected_profile()
+		base_address=profile['server']['base_address']
+
+		session=None
+
+		# Without a password, resume the cached session of the login if there is one
+		if self.email is not None and self.password is None:
+			session=self.session_cache.get(self.email, base_address)
+
+			if session is not None and session.get('session_token') is None:
+				session=None
+
+		if session is None:
+			if self.email is None and self.password is None:
+				print("Enter your UserApp credentials.")
+
+			if self.email is None:
+				self.email=raw_input('email: ')
+
+			if self.password is None:
+				self.password=getpass.getpass('password: ')
+
+		api=self.client_pool.create_api(profile, __userapp_master_app_id__)
+
+		try:
+			try:
+				(session, token)=self.load_session(api, profile, session)
+			except userapp.UserAppServiceException, e:
+				if session is None or not SessionCache.is_auth_error(e):
+					raise
+
+				# The cached session is no longer valid, fall back to a full login
+				self.session_cache.invalidate(self.email, base_address)
+
+				if self.password is None:
+					self.password=getpass.getpass('password: ')
+
+				(session, token)=self.load_session(api, profile, None)
+
+			profile=self.config.get_profile(self.email)
+
+			profile['user']['primary']=False
+			profile['user']['app_id']=session['app_id']
+			profile['user']['login']=self.email
+			self.config.save()
+
+			profile['user']['token']=token
+
+			if self.password is not None:
+				profile['user']['password']=self.password
+
+			print("(result) Logged in as user " + session['user_id'])
+
+			if raw_input('Save credentials? ').lower() in ['yes', 'y', '']:
+				self.config.save()
+
+		except Exception, e:
+			print("(error) " + str(e.message))
+			return 1
+
+	def refresh_token(self, profile):
+		"""
+		Log in again without prompting and save the CLI token of the login to the
+		profile. Used when the API rejects the token of a profile with saved
+		credentials. Returns the token.
+		"""
+		base_address=profile['server']['base_address']
+
+		# The cached session resolves to the token that was just rejected
+		self.session_cache.invalidate(self.email, base_address)
+
+		api=self.client_pool.create_api(profile, __userapp_master_app_id__)
+		(session, token)=self.load_session(api, profile, None)
+
+		profile['user']['token']=token
+		self.config.save()
+
+		return token
+
+	def load_session(self, api, profile, session):
+		"""
+		Log in (unless a cached session is given) and resolve the app id and CLI token,
+		only asking the API for what the session cache does not already know.
+		Returns a tuple of (session, token).
+		"""
+		base_address=profile['server']['base_address']
+
+		if session is None:
+			login_result=api.user.login(login=self.email, password=self.password)
+			session=self.session_cache.update(self.email, base_address, session_token=login_result.token, user_id=login_result.user_id)
+		else:
+			api.set_option('token', session['session_token'])
+
+		if session.get('app_id') is None:
+			app=api.app.get()
+			session=self.session_cache.update(self.email, base_address, app_id=app.app_id)
+
+		token=None
+		token_identifier='UserApp CLI'
+
+		if session.get('token_id') is not None and self.config.has_profile(self.email):
+			token=self.config.get_profile(self.email)['user']['token']
+
+		if token is None:
+			token_id=None
+			tokens=api.token.search(fields='*')
+
+			for item in tokens.items:
+				if item.name == token_identifier:
+					token=item.value
+					token_id=item.token_id
+
+			if token is None:
+				new_token=api.token.save(name=token_identifier, enabled=True)
+				token=new_token.value
+				token_id=new_token.token_id
+
+			session=self.session_cache.update(self.email, base_address, token_id=token_id)
+
+		return (session, token)
+
+class UserAppRegisterCommand(object):
+	def __init__(self, arguments=None):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+
+		self.email=None
+		self.password=None
+
+		if arguments is None:
+			arguments=[]
+
+		if len(arguments) > 0:
+			self.email=arguments[0]
+
+		if len(arguments) > 1:
+			self.password=arguments[1]
+
+	def execute(self):
+		import getpass
+
+		if self.email is None and self.password is None:
+			print("Create a new UserApp account.")
+
+		if self.email is None:
+			self.email=raw_input('email: ')
+
+		if self.password is None:
+			self.password=getpass.getpass('password: ')
+
+			if self.password != getpass.getpass('retype same password: '):
+				print("(error) Password did not match.")
+				return 1
+
+		profile=self.config.get_selected_profile()
+
+		api=self.client_pool.create_api(profile, __userapp_master_app_id__)
+
+		try:
+			token=None
+			token_identifier='UserApp CLI'
+
+			signup_login=api.user.save(login=self.email, email=self.email, password=self.password)
+			return UserAppLoginCommand([self.email, self.password]).execute()
+
+		except Exception, e:
+			print("(error) " + str(e.message))
+			return 1
\ No newline at end of file
@@ -0,0 +1,153 @@
+import sys
+import json
+
+from ..core import ServiceLocator
+from ..command import CliCommandParser
+from ..loadtest import LoadTest
+from auth import UserAppLoginCommand
+
+BENCH_OUTPUT_FORMATS=['text', 'json']
+
+# Upper bounds (in seconds) of the latency distribution of the text report
+BENCH_LATENCY_BOUNDS=[decade*step for decade in [0.001, 0.01, 0.1, 1] for step in [1, 1.5, 2, 3, 5, 7.5]]+[10]
+
+class BenchCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+
+		(self.options, arguments)=CliCommandParser().parse_options(arguments, ['concurrency', 'duration', 'requests', 'rate', 'retries', 'output'])
+
+		self.target=arguments.pop(0) if len(arguments) > 0 else None
+		self.service=None
+		self.method=None
+		self.parameters={}
+
+		if len(arguments) > 0:
+			call_segments=arguments.pop(0).split('.')
+			self.method=call_segments.pop()
+			self.service='.'.join(call_segments)
+
+		for argument in arguments:
+			param_segments=argument.split('=', 1)
+			if len(param_segments) == 2:
+				self.parameters[param_segments[0]]=param_segments[1]
+
+	def execute(self):
+		if self.target != 'call' or not self.service:
+			print("(error) Please specify a method to benchmark, e.g. 'bench call user.get user_id=self --duration 30s'.")
+			return 1
+
+		output_format=self.options.get('output', 'text')
+
+		if output_format not in BENCH_OUTPUT_FORMATS:
+			print("(error) Invalid output format '" + output_format + "' (" + ', '.join(BENCH_OUTPUT_FORMATS) + ").")
+			return 1
+
+		try:
+			concurrency=int(self.options.get('concurrency', 8))
+			requests=int(self.options['requests']) if 'requests' in self.options else None
+			rate=float(self.options['rate']) if 'rate' in self.options else None
+			retries=int(self.options.get('retries', 0))
+			duration=BenchCommand.parse_duration(self.options['duration']) if 'duration' in self.options else None
+		except ValueError:
+			print("(error) Invalid concurrency, duration, request count, rate or retry count.")
+			return 1
+
+		if duration is None and requests is None:
+			duration=10.0
+
+		if concurrency < 1 or (rate is not None and rate <= 0):
+			print("(error) The concurrency and rate must be positive.")
+			return 1
+
+		profile=self.config.get_selected_profile()
+
+		if profile['user']['token'] is None:
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		client=self.client_pool.create_client(profile, connections=concurrency)
+
+		# Retried calls would hide errors and skew latencies, so none by default
+		scheduler=self.client_pool.get_scheduler(profile)
+		default_retries=scheduler.policy.retries
+		scheduler.policy.retries=retries
+
+		def call():
+			client.call(1, self.service, self.method, self.parameters)
+
+		load_test=LoadTest(call, concurrency=concurrency, duration=duration, requests=requests, rate=rate)
+
+		try:
+			load_test.run(self.report_progress)
+		finally:
+			scheduler.policy.retries=default_retries
+
+		report=load_test.get_report()
+		report['method']=self.service + '.' + self.method
+
+		if output_format == 'json':
+			sys.stdout.write(json.dumps(report, sort_keys=True) + '\n')
+		else:
+			self.print_report(report, load_test.histogram)
+
+		if load_test.failed > 0:
+			return 1
+
+	@staticmethod
+	def parse_duration(value):
+		"""
+		A duration in seconds from e.g. '30s', '2m', '500ms' or '10' (seconds).
+		"""
+		for (suffix, factor) in [('ms', 0.001), ('s', 1), ('m', 60), ('h', 3600)]:
+			if value.endswith(suffix):
+				return float(value[:-len(suffix)])*factor
+
+		return float(value)
+
+	def report_progress(self, load_test):
+		sys.stderr.write("(info) {n} requests, {f} failed, {t:.1f} requests/s\n".format(n=load_test.histogram.count, f=load_test.failed, t=load_test.get_throughput()))
+
+	def print_report(self, report, histogram):
+		latency=report['latency_ms']
+
+		print("(result) {n} requests to {m} in {d:.1f}s ({t:.1f} requests/s), {s} succeeded, {f} failed.".format(
+			n=report['requests'],
+			m=report['method'],
+			d=report['duration_s'],
+			t=report['throughput'],
+			s=report['succeeded'],
+			f=report['failed']
+		))
+
+		if report['requests'] == 0:
+			return
+
+		print("")
+		print("Latency (ms): min {min:.2f}, mean {mean:.2f}, p50 {p50:.2f}, p90 {p90:.2f}, p99 {p99:.2f}, max {max:.2f}".format(**latency))
+		print("")
+
+		distribution=histogram.get_distribution(BENCH_LATENCY_BOUNDS)
+		largest=max([count for (bound, count) in distribution])
+
+		# Only show the range of the distribution that has samples
+		counted=[index for (index, (bound, count)) in enumerate(distribution) if count > 0]
+
+		for (bound, count) in distribution[counted[0]:counted[-1]+1]:
+			label='> ' + BenchCommand.format_bound(BENCH_LATENCY_BOUNDS[-1]) if bound is None else '<= ' + BenchCommand.format_bound(bound)
+			print("  {l:>10}  {b:<40} {c}".format(l=label, b='#'*int(round(40.0*count/largest)), c=count))
+
+		if len(report['errors']) > 0:
+			print("")
+			print("Errors:")
+
+			for (key, count) in sorted(report['errors'].items(), key=lambda item: -item[1]):
+				print("  {k:<32} {c}".format(k=key, c=count))
+
+	@staticmethod
+	def format_bound(bound):
+		return '{b:g} ms'.format(b=bound*1000) if bound < 1 else '{b:g} s'.format(b=bound)
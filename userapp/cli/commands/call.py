@@ -0,0 +1,275 @@
+import sys
+import json
+
+from ..core import ServiceLocator
+from ..cache import ResponseCache
+from ..timing import Tracer
+from ..metrics import Metrics
+from ..command import CliCommandParser
+from ..engine import CallEngine
+from ..engine import CALL_ENGINES
+from ..output import ResultWriter
+from ..output import OUTPUT_FORMATS
+from ..pagination import SearchPaginator
+from auth import UserAppLoginCommand
+
+class UserAppApiCallCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+		self.response_cache=service_locator.resolve('response_cache')
+		self.tracer=Tracer.get_instance()
+
+		self.service=None
+		self.method=None
+		self.parameters=None
+
+		(self.options, arguments)=CliCommandParser().parse_options(arguments, ['batch', 'concurrency', 'connections', 'engine', 'output', 'page-size', 'prefetch', 'profiles'], ['all', 'all-profiles', 'no-cache', 'refresh'])
+
+		if len(arguments) > 0:
+			call=arguments.pop(0)
+
+			call_segments=call.split('.')
+			self.method=call_segments.pop()
+			self.service='.'.join(call_segments)
+
+			if len(arguments) > 0:
+				parameters={}
+
+				for argument in arguments:
+					param_segments=argument.split('=', 1)
+					if len(param_segments) == 2:
+						parameters[param_segments[0]]=param_segments[1]
+
+				self.parameters=parameters
+
+	def execute(self):
+		writer=ResultWriter.create(self.options.get('output'))
+
+		if writer is None:
+			print("(error) Invalid output format '" + self.options['output'] + "' (" + ', '.join(sorted(OUTPUT_FORMATS.keys())) + ").")
+			return 1
+
+		fan_out='profiles' in self.options or 'all-profiles' in self.options
+
+		# Single calls go straight to the client, they have nothing to schedule
+		if 'connections' in self.options and 'batch' not in self.options:
+			print("(error) --connections is only supported with --batch.")
+			return 1
+
+		if 'engine' in self.options and 'batch' not in self.options and not fan_out:
+			print("(error) --engine is only supported with --batch, --profiles and --all-profiles.")
+			return 1
+
+		if fan_out:
+			return self.execute_profiles()
+
+		profile=self.config.get_selected_profile()
+
+		if profile['user']['token'] is None:
+			if profile['user']['login'] is None:
+				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
+			
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		if 'batch' in self.options:
+			return self.execute_batch(profile, self.options['batch'])
+
+		with self.tracer.span('client.create'):
+			client=self.client_pool.create_client(profile)
+
+		if 'all' in self.options:
+			return self.execute_all(client, writer)
+
+		try:
+			with self.tracer.span('call', method=self.service + '.' + self.method):
+				result=self.call_cached(client, profile)
+
+			with self.tracer.span('render', output=self.options.get('output', 'pretty')):
+				writer.write(result)
+				writer.close()
+		except Exception, e:
+			print("(error) " + str(e.message))
+			return 1
+
+	def call_cached(self, client, profile):
+		"""
+		Call the method through the response cache if it is enabled and the method is
+		cacheable. Mutating methods invalidate the cached responses of their service.
+		"""
+		settings=profile['cache']
+		scope=ResponseCache.get_scope(profile['user']['login'], profile['user']['app_id'])
+		methods=[method.strip() for method in settings['cache_methods'].split(',')]
+
+		# Only reads skip the cache, mutations invalidate it even with --no-cache
+		if not settings['cache_enabled'] or 'no-cache' in self.options or self.service + '.' + self.method not in methods:
+			result=client.call(1, self.service, self.method, self.parameters)
+
+			if ResponseCache.is_mutating(self.method):
+				self.response_cache.invalidate(scope, self.service)
+
+			return result
+
+		import userapp
+
+		key=ResponseCache.get_key(self.service, self.method, self.parameters)
+
+		if 'refresh' not in self.options:
+			with self.tracer.span('cache.get') as span:
+				cached_result=self.response_cache.get(scope, self.service, key)
+				span.set('hit', cached_result is not None)
+
+			if cached_result is not None:
+				Metrics.get_instance().increment('cache_hits', method=self.service + '.' + self.method)
+				return userapp.DictionaryUtility.to_object(cached_result)
+
+		result=client.call(1, self.service, self.method, self.parameters)
+		self.response_cache.put(scope, self.service, key, result, settings['cache_ttl'], settings['cache_max_size'])
+
+		return result
+
+	def execute_all(self, client, writer):
+		"""
+		Walk all pages of a search method, streaming the items to the writer.
+		"""
+		if self.method != 'search':
+			print("(error) --all is only supported by search methods.")
+			return 1
+
+		try:
+			page_size=int(self.options.get('page-size', 100))
+			prefetch=int(self.options.get('prefetch', 4))
+		except ValueError:
+			print("(error) Invalid page size or prefetch count.")
+			return 1
+
+		def call(parameters):
+			return client.call(1, self.service, self.method, parameters)
+
+		try:
+			writer.write_items(SearchPaginator(call, self.parameters, page_size=page_size, prefetch=prefetch))
+			writer.close()
+		except Exception, e:
+			print("(error) " + str(e.message))
+			return 1
+
+	def execute_profiles(self):
+		"""
+		Execute the call against several profiles in parallel, each with its own client,
+		writing one NDJSON line tagged with the profile name per profile as they complete.
+		"""
+		if self.service is None:
+			print("(error) Please specify a method to call, e.g. 'call user.count --all-profiles'.")
+			return 1
+
+		if 'all-profiles' in self.options:
+			names=self.config.get_profile_names()
+		else:
+			names=[name.strip() for name in self.options['profiles'].split(',') if len(name.strip()) > 0]
+
+		try:
+			concurrency=int(self.options.get('concurrency', 8))
+		except ValueError:
+			print("(error) Invalid concurrency.")
+			return 1
+
+		engine=CallEngine.create(self.options.get('engine', 'concurrent'), concurrency)
+
+		if engine is None:
+			print("(error) Invalid engine '" + self.options['engine'] + "' (" + ', '.join(sorted(CALL_ENGINES.keys())) + ").")
+			return 1
+
+		# Profiles are resolved up front, the configuration is not safe to use from the workers
+		profiles=[]
+		status=None
+
+		for name in names:
+			if not self.config.has_profile(name):
+				self.write_line({'profile':name, 'error':{'message':"Invalid profile name '" + name + "'.", 'code':None}})
+				status=1
+			elif self.config.get_profile(name)['user']['token'] is None:
+				self.write_line({'profile':name, 'error':{'message':"Not authenticated. Please login as user " + name + ".", 'code':None}})
+				status=1
+			else:
+				profiles.append((name, self.config.get_profile(name)))
+
+		def call(entry):
+			(name, profile)=entry
+
+			with self.tracer.span('call', method=self.service + '.' + self.method, profile=name):
+				return self.call_cached(self.client_pool.create_client(profile), profile)
+
+		for (index, result, error) in engine.run(call, profiles):
+			if error is None:
+				self.write_line({'profile':profiles[index][0], 'result':result})
+			else:
+				self.write_line({'profile':profiles[index][0], 'error':{'message':str(error), 'code':getattr(error, 'error_code', None)}})
+				status=1
+
+		return status
+
+	def write_line(self, output):
+		import userapp
+
+		sys.stdout.write(json.dumps(output, cls=userapp.IterableObjectEncoder) + '\n')
+		sys.stdout.flush()
+
+	def execute_batch(self, profile, source):
+		"""
+		Execute one call per JSON line ({"service", "method", "params"}) read from a file
+		or stdin ('-'), writing one NDJSON result line per input line.
+		"""
+		try:
+			concurrency=int(self.options.get('concurrency', 8))
+			connections=int(self.options.get('connections', min(concurrency, 16)))
+		except ValueError:
+			print("(error) Invalid concurrency or connection count.")
+			return 1
+
+		engine=CallEngine.create(self.options.get('engine', 'concurrent'), concurrency)
+
+		if engine is None:
+			print("(error) Invalid engine '" + self.options['engine'] + "' (" + ', '.join(sorted(CALL_ENGINES.keys())) + ").")
+			return 1
+
+		client=self.client_pool.create_client(profile, connections=connections)
+
+		def read_lines(handle):
+			for line in handle:
+				if len(line.strip()) > 0:
+					yield line
+
+		def call(line):
+			request=json.loads(line)
+			return client.call(1, request['service'], request['method'], request.get('params'))
+
+		try:
+			handle=sys.stdin if source == '-' else open(source, 'r')
+		except IOError, e:
+			print("(error) Unable to open batch file '" + source + "'.")
+			return 1
+
+		status=None
+
+		try:
+			for (index, result, error) in engine.run(call, read_lines(handle)):
+				if error is None:
+					output={'index':index, 'result':result}
+				else:
+					output={'index':index, 'error':{'message':str(error), 'code':getattr(error, 'error_code', None)}}
+					status=1
+
+				self.write_line(output)
+		except (IOError, ValueError), e:
+			# Reading the input failed partway, the lines read before were executed
+			sys.stderr.write("(error) Unable to read batch file '" + source + "': " + str(e) + "\n")
+			status=1
+		finally:
+			if handle is not sys.stdin:
+				handle.close()
+
+		return status
\ No newline at end of file
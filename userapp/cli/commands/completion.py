@@ -0,0 +1,36 @@
+import os
+import sys
+
+from ..core import ServiceLocator
+from ..command import CliCommandRegistry
+from ..completion import Completer
+from ..completion import MethodCatalog
+
+COMPLETION_SHELLS=['bash', 'zsh']
+
+class CompletionCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.completion_index=service_locator.resolve('completion_index')
+
+		self.shell=arguments[0] if len(arguments) > 0 else None
+
+	def execute(self):
+		if self.shell not in COMPLETION_SHELLS:
+			print("(error) Please specify a shell (" + ', '.join(COMPLETION_SHELLS) + "), e.g. 'source <(userapp completion bash)'.")
+			return 1
+
+		# The script reads the methods and profiles from the index instead of running userapp
+		catalog=MethodCatalog(os.path.expanduser('~/.userapp/cache/methods.json'), url=os.environ.get('USERAPP_CATALOG_URL'), index=self.completion_index)
+		catalog.refresh()
+
+		try:
+			self.completion_index.write('methods', catalog.get_methods())
+			self.completion_index.write('profiles', self.config.get_profile_names())
+		except (IOError, OSError), e:
+			print("(error) Unable to write the completion index to '" + self.completion_index.directory + "': " + str(e))
+			return 1
+
+		completer=Completer(CliCommandRegistry.get_instance().get_names(), catalog)
+		sys.stdout.write(completer.render_script(self.shell, self.completion_index))
@@ -0,0 +1,157 @@
+import json
+
+from ..core import Configuration
+from ..core import ServiceLocator
+
+CONFIG_SECTIONS=[
+	('user', ['app_id', 'token', 'login', 'password']),
+	('server', ['base_address', 'debug', 'secure']),
+	('cache', ['cache_enabled', 'cache_ttl', 'cache_max_size', 'cache_methods'])
+]
+
+class ConfigCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.cli_context=service_locator.resolve('cli_context')
+		self.client_pool=service_locator.resolve('client_pool')
+		self.arguments=arguments
+
+	def execute(self):
+		arguments=self.arguments
+
+		profile=self.config.get_selected_profile()
+
+		def config_get_section(key):
+			for (section, keys) in CONFIG_SECTIONS:
+				if key in keys:
+					return section
+
+			return None
+
+		def config_exists(key):
+			section=config_get_section(key)
+
+			if section is None:
+				return False
+
+			return key in profile[section]
+
+		def config_set(key, value):
+			section=config_get_section(key)
+
+			if section is None:
+				return None
+
+			profile[section][key]=value
+
+		def config_get(key):
+			section=config_get_section(key)
+
+			if section is None:
+				return None
+
+			return profile[section][key]
+
+		if len(arguments) > 0:
+			command=arguments.pop(0)
+
+			if command == 'list':
+				result={}
+
+				profile=self.config.get_selected_profile()
+
+				for (key, value) in profile['user'].items():
+					result[key]='' if value is None else value
+
+				for section in ['server', 'cache']:
+					for (key, value) in profile[section].items():
+						result[key]='' if value is None else value
+
+				print("(result) " + json.dumps(result, sort_keys=True, indent=4))
+			elif command == 'get':
+				if len(arguments) == 0:
+					print("(error) Please specify a variable to get (debug, base_address, secure, app_id, token).")
+					return 1
+				elif not config_exists(arguments[0]):
+					print("(error) Invalid config variable '" + (arguments[0]) + "'.")
+					return 1
+				else:
+					current_value=config_get(arguments[0])
+
+					if isinstance(current_value, bool):
+						current_value='true' if current_value else 'false'
+
+					if current_value is None:
+						current_value = ''
+
+					print("(result) " + str(current_value))
+			elif command == 'set':
+				if len(arguments) == 0:
+					print("(error) Please specify a variable to set (debug, base_address, secure, app_id, token).")
+					return 1
+				if len(arguments) != 2:
+					print("(error) Please specify a value to set.")
+					return 1
+				elif not config_exists(arguments[0]):
+					print("(error) Invalid config variable '" + (arguments[0]) + "'.")
+					return 1
+				else:
+					new_value=arguments[1]
+					current_value=config_get(arguments[0])
+					
+					if arguments[0] in ['debug', 'secure', 'cache_enabled']:
+						new_value=Configuration.parseBooleanString(new_value)
+
+					if arguments[0] in ['cache_ttl', 'cache_max_size']:
+						try:
+							new_value=int(new_value)
+						except ValueError:
+							print("(error) Please specify a number of " + ('seconds' if arguments[0] == 'cache_ttl' else 'bytes') + ".")
+							return 1
+
+					config_set(arguments[0], new_value)
+
+					if arguments[0] in ['base_address', 'secure']:
+						self.client_pool.invalidate(profile)
+
+					print("(result) Changed config '"+arguments[0]+"' from '"+str(current_value)+"' to '"+str(new_value)+"'.")
+
+					if not self.cli_context.is_interactive():
+						self.config.save()
+			elif command == 'save':
+				self.config.save()
+				print("(result) Configuration saved")
+			elif command == 'migrate':
+				return self.migrate(arguments[0] if len(arguments) > 0 else None)
+			else:
+				print("(error) Please specify a command (list, get, set, save or migrate).")
+				return 1
+		else:
+			print("(error) Please specify a command (list, get, set, save or migrate).")
+			return 1
+
+	def migrate(self, backend):
+		from ..store import SqliteConfiguration
+
+		is_sqlite=isinstance(self.config, SqliteConfiguration)
+
+		if backend not in ['sqlite', 'json']:
+			print("(error) Please specify a backend to migrate to (sqlite or json).")
+			return 1
+		elif (backend == 'sqlite') == is_sqlite:
+			print("(error) The configuration is already stored as " + backend + ".")
+			return 1
+		else:
+			if backend == 'sqlite':
+				config=SqliteConfiguration.migrate_from(self.config)
+			else:
+				config=self.config.migrate_to_json()
+
+			ServiceLocator.get_instance().register('config', config)
+			self.config=config
+
+			print("(result) Migrated " + str(len(config.get_profile_names())) + " profile(s) to '" + config.get_file_path() + "'.")
+
+			if backend == 'sqlite':
+				print("(info) '" + SqliteConfiguration.get_config_path(config.get_file_path()) + "' is kept as a backup, with the tokens and passwords removed.")
\ No newline at end of file
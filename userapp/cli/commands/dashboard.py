@@ -0,0 +1,69 @@
+from .. import __userapp_master_app_id__
+from ..core import ServiceLocator
+from ..helper import WebBrowserHelper
+from ..session import SessionCache
+from auth import UserAppLoginCommand
+
+class UserAppDashboardLaunchCommand(object):
+	def __init__(self, arguments=None):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+		self.session_cache=service_locator.resolve('session_cache')
+
+	def execute(self):
+		profile=self.config.get_selected_profile()
+		
+		if profile['user']['token'] is None:
+			if profile['user']['login'] is None:
+				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
+			
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		login=profile['user']['login']
+		base_address=profile['server']['base_address']
+
+		try:
+			session_token=self.session_cache.get_session_token(login, base_address)
+
+			if session_token is not None and not self.is_session_valid(profile, session_token):
+				# Revoked or expired on the server before the cache entry expired
+				self.session_cache.invalidate(login, base_address)
+				session_token=None
+
+			if session_token is None:
+				api=self.client_pool.create_api(profile, __userapp_master_app_id__)
+
+				login_result=api.user.login(
+					login=login,
+					password=profile['user']['password']
+				)
+
+				session_token=login_result.token
+				self.session_cache.update(login, base_address, session_token=session_token, user_id=login_result.user_id)
+
+			print("(result) Launching dashboard...")
+
+			WebBrowserHelper.open_url('https://app.userapp.io/#/?ua_token='+str(session_token))
+		except Exception, e:
+			print("(error) " + str(e.message))
+			return 1
+
+	def is_session_valid(self, profile, session_token):
+		"""
+		Whether the API still accepts a cached session token, checked with a heartbeat.
+		"""
+		api=self.client_pool.create_api(profile, __userapp_master_app_id__, session_token)
+
+		try:
+			api.token.heartbeat()
+		except Exception, e:
+			if SessionCache.is_auth_error(e):
+				return False
+
+			raise
+
+		return True
\ No newline at end of file
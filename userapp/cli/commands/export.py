@@ -0,0 +1,189 @@
+import os
+import sys
+import json
+import time
+
+from ..core import ServiceLocator
+from ..command import CliCommandParser
+from ..output import NdjsonResultWriter
+from ..output import CsvResultWriter
+from ..pagination import SearchPaginator
+from auth import UserAppLoginCommand
+
+EXPORT_RESOURCES={
+	'users':'user'
+}
+
+EXPORT_FORMATS={
+	'jsonl':NdjsonResultWriter,
+	'csv':CsvResultWriter
+}
+
+class ExportCheckpoint(object):
+	"""
+	Remembers how far an export to a file got: the next page to fetch and the size of
+	the file once the pages before it were written. Saved after every page, so an
+	interrupted export resumes from the last complete page.
+	"""
+	def __init__(self, file_path, key):
+		self.file_path=file_path
+		self.key=key
+
+	def load(self):
+		"""
+		Returns the saved state if it belongs to the same export, otherwise None.
+		"""
+		try:
+			with open(self.file_path, 'r') as handle:
+				state=json.load(handle)
+		except (IOError, ValueError):
+			return None
+
+		return state if state.get('key') == self.key else None
+
+	def save(self, **state):
+		state['key']=self.key
+		temp_path='{p}.{i}.tmp'.format(p=self.file_path, i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			json.dump(state, handle)
+
+		os.rename(temp_path, self.file_path)
+
+	def remove(self):
+		if os.path.exists(self.file_path):
+			os.remove(self.file_path)
+
+class ExportCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+
+		(self.options, arguments)=CliCommandParser().parse_options(arguments, ['format', 'out', 'checkpoint', 'page-size', 'concurrency'], ['restart'])
+
+		self.resource=arguments.pop(0) if len(arguments) > 0 else None
+		self.parameters={}
+
+		for argument in arguments:
+			param_segments=argument.split('=', 1)
+			if len(param_segments) == 2:
+				self.parameters[param_segments[0]]=param_segments[1]
+
+	def execute(self):
+		if self.resource not in EXPORT_RESOURCES:
+			sys.stderr.write("(error) Please specify what to export (" + ', '.join(sorted(EXPORT_RESOURCES.keys())) + ").\n")
+			return 1
+
+		export_format=self.options.get('format', 'jsonl')
+
+		if export_format not in EXPORT_FORMATS:
+			sys.stderr.write("(error) Invalid export format '" + export_format + "' (" + ', '.join(sorted(EXPORT_FORMATS.keys())) + ").\n")
+			return 1
+
+		try:
+			page_size=int(self.options.get('page-size', 100))
+			concurrency=int(self.options.get('concurrency', 4))
+		except ValueError:
+			sys.stderr.write("(error) Invalid page size or concurrency.\n")
+			return 1
+
+		out_path=self.options.get('out', '-')
+
+		if out_path == '-' and 'checkpoint' in self.options:
+			sys.stderr.write("(error) Checkpoints require an output file (--out).\n")
+			return 1
+
+		profile=self.config.get_selected_profile()
+
+		if profile['user']['token'] is None:
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		service=EXPORT_RESOURCES[self.resource]
+		client=self.client_pool.create_client(profile)
+
+		def call(parameters):
+			return client.call(1, service, 'search', parameters)
+
+		paginator=SearchPaginator(call, self.parameters, page_size=page_size, prefetch=concurrency)
+
+		checkpoint=None
+		state=None
+
+		if out_path != '-':
+			checkpoint=ExportCheckpoint(self.options.get('checkpoint', out_path + '.checkpoint'), [
+				profile['user']['app_id'], service, self.parameters, page_size, export_format
+			])
+
+			if 'restart' not in self.options and os.path.exists(out_path):
+				state=checkpoint.load()
+
+		try:
+			if out_path == '-':
+				stream=sys.stdout
+			elif state is None:
+				stream=open(out_path, 'wb')
+			else:
+				stream=open(out_path, 'r+b')
+				stream.seek(state['offset'])
+				stream.truncate()
+		except IOError, e:
+			sys.stderr.write("(error) Unable to open '" + out_path + "' for writing: " + str(e.strerror) + "\n")
+			return 1
+
+		writer=EXPORT_FORMATS[export_format](stream)
+
+		if state is not None and state.get('columns') is not None:
+			writer.resume(state['columns'])
+
+		records=0 if state is None else state['records']
+		first_page=1 if state is None else state['next_page']
+
+		if state is not None:
+			sys.stderr.write("(info) Resuming at page {p}, {r} records already exported.\n".format(p=first_page, r=records))
+
+		started=time.time()
+		reported=started
+		resumed_records=records
+
+		try:
+			for (number, page) in paginator.iter_pages(first_page):
+				items=SearchPaginator.get_items(page)
+
+				writer.write_items(items)
+				records += len(items)
+
+				if checkpoint is not None:
+					stream.flush()
+					checkpoint.save(next_page=number+1, offset=stream.tell(), records=records, columns=getattr(writer, 'columns', None))
+
+				if time.time()-reported >= 1:
+					reported=time.time()
+					self.report_progress(records, resumed_records, SearchPaginator.get_total(page), reported-started)
+		except Exception, e:
+			sys.stderr.write("(error) " + str(getattr(e, 'message', e)) + "\n")
+			return 1
+		finally:
+			if stream is not sys.stdout:
+				stream.close()
+
+		if stream is sys.stdout:
+			writer.close()
+
+		if checkpoint is not None:
+			checkpoint.remove()
+
+		duration=time.time()-started
+		rate=(records-resumed_records)/duration if duration > 0 else 0
+
+		if stream is sys.stdout:
+			sys.stderr.write("(result) Exported {r} {n} in {d:.1f}s ({s:.0f} records/s).\n".format(r=records, n=self.resource, d=duration, s=rate))
+		else:
+			print("(result) Exported {r} {n} to '{o}' in {d:.1f}s ({s:.0f} records/s).".format(r=records, n=self.resource, o=out_path, d=duration, s=rate))
+
+	def report_progress(self, records, resumed_records, total, duration):
+		rate=(records-resumed_records)/duration if duration > 0 else 0
+		sys.stderr.write("(info) {r}{t} records, {s:.0f} records/s\n".format(r=records, t='' if total is None else '/' + str(total), s=rate))
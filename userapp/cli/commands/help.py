@@ -0,0 +1,134 @@
+class HelpCommand(object):
+	def __init__(self, arguments=None):
+		pass
+
+	def execute(self):
+		print("Usage: userapp-cli [--timing] [--profile-cpu <file>] [--profile-mem <file>] [COMMAND] [OPTIONS] [OPTIONS...]")
+		print("       userapp-cli [--timing] [--continue-on-error] -f <script|->")
+		print("       userapp-cli signup john@doe.com mysecretpsw999")
+		print("       userapp-cli login john@doe.com mysecretpsw999")
+		print("       userapp-cli config list")
+		print("       userapp-cli config get app_id")
+		print("       userapp-cli config set app_id 123")
+		print("       userapp-cli call")
+		print("       userapp-cli call user.get")
+		print("       userapp-cli call user.get user_id=abc")
+		print("")
+		print("GLOBAL OPTIONS")
+		print("")
+		print("  --timing")
+		print("    Print a breakdown of where the time of the command went to stderr. USERAPP_TRACE=json prints it as JSON lines.")
+		print("")
+		print("  -f <script|->")
+		print("    Execute the commands of a script file, or of stdin with '-', one per line in one process. Lines starting with '#' are skipped.")
+		print("    Commands are also read from stdin when it is not a terminal and no command is given.")
+		print("")
+		print("  --continue-on-error")
+		print("    Keep executing a script after a command has failed. The exit status is 1 if any command failed.")
+		print("")
+		print("  --profile-cpu <file>")
+		print("    Profile the CPU time of the command into a pstats file ('python -m pstats <file>'). Files ending with .collapsed or")
+		print("    .folded get sampled stacks for flame graph tools instead.")
+		print("")
+		print("  --profile-mem <file>")
+		print("    Write the top allocation sites of the command (tracemalloc), or the object types that grew the most on Python 2.")
+		print("    In scripts and the interactive console, every command gets its own files: <file>.1.<ext>, <file>.2.<ext>, ...")
+		print("")
+		print("ENVIRONMENT")
+		print("")
+		print("  USERAPP_METRICS_TEXTFILE=<file>")
+		print("    Add request and command counts, latency histograms, retries and error classes to a Prometheus textfile collector")
+		print("    file after every command. The counts add up across processes.")
+		print("")
+		print("  USERAPP_STATSD=<host:port>")
+		print("    Send the same metrics to StatsD over UDP, as userapp.cli.<metric>.<labels...>.")
+		print("")
+		print("COMMANDS")
+		print("")
+		print("  signup [email] [password]")
+		print("    Sign up for a new UserApp account.")
+		print("")
+		print("  login [email] [password]")
+		print("    Authenticate with UserApp and load your app id and token.")
+		print("")
+		print("  config list")
+		print("    List all config variables.")
+		print("")
+		print("  config get <variable>")
+		print("    Get a config variable. Available: app_id, token, base_address, secure, debug, cache_enabled, cache_ttl, cache_max_size, cache_methods.")
+		print("")
+		print("  profile list")
+		print("    List all profiles.")
+		print("")
+		print("  profile current")
+		print("    Get the name of the current profile.")
+		print("")
+		print("  profile switch <name>")
+		print("    Switch to another profile.")
+		print("")
+		print("  config set <variable> <value>")
+		print("    Set a config variable.")
+		print("")
+		print("  config migrate <sqlite|json>")
+		print("    Move the profiles to an indexed SQLite database next to the config file, or back to JSON.")
+		print("    Use sqlite when managing many profiles.")
+		print("")
+		print("  call")
+		print("    Enter the callable scope.")
+		print("")
+		print("  call <service>.<method>")
+		print("    Call a UserApp API method. E.g. 'call user.login'.")
+		print("    Network errors, server errors and throttling are retried with backoff, and fewer calls are sent at once while the")
+		print("    API throttles. Calls that change data (save, remove, ...) and logins are only retried when throttled or when the")
+		print("    connection could not be established. A rejected token is renewed once with the saved credentials of the profile.")
+		print("")
+		print("  call <service>.<method> variable=value other_var=other_val")
+		print("    Call a UserApp API method with arguments. E.g. 'call user.login login=joe83 password=secretpsw999'.")
+		print("")
+		print("  call <service>.<method> --output <json|compact|ndjson|csv>")
+		print("    Write the result in a machine readable format. ndjson and csv write one line per item of search results.")
+		print("")
+		print("  call <service>.<method> --profiles <name,name,...>|--all-profiles [--concurrency <n>]")
+		print("    Call the method with every given profile in parallel, writing one JSON line per profile as calls complete.")
+		print("")
+		print("  call <service>.search --all [--page-size <n>] [--prefetch <n>]")
+		print("    Stream the items of all result pages, fetching the next pages concurrently.")
+		print("")
+		print("  call <service>.<method> [--no-cache|--refresh]")
+		print("    With cache_enabled, read-only methods listed in cache_methods are served from a local cache for cache_ttl seconds.")
+		print("    --no-cache bypasses the cache, --refresh fetches and caches a fresh response.")
+		print("")
+		print("  call --batch <file|-> [--engine <concurrent|sync>] [--concurrency <n>] [--connections <n>]")
+		print("    Execute one call per JSON line ({\"service\", \"method\", \"params\"}), writing one result line per call.")
+		print("    Up to --concurrency calls (default 8) are in flight over at most --connections keep-alive connections.")
+		print("")
+		print("  init <dir name> <frontend> [backend] [--offline]")
+		print("    Create an app from the quickstart templates, e.g. 'init myapp angularjs nodejs'. Templates are cached in")
+		print("    ~/.userapp/cache/templates and only downloaded again when they changed. With --offline, only cached templates")
+		print("    are used. The frontend and backend download at the same time and are extracted as they arrive; an interrupted")
+		print("    download resumes where it stopped.")
+		print("")
+		print("  export users [--format <jsonl|csv>] [--out <file>] [--page-size <n>] [--concurrency <n>] [variable=value ...]")
+		print("    Write all users, one record per line, fetching --concurrency pages at a time. Progress goes to stderr.")
+		print("    With --out, an interrupted export resumes from a checkpoint (--checkpoint, default <file>.checkpoint). --restart starts over.")
+		print("")
+		print("  import users <file|-> [--format <jsonl|csv>] [--concurrency <n>] [--rate <calls/s>] [--retries <n>] [--failures <file>]")
+		print("    Save one user per line or row with user.save, at most --rate calls per second (default 50, 0 for no limit).")
+		print("    Rows are validated first, transient errors are retried and failed rows go to <file>.failures.<ext> with an '_error' field.")
+		print("")
+		print("  bench call <service>.<method> [variable=value...] [--concurrency <n>] [--duration <30s|2m>] [--requests <n>] [--rate <calls/s>]")
+		print("        [--retries <n>] [--output <text|json>]")
+		print("    Load test an API method. Without --rate, <n> callers call back to back (closed loop, default 8); with --rate, calls")
+		print("    start at that rate whether or not earlier calls completed (open loop). Reports throughput, latency percentiles and")
+		print("    errors. Calls are not retried unless --retries is given. Runs for 10s unless --duration or --requests is given.")
+		print("")
+		print("  completion <bash|zsh>")
+		print("    Print a shell completion script, e.g. 'source <(userapp completion bash)'. The script completes commands, config")
+		print("    keys, profiles and methods without starting userapp, from word lists in ~/.userapp/cache/completion.")
+		print("    The interactive console completes the same on Tab. Methods come from a catalog cached for a day, fetched from")
+		print("    USERAPP_CATALOG_URL (a JSON list of 'service.method' names) if set.")
+		print("")
+		print("  agent <start|run|stop|status> [--idle-timeout <seconds>]")
+		print("    Keep a background agent running that executes commands with warm connections, skipping the startup cost.")
+		print("    While it runs, commands are forwarded to it over ~/.userapp/agent.sock (USERAPP_AGENT_SOCKET). 'run' stays in the foreground.")
+		print("")
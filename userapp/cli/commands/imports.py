@@ -0,0 +1,263 @@
+import os
+import sys
+import json
+import time
+
+from ..core import ServiceLocator
+from ..command import CliCommandParser
+from ..engine import CallEngine
+from ..ratelimit import TokenBucket
+from auth import UserAppLoginCommand
+
+IMPORT_RESOURCES={
+	'users':'user'
+}
+
+IMPORT_FORMATS=['jsonl', 'csv']
+
+class ImportFailures(object):
+	"""
+	Writes the rows that failed to a file in the input format, with the reason in an
+	'_error' field. Fields starting with '_' are ignored on import, so the file can be
+	imported again once fixed. The file is only created once a row has failed.
+	"""
+	def __init__(self, file_path, import_format, columns=None):
+		self.file_path=file_path
+		self.import_format=import_format
+		self.columns=columns
+		self.handle=None
+		self.writer=None
+		self.count=0
+
+	def write(self, row, message):
+		self.count += 1
+
+		if self.file_path is None:
+			sys.stderr.write("(error) " + message + ": " + json.dumps(row) + "\n")
+			return
+
+		if self.handle is None:
+			self.handle=open(self.file_path, 'wb')
+
+		row=dict(row)
+		row['_error']=message
+
+		if self.import_format == 'jsonl':
+			self.handle.write(json.dumps(row) + '\n')
+			return
+
+		if self.writer is None:
+			import csv
+
+			columns=[column for column in (self.columns or sorted(row.keys())) if column != '_error']
+			self.writer=csv.DictWriter(self.handle, columns + ['_error'], extrasaction='ignore')
+			self.writer.writeheader()
+
+		self.writer.writerow(dict([(key, json.dumps(value) if isinstance(value, (dict, list)) else value) for (key, value) in row.items()]))
+
+	def close(self):
+		if self.handle is not None:
+			self.handle.close()
+
+class ImportCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.client_pool=service_locator.resolve('client_pool')
+
+		(self.options, arguments)=CliCommandParser().parse_options(arguments, ['format', 'concurrency', 'rate', 'retries', 'failures'])
+
+		self.resource=arguments.pop(0) if len(arguments) > 0 else None
+		self.source=arguments.pop(0) if len(arguments) > 0 else None
+
+	def execute(self):
+		if self.resource not in IMPORT_RESOURCES or self.source is None:
+			print("(error) Please specify what to import and from which file, e.g. 'import users users.csv'.")
+			return 1
+
+		import_format=self.options.get('format', 'csv' if self.source.lower().endswith('.csv') else 'jsonl')
+
+		if import_format not in IMPORT_FORMATS:
+			print("(error) Invalid import format '" + import_format + "' (" + ', '.join(IMPORT_FORMATS) + ").")
+			return 1
+
+		try:
+			concurrency=int(self.options.get('concurrency', 8))
+			rate=float(self.options.get('rate', 50))
+			retries=int(self.options.get('retries', 3))
+		except ValueError:
+			print("(error) Invalid concurrency, rate or retry count.")
+			return 1
+
+		if self.source == '-':
+			failures_path=self.options.get('failures')
+		else:
+			(base_path, extension)=os.path.splitext(self.source)
+			failures_path=self.options.get('failures', base_path + '.failures' + extension)
+
+		try:
+			handle=sys.stdin if self.source == '-' else open(self.source, 'rb')
+		except IOError, e:
+			print("(error) Unable to open '" + self.source + "': " + str(e.strerror))
+			return 1
+
+		profile=self.config.get_selected_profile()
+
+		if profile['user']['token'] is None:
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		service=IMPORT_RESOURCES[self.resource]
+		client=self.client_pool.create_client(profile, connections=min(concurrency, 16))
+
+		# Retries and backoff are left to the profile's request scheduler
+		scheduler=self.client_pool.get_scheduler(profile)
+		(default_retries, retried)=(scheduler.policy.retries, scheduler.retried)
+		scheduler.policy.retries=retries
+
+		bucket=TokenBucket(rate)
+
+		def save(entry):
+			(number, row, error)=entry
+
+			if error is not None:
+				return (entry, error)
+
+			bucket.acquire()
+
+			try:
+				client.call(1, service, 'save', ImportCommand.get_fields(row))
+				return (entry, None)
+			except Exception, e:
+				return (entry, 'Line {n}: {m}'.format(n=number, m=getattr(e, 'message', None) or str(e)))
+
+		if import_format == 'csv':
+			import csv
+
+			reader=csv.DictReader(handle)
+			rows=self.read_csv(reader)
+			failures=ImportFailures(failures_path, import_format, reader.fieldnames)
+		else:
+			rows=self.read_jsonl(handle)
+			failures=ImportFailures(failures_path, import_format)
+
+		started=time.time()
+		reported=started
+		(processed, imported)=(0, 0)
+		stopped=None
+
+		try:
+			for (index, outcome, error) in CallEngine.create('concurrent', concurrency).run(save, rows):
+				(entry, message)=outcome
+				processed += 1
+
+				if message is None:
+					imported += 1
+				else:
+					failures.write(entry[1], message)
+
+				if time.time()-reported >= 1:
+					reported=time.time()
+					sys.stderr.write("(info) {p} rows, {i} imported, {f} failed, {r:.0f} rows/s\n".format(p=processed, i=imported, f=failures.count, r=processed/(reported-started)))
+		except (IOError, ValueError), e:
+			# Reading the input failed partway, the rows read before were imported
+			stopped=e
+		finally:
+			scheduler.policy.retries=default_retries
+			failures.close()
+
+			if handle is not sys.stdin:
+				handle.close()
+
+		duration=time.time()-started
+
+		print("(result) Imported {i} {n}, {f} failed, {r} retries, in {d:.1f}s ({s:.0f} rows/s).".format(
+			i=imported,
+			n=self.resource,
+			f=failures.count,
+			r=scheduler.retried-retried,
+			d=duration,
+			s=processed/duration if duration > 0 else 0
+		))
+
+		if failures.count > 0 and failures_path is not None:
+			print("(info) The failed rows were written to '" + failures_path + "'.")
+
+		if stopped is not None:
+			print("(error) The import stopped before the end of '" + self.source + "': " + str(stopped))
+			return 1
+
+		if failures.count > 0:
+			return 1
+
+	@staticmethod
+	def get_fields(row):
+		"""
+		The fields to save: without empty values and fields starting with '_'.
+		"""
+		return dict([(key, value) for (key, value) in row.items() if key is not None and not key.startswith('_') and value is not None and value != ''])
+
+	@staticmethod
+	def validate(row):
+		"""
+		Returns why the row can't be imported, or None.
+		"""
+		if not isinstance(row, dict):
+			return 'Not an object'
+
+		fields=ImportCommand.get_fields(row)
+
+		if 'login' not in fields and 'user_id' not in fields:
+			return "Missing 'login' or 'user_id'"
+
+		if 'email' in fields and (not isinstance(fields['email'], basestring) or '@' not in fields['email']):
+			return "Invalid 'email'"
+
+		return None
+
+	def read_jsonl(self, handle):
+		"""
+		Yield (line number, row, error) for every line, reading lazily.
+		"""
+		for (index, line) in enumerate(handle):
+			if len(line.strip()) == 0:
+				continue
+
+			try:
+				row=json.loads(line)
+			except ValueError, e:
+				yield (index+1, {'_line':line.rstrip('\r\n')}, 'Line {n}: Invalid JSON ({m})'.format(n=index+1, m=e))
+				continue
+
+			error=ImportCommand.validate(row)
+			yield (index+1, row, None if error is None else 'Line {n}: {m}'.format(n=index+1, m=error))
+
+	def read_csv(self, reader):
+		"""
+		Yield (line number, row, error) for every record, reading lazily. A record that
+		can't be parsed fails on its own, and reading goes on with the next one.
+		"""
+		import csv
+
+		while True:
+			try:
+				row=next(reader)
+			except StopIteration:
+				return
+			except csv.Error, e:
+				# DictReader only updates its line number with every parsed record
+				yield (reader.reader.line_num, {}, 'Line {n}: Invalid CSV ({m})'.format(n=reader.reader.line_num, m=e))
+				continue
+
+			# Nested values are exported as JSON, see CsvResultWriter
+			for (key, value) in row.items():
+				if isinstance(value, str) and value[:1] in ['{', '[']:
+					try:
+						row[key]=json.loads(value)
+					except ValueError:
+						pass
+
+			error=ImportCommand.validate(row)
+			yield (reader.line_num, row, None if error is None else 'Line {n}: {m}'.format(n=reader.line_num, m=error))
@@ -0,0 +1,94 @@
+import os
+
+from ..core import ServiceLocator
+from ..command import CliCommandParser
+from ..helper import FileHelper
+from ..helper import ProcessHelper
+from ..helper import WebBrowserHelper
+from auth import UserAppLoginCommand
+
+class InitCommand(object):
+	"""
+	Currently a bit hacked together. Will have to deal \w all types of backends/frontends in the future.
+	"""
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.cli_context=service_locator.resolve('cli_context')
+		self.template_cache=service_locator.resolve('template_cache')
+
+		(self.options, self.arguments)=CliCommandParser().parse_options(arguments, [], ['offline'])
+
+	def execute(self):
+		arguments=self.arguments
+
+		current_dir_path=os.getcwd()
+		profile=self.config.get_selected_profile()
+
+		def inject_app_id(file_path):
+			FileHelper.search_replace_file(file_path, 'YOUR-USERAPP-APP-ID', profile['user']['app_id'])
+
+		if profile['user']['token'] is None:
+			if profile['user']['login'] is None:
+				print("(info) Not authenticated. Please login" + ('' if profile['user']['login'] is None else ' login as user' + profile['user']['login']) + '.')
+			
+			if UserAppLoginCommand([profile['user']['login']]).execute():
+				return 1
+
+			profile=self.config.get_selected_profile()
+
+		if len(arguments) > 1:
+			app_name=arguments.pop(0)
+
+			target_dir_path=current_dir_path+'/'+app_name
+
+			if not os.path.exists(target_dir_path):
+				os.makedirs(target_dir_path)
+
+			frontend=arguments.pop(0)
+
+			templates_url=os.environ.get('USERAPP_TEMPLATES_URL', 'https://app.userapp.io/partials/docs/quickstart').rstrip('/')
+			offline='offline' in self.options
+
+			frontend_zip_url=templates_url+'/{name}/frontend/userapp-{name}-demo.zip'
+			backend_zip_url=templates_url+'/{name}/backend/userapp-{name}-backend.zip'
+
+			downloads=[(frontend_zip_url.format(name=frontend), target_dir_path + '/public')]
+			backend=arguments.pop(0) if len(arguments) > 0 else None
+
+			if backend is not None:
+				downloads.append((backend_zip_url.format(name=backend), target_dir_path))
+
+			# The frontend and backend are downloaded at the same time
+			errors=FileHelper.unzip_urls(downloads, self.template_cache, offline)
+
+			for (kind, name, error) in zip(['Frontend', 'Backend'], [frontend, backend], errors):
+				if error == 'invalid_url':
+					print("(error) "+kind+" '"+name+"' does not exist.")
+					return 1
+
+				if error == 'offline':
+					print("(error) "+kind+" '"+name+"' is not cached, run init once while online.")
+					return 1
+
+				if error == 'invalid_zip':
+					print("(error) "+kind+" '"+name+"' is not a valid archive.")
+					return 1
+
+				if isinstance(error, tuple) and error[0] == 'download_failed':
+					print("(error) "+kind+" '"+name+"' could not be downloaded: "+error[1])
+					return 1
+
+			if frontend == 'angularjs':
+				inject_app_id(target_dir_path + '/public/js/app.js')
+
+			if backend == 'nodejs':
+				inject_app_id(target_dir_path + '/app.js')
+
+				ProcessHelper.execute('sudo npm install', cwd=target_dir_path+'/')
+				ProcessHelper.execute('nodejs app.js', block=False, wait=False, cwd=target_dir_path+'/')
+
+				WebBrowserHelper.open_url('http://localhost:3000')
+		else:
+			print("(error) Please specify <dir name> <frontend> <backend>. E.g. 'init myapp angularjs nodejs'.")
+			return 1
\ No newline at end of file
@@ -0,0 +1,49 @@
+import json
+
+from ..core import ServiceLocator
+
+class ProfileCommand(object):
+	def __init__(self, arguments):
+		service_locator=ServiceLocator.get_instance()
+		self.config=service_locator.resolve('config')
+		self.cli_context=service_locator.resolve('cli_context')
+		self.client_pool=service_locator.resolve('client_pool')
+		self.arguments=arguments
+
+	def execute(self):
+		arguments=self.arguments
+
+		profile=self.config.get_selected_profile()
+
+		if len(arguments) > 0:
+			command=arguments.pop(0)
+
+			if command == 'list':
+				print("(result) " + json.dumps(self.config.get_profile_names(), indent=4))
+			elif command == 'current':
+				profile_login=profile['user']['login']
+				print("(result) " + ("No profile. Use 'login' or 'register' if you want to create a new profile." if profile_login is None else profile_login))
+			elif command == 'switch':
+				if len(arguments) == 0:
+					print("(error) Please specify a profile to switch to. For valid profiles, try 'profile list'.")
+					return 1
+				elif not self.config.has_profile(arguments[0]):
+					print("(error) Invalid profile name '" + (arguments[0]) + "'.")
+					return 1
+				else:
+					name=arguments[0]
+
+					if raw_input('Set as primary? ').lower() in ['yes', 'y']:
+						profile['primary']=False
+						profile=self.config.get_profile(name)
+						profile['primary']=True
+						self.config.save()
+
+					self.client_pool.invalidate(self.config.get_selected_profile())
+					self.config.set_selected_profile(name)
+			else:
+				print("(error) Please specify a command (list, current or switch).")
+				return 1
+		else:
+			print("(error) Please specify a command (list, current or switch).")
+			return 1
\ No newline at end of file
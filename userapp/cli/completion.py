@@ -0,0 +1,348 @@
+import os
+import json
+import time
+import threading
+
+from core import ServiceLocator
+from commands.config import CONFIG_SECTIONS
+
+# The methods of the UserApp API (v1), completed until a catalog has been fetched
+BUILTIN_METHODS=[
+	'app.get', 'app.remove', 'app.save', 'app.search',
+	'feature.get', 'feature.remove', 'feature.save', 'feature.search',
+	'invoice.get', 'invoice.remove', 'invoice.save', 'invoice.search',
+	'oauth.connection.get', 'oauth.connection.remove', 'oauth.connection.search',
+	'oauth.getAccessToken', 'oauth.getAuthorizationUrl',
+	'payment_method.get', 'payment_method.remove', 'payment_method.save', 'payment_method.search',
+	'permission.get', 'permission.remove', 'permission.save', 'permission.search',
+	'price_list.get', 'price_list.plan.get', 'price_list.plan.remove', 'price_list.plan.save', 'price_list.plan.search',
+	'price_list.remove', 'price_list.save', 'price_list.search',
+	'property.get', 'property.remove', 'property.save', 'property.search',
+	'token.get', 'token.heartbeat', 'token.remove', 'token.save', 'token.search',
+	'user.changePassword', 'user.count', 'user.get', 'user.hasFeature', 'user.hasPermission', 'user.lock', 'user.login',
+	'user.logout', 'user.remove', 'user.resetPassword', 'user.save', 'user.search', 'user.unlock', 'user.verifyEmail'
+]
+
+# The arguments of every command, position by position: a list of words, 'methods',
+# 'profiles' or 'config_keys' for words known at run time, or a dictionary from a
+# subcommand to the arguments that follow it
+COMMAND_ARGUMENTS={
+	'agent':[['start', 'run', 'stop', 'status']],
+	'bench':[['call'], 'methods'],
+	'call':['methods'],
+	'completion':[['bash', 'zsh']],
+	'config':[{'list':[], 'get':['config_keys'], 'set':['config_keys'], 'save':[], 'migrate':[['sqlite', 'json']]}],
+	'export':[['users']],
+	'import':[['users']],
+	'login':['profiles'],
+	'profile':[{'list':[], 'current':[], 'switch':['profiles']}]
+}
+
+# Options whose value is a file, the shell scripts complete file names after them
+FILE_OPTIONS=['-f', '--batch', '--out', '--checkpoint', '--failures', '--profile-cpu', '--profile-mem']
+
+class MethodCatalog(object):
+	"""
+	The service.method names offered for completion, cached in a file. A catalog
+	older than ttl seconds is refreshed in a background thread, from the JSON list
+	of methods at USERAPP_CATALOG_URL if set, so completion never waits for it.
+	"""
+	def __init__(self, file_path, url=None, ttl=86400, index=None):
+		self.file_path=file_path
+		self.url=url
+		self.ttl=ttl
+		self.index=index
+		self.methods=None
+		self.refreshing=None
+
+	def get_methods(self):
+		if self.methods is None:
+			self.load()
+
+		return self.methods
+
+	def load(self):
+		try:
+			with open(self.file_path, 'r') as handle:
+				catalog=json.load(handle)
+
+			self.methods=catalog['methods']
+			updated_at=catalog.get('updated_at', 0)
+		except (IOError, ValueError, KeyError, TypeError):
+			self.methods=list(BUILTIN_METHODS)
+			updated_at=0
+
+		if time.time()-updated_at >= self.ttl:
+			self.refresh_in_background()
+
+	def refresh_in_background(self):
+		if self.refreshing is not None and self.refreshing.is_alive():
+			return
+
+		self.refreshing=threading.Thread(target=self.refresh)
+		self.refreshing.daemon=True
+		self.refreshing.start()
+
+	def refresh(self):
+		methods=set(BUILTIN_METHODS)
+
+		if self.url is not None:
+			try:
+				methods.update(self.fetch())
+			except Exception, e:
+				import logging
+				logging.getLogger('userapp').debug("Unable to fetch the method catalog: {e}".format(e=e))
+				return
+
+		self.methods=sorted(methods)
+
+		try:
+			self.save()
+		except (IOError, OSError):
+			pass
+
+	def fetch(self):
+		import urllib2
+
+		result=json.load(urllib2.urlopen(self.url, timeout=10))
+
+		if isinstance(result, dict):
+			result=result.get('methods')
+
+		if not isinstance(result, list):
+			raise ValueError("Expected a list of methods.")
+
+		return [method for method in result if isinstance(method, basestring) and '.' in method and ' ' not in method]
+
+	def save(self):
+		directory=os.path.dirname(self.file_path)
+
+		if not os.path.exists(directory):
+			os.makedirs(directory)
+
+		temp_path='{p}.{i}.tmp'.format(p=self.file_path, i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			json.dump({'updated_at':time.time(), 'source':self.url, 'methods':self.methods}, handle)
+
+		os.rename(temp_path, self.file_path)
+
+		if self.index is not None and self.index.exists():
+			self.index.write('methods', self.methods)
+
+class CompletionIndex(object):
+	"""
+	Plain text word lists (one word per line) read by the generated shell completion
+	scripts, so that completing in the shell doesn't start Python. Only kept up to
+	date once a completion script was generated.
+	"""
+	def __init__(self, directory):
+		self.directory=directory
+
+	def exists(self):
+		return os.path.isdir(self.directory)
+
+	def get_path(self, name):
+		return os.path.join(self.directory, name)
+
+	def write(self, name, words):
+		if not self.exists():
+			os.makedirs(self.directory)
+
+		temp_path='{p}.{i}.tmp'.format(p=self.get_path(name), i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			handle.write(''.join([word + '\n' for word in words]))
+
+		os.rename(temp_path, self.get_path(name))
+
+	def update_profiles(self, config):
+		"""
+		Rewrite the profile names if the configuration changed since they were written.
+		"""
+		if not self.exists():
+			return
+
+		try:
+			if os.path.getmtime(self.get_path('profiles')) >= os.path.getmtime(config.get_file_path()):
+				return
+		except OSError:
+			pass
+
+		try:
+			self.write('profiles', config.get_profile_names())
+		except (IOError, OSError):
+			pass
+
+class Completer(object):
+	"""
+	Completes command lines from COMMAND_ARGUMENTS, in the interactive console and
+	through the generated shell scripts.
+	"""
+	def __init__(self, command_names, catalog):
+		self.command_names=command_names
+		self.catalog=catalog
+		self.candidates=[]
+
+	@staticmethod
+	def get_config_keys():
+		return [key for (section, keys) in CONFIG_SECTIONS for key in keys]
+
+	def get_source(self, words):
+		"""
+		What completes the word following words: a list of words, one of the run time
+		sources, or None.
+		"""
+		if len(words) == 0:
+			return self.command_names
+
+		arguments=COMMAND_ARGUMENTS.get(words[0])
+		typed=words[1:]
+
+		while arguments is not None:
+			for (index, source) in enumerate(arguments):
+				if index == len(typed):
+					return sorted(source.keys()) if isinstance(source, dict) else source
+
+				if isinstance(source, dict):
+					(arguments, typed)=(source.get(typed[index]), typed[index+1:])
+					break
+			else:
+				return None
+
+		return None
+
+	def get_words(self, source):
+		if source == 'methods':
+			return self.catalog.get_methods()
+
+		if source == 'profiles':
+			return ServiceLocator.get_instance().resolve('config').get_profile_names()
+
+		if source == 'config_keys':
+			return Completer.get_config_keys()
+
+		return source or []
+
+	def get_candidates(self, words, text):
+		# Options and parameters (name=value) aren't completed
+		words=[word for word in words if not word.startswith('-') and '=' not in word]
+
+		return sorted([word for word in self.get_words(self.get_source(words)) if word.startswith(text)])
+
+	def complete(self, scopes, line, text, state):
+		"""
+		A readline completer, given the words before the cursor in line.
+		"""
+		if state == 0:
+			self.candidates=[word + ' ' for word in self.get_candidates(scopes+line.split(), text)]
+
+		return self.candidates[state] if state < len(self.candidates) else None
+
+	def get_cases(self):
+		"""
+		The (words typed so far, source) pairs of everything that can be completed.
+		"""
+		cases=[('', self.command_names)]
+
+		def add(prefix, arguments):
+			prefixes=[prefix]
+
+			for source in arguments:
+				if isinstance(source, dict):
+					cases.extend([(' '.join(typed), sorted(source.keys())) for typed in prefixes])
+
+					for (command, following) in sorted(source.items()):
+						for typed in prefixes:
+							add(typed+[command], following)
+
+					return
+
+				cases.extend([(' '.join(typed), source) for typed in prefixes])
+
+				# Words after a run time source can't be told apart by the scripts
+				if not isinstance(source, list):
+					return
+
+				prefixes=[typed+[word] for typed in prefixes for word in source]
+
+		for (command, arguments) in sorted(COMMAND_ARGUMENTS.items()):
+			add([command], arguments)
+
+		return cases
+
+	def render_script(self, shell, index):
+		"""
+		A bash or zsh completion script for the userapp command.
+		"""
+		lines=[]
+
+		for (key, source) in self.get_cases():
+			if source in ['methods', 'profiles']:
+				words='$(<"$index/{s}")'.format(s=source)
+			else:
+				words=' '.join(self.get_words(source))
+
+			lines.append('\t\t"{k}") candidates="{w}" ;;'.format(k=key, w=words))
+
+		cases='\n'.join(lines)
+
+		template=ZSH_TEMPLATE if shell == 'zsh' else BASH_TEMPLATE
+
+		return template.format(index=index.directory, cases=cases, file_options='|'.join(FILE_OPTIONS))
+
+BASH_TEMPLATE='''# userapp completion for bash. Load it with: source <(userapp completion bash)
+_userapp() {{
+	local index="{index}" candidates=""
+	local word words=()
+
+	COMPREPLY=()
+
+	# The value of an option taking a file: no candidates, so that bash completes
+	# file names instead (-o default), as for arguments without candidates
+	case "${{COMP_WORDS[COMP_CWORD-1]}}" in
+		{file_options}) return ;;
+	esac
+
+	# Options and parameters (name=value) aren't completed
+	for word in "${{COMP_WORDS[@]:1:COMP_CWORD-1}}"; do
+		[[ "$word" == -* || "$word" == *=* ]] || words+=("$word")
+	done
+
+	local key="${{words[*]}}"
+
+	case "$key" in
+{cases}
+	esac
+
+	[[ -n "$candidates" ]] && COMPREPLY=($(compgen -W "$candidates" -- "${{COMP_WORDS[COMP_CWORD]}}"))
+}}
+complete -o bashdefault -o default -F _userapp userapp
+'''
+
+ZSH_TEMPLATE='''#compdef userapp
+# userapp completion for zsh. Load it with: source <(userapp completion zsh)
+_userapp() {{
+	local index="{index}" candidates=""
+
+	case "${{words[CURRENT-1]}}" in
+		{file_options}) _files; return ;;
+	esac
+
+	# Options and parameters (name=value) aren't completed
+	local typed=(${{words[2,CURRENT-1]:#(-*|*=*)}})
+	local key="${{(j: :)typed}}"
+
+	case "$key" in
+{cases}
+	esac
+
+	# Arguments without candidates, e.g. the file to import, are file names
+	if [[ -z "$candidates" ]]; then
+		_files
+	else
+		compadd -- ${{=candidates}}
+	fi
+}}
+compdef _userapp userapp
+'''
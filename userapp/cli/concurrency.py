@@ -0,0 +1,147 @@
+import sys
+import Queue
+import threading
+
+class WorkerPool(object):
+	"""
+	A fixed size pool of worker threads that pulls work lazily from an iterable.
+	"""
+	_STOP=object()
+
+	def __init__(self, size=8):
+		self.size=max(1, int(size))
+
+	def imap_unordered(self, function, iterable):
+		"""
+		Apply function to every item of iterable and yield (index, result, error) tuples
+		as they complete. At most size*2 items are read ahead of the workers. If reading
+		iterable fails, the items read before are completed and the error is raised.
+		"""
+		tasks=Queue.Queue(self.size*2)
+		results=Queue.Queue()
+		stop=WorkerPool._STOP
+		failure=[]
+
+		def feed():
+			try:
+				for (index, item) in enumerate(iterable):
+					tasks.put((index, item))
+			except Exception:
+				failure.append(sys.exc_info())
+			finally:
+				for i in range(self.size):
+					tasks.put(stop)
+
+		def work():
+			while True:
+				task=tasks.get()
+
+				if task is stop:
+					results.put(stop)
+					return
+
+				(index, item)=task
+
+				try:
+					results.put((index, function(item), None))
+				except Exception, e:
+					results.put((index, None, e))
+
+		threads=[threading.Thread(target=feed)]
+		threads.extend([threading.Thread(target=work) for i in range(self.size)])
+
+		for thread in threads:
+			thread.daemon=True
+			thread.start()
+
+		stopped=0
+
+		while stopped < self.size:
+			try:
+				# A timeout keeps the wait interruptible by KeyboardInterrupt
+				result=results.get(True, 60)
+			except Queue.Empty:
+				continue
+
+			if result is stop:
+				stopped += 1
+			else:
+				yield result
+
+		# Every worker stopped after the feeder, so the failure (if any) is recorded
+		if len(failure) > 0:
+			raise failure[0][0], failure[0][1], failure[0][2]
+
+	def imap(self, function, iterable):
+		"""
+		Apply function to every item of iterable and yield (index, result, error) tuples
+		in order. At most size items are computed ahead of the consumer. If reading
+		iterable fails, the items read before are completed and the error is raised.
+		"""
+		tasks=Queue.Queue()
+		stop=WorkerPool._STOP
+		failure=[]
+
+		def work():
+			while True:
+				task=tasks.get()
+
+				if task is stop:
+					return
+
+				try:
+					task['result']=function(task['item'])
+				except Exception, e:
+					task['error']=e
+
+				task['done'].set()
+
+		threads=[threading.Thread(target=work) for i in range(self.size)]
+
+		for thread in threads:
+			thread.daemon=True
+			thread.start()
+
+		items=enumerate(iterable)
+		window=[]
+
+		def submit():
+			if len(failure) > 0:
+				return
+
+			try:
+				for (index, item) in items:
+					task={'index':index, 'item':item, 'result':None, 'error':None, 'done':threading.Event()}
+					window.append(task)
+					tasks.put(task)
+					return
+			except Exception:
+				# Raised once the tasks in the window are yielded
+				failure.append(sys.exc_info())
+
+		try:
+			for i in range(self.size):
+				submit()
+
+			while len(window) > 0:
+				task=window.pop(0)
+
+				while not task['done'].is_set():
+					# A timeout keeps the wait interruptible by KeyboardInterrupt
+					task['done'].wait(60)
+
+				submit()
+
+				yield (task['index'], task['result'], task['error'])
+
+			if len(failure) > 0:
+				raise failure[0][0], failure[0][1], failure[0][2]
+		finally:
+			for thread in threads:
+				tasks.put(stop)
+
+			# Once all tasks are done the workers exit right away, wait for them so that
+			# they aren't torn down at interpreter exit while still waiting for a task
+			if len(window) == 0:
+				for thread in threads:
+					thread.join()
@@ -1,11 +1,17 @@
 import os
+import sys
 import json
+import contextlib
 
 class Configuration(object):
 	def __init__(self, selected_profile_name=None, profiles=None, file_path=None):
 		self.__file_path=file_path
 		self.selected_profile_name=selected_profile_name
 		self.profiles={} if profiles is None else profiles
+		self.__stat_key=None
+		self.__baseline={}
+		self.__deferred=0
+		self.__pending=None
 
 	@staticmethod
 	def parseBooleanString(value):
@@ -21,24 +27,166 @@ class Configuration(object):
 		return False
 
 	def load(self):
+		"""
+		Load the profiles from the configuration file. Does nothing when the file has not
+		changed (same modification time and size) since it was last loaded or saved.
+		"""
+		stat_key=self.get_stat_key()
+
+		if stat_key is not None and stat_key == self.__stat_key:
+			return
+
 		try:
-			with open(self.__file_path, 'r') as handle:
-				self.profiles = json.load(handle)['profiles']
-		except:
+			self.profiles=self.read_profiles()
+		except IOError:
 			self.profiles={}
+		except (ValueError, KeyError, TypeError), e:
+			sys.stderr.write("(error) Unable to parse configuration file '{p}': {m}\n".format(p=self.__file_path, m=e))
+			self.profiles={}
+
+		for profile in self.profiles.values():
+			self.apply_defaults(profile)
+
+		self.__stat_key=stat_key
+		self.__baseline=self.get_snapshot()
+
+	def read_profiles(self):
+		with open(self.__file_path, 'r') as handle:
+			profiles=json.load(handle)['profiles']
+
+		if not isinstance(profiles, dict):
+			raise TypeError("'profiles' is not an object")
+
+		return profiles
+
+	def get_stat_key(self):
+		try:
+			stat=os.stat(self.__file_path)
+		except OSError:
+			return None
+
+		return (stat.st_mtime, stat.st_size)
+
+	def get_snapshot(self):
+		"""
+		The profiles serialized one by one, to tell which of them have changed.
+		"""
+		return dict([(name, json.dumps(profile, sort_keys=True)) for (name, profile) in self.profiles.items()])
+
+	def apply_defaults(self, profile):
+		"""
+		Add sections and variables introduced after the profile was saved.
+		"""
+		for (section, values) in self.get_default_profile().items():
+			if not isinstance(values, dict):
+				continue
+
+			if section not in profile:
+				profile[section]=values
+			else:
+				for (key, value) in values.items():
+					profile[section].setdefault(key, value)
+
+	@contextlib.contextmanager
+	def deferred_saves(self):
+		"""
+		Within this block save() only records the state to save, which is written once
+		when the block ends.
+		"""
+		self.__deferred += 1
+
+		try:
+			yield self
+		finally:
+			self.__deferred -= 1
+
+			if self.__deferred == 0 and self.__pending is not None:
+				(snapshot, self.__pending)=(self.__pending, None)
+				self.write(snapshot)
 
 	def save(self):
+		snapshot=self.get_snapshot()
+
+		if self.__deferred > 0:
+			self.__pending=snapshot
+		else:
+			self.write(snapshot)
+
+	def write(self, snapshot):
+		"""
+		Write the profiles that changed since they were loaded or last saved. The file is
+		replaced atomically and profiles changed by another process in the meantime are
+		kept.
+		"""
+		if snapshot == self.__baseline:
+			return
+
+		profiles=dict([(name, json.loads(value)) for (name, value) in snapshot.items()])
+
+		if self.get_stat_key() != self.__stat_key:
+			try:
+				stored_profiles=self.read_profiles()
+			except (IOError, ValueError, KeyError, TypeError):
+				stored_profiles={}
+
+			for (name, profile) in stored_profiles.items():
+				if name not in snapshot or snapshot[name] == self.__baseline.get(name):
+					profiles[name]=profile
+					snapshot[name]=json.dumps(profile, sort_keys=True)
+
+					# Update in place, commands may hold a reference to the profile
+					self.profiles.setdefault(name, {}).clear()
+					self.profiles[name].update(json.loads(snapshot[name]))
+
 		config_dir_path=os.path.dirname(self.__file_path)
 
 		if not os.path.exists(config_dir_path):
 			os.makedirs(config_dir_path)
 
-		with open(self.__file_path, 'w') as handle:
-			handle.write(str(self))
+		import tempfile
+
+		(handle, temp_path)=tempfile.mkstemp(prefix='.config.', suffix='.tmp', dir=config_dir_path)
+
+		try:
+			with os.fdopen(handle, 'w') as temp_file:
+				temp_file.write(json.dumps({'profiles':profiles}, sort_keys=True, indent=4))
+				temp_file.flush()
+				os.fsync(temp_file.fileno())
+
+			if os.path.exists(self.__file_path):
+				os.chmod(temp_path, os.stat(self.__file_path).st_mode & 0777)
+			else:
+				os.chmod(temp_path, 0666 & ~Configuration.get_umask())
+
+			try:
+				os.rename(temp_path, self.__file_path)
+			except OSError:
+				# Windows does not replace existing files on rename
+				os.remove(self.__file_path)
+				os.rename(temp_path, self.__file_path)
+		except:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+			raise
+
+		self.__stat_key=self.get_stat_key()
+		self.__baseline=snapshot
+
+	@staticmethod
+	def get_umask():
+		umask=os.umask(0)
+		os.umask(umask)
+		return umask
+
+	def get_file_path(self):
+		return self.__file_path
 
 	def has_profile(self, name):
 		return name in self.profiles
 
+	def get_profile_names(self):
+		return sorted(self.profiles.keys())
+
 	def get_profile(self, name):
 		if name in self.profiles:
 			return self.profiles[name]
@@ -65,6 +213,12 @@ class Configuration(object):
 				'base_address':'api.userapp.io',
 				'secure':True,
 				'debug':False
+			},
+			'cache':{
+				'cache_enabled':False,
+				'cache_ttl':300,
+				'cache_max_size':10485760,
+				'cache_methods':'user.get,app.get,token.search'
 			}
 		}
 
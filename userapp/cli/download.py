@@ -0,0 +1,383 @@
+import os
+import sys
+import json
+import errno
+import time
+import hashlib
+import threading
+
+class DownloadProgress(object):
+	"""
+	Reports the progress of concurrent downloads to stderr, at most once every
+	interval seconds, so that downloads faster than that print nothing. Downloads
+	stop once cancel() is called, e.g. on Ctrl-C.
+	"""
+	def __init__(self, interval=1.0):
+		self.interval=interval
+		self.reported=time.time()
+		self.downloads={}
+		self.lock=threading.Lock()
+		self.cancelled=threading.Event()
+
+	def cancel(self):
+		self.cancelled.set()
+
+	def update(self, url, received, size):
+		with self.lock:
+			self.downloads[url]=(received, size)
+
+			if time.time()-self.reported < self.interval:
+				return
+
+			self.reported=time.time()
+			received=sum([download[0] for download in self.downloads.values()])
+			sizes=[download[1] for download in self.downloads.values()]
+
+		megabytes=1024.0*1024
+
+		if None in sizes:
+			sys.stderr.write("(info) Downloading {n} archive(s): {r:.1f} MB\n".format(n=len(sizes), r=received/megabytes))
+		else:
+			sys.stderr.write("(info) Downloading {n} archive(s): {r:.1f} of {s:.1f} MB ({p}%)\n".format(
+				n=len(sizes),
+				r=received/megabytes,
+				s=sum(sizes)/megabytes,
+				p=int(100*received/max(1, sum(sizes)))
+			))
+
+class ArchiveDownload(object):
+	"""
+	Downloads a zip archive to part_path while extracting it to target_dir.
+
+	The end of the archive, with its central directory, is requested first. As the
+	rest of the archive streams in from the start, every member is extracted as soon
+	as all of its bytes have arrived, so extracting overlaps downloading instead of
+	following it. Servers that don't support range requests are read from start to
+	end and the archive is extracted once complete.
+
+	Progress is kept next to the partial archive (<part_path>.json), and an
+	interrupted download resumes where it stopped, provided the archive is unchanged
+	(If-Range). The size of every response is checked against its headers, and
+	extracting checks the CRC-32 of every member.
+	"""
+	CHUNK_SIZE=65536
+
+	# The end of central directory record (22 bytes) with a comment of up to 64 KB
+	TAIL_SIZE=22+65535
+
+	# Progress is saved after every this many bytes
+	SAVE_INTERVAL=1024*1024
+
+	def __init__(self, url, part_path, target_dir, progress=None, timeout=30):
+		self.url=url
+		self.part_path=part_path
+		self.target_dir=target_dir
+		self.progress=progress
+		self.timeout=timeout
+		self.archive=None
+		self.pending=None
+		self.start_dir=None
+
+	def get_state_path(self):
+		return self.part_path + '.json'
+
+	def read_state(self):
+		try:
+			with open(self.get_state_path(), 'r') as handle:
+				state=json.load(handle)
+
+			if state['url'] == self.url and os.path.getsize(self.part_path) == state['size']:
+				return state
+		except (IOError, OSError, ValueError, KeyError, TypeError):
+			pass
+
+		return None
+
+	def write_state(self, state):
+		temp_path='{p}.{i}.tmp'.format(p=self.get_state_path(), i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			json.dump(state, handle)
+
+		os.rename(temp_path, self.get_state_path())
+
+	def discard(self):
+		for path in [self.part_path, self.get_state_path()]:
+			try:
+				os.unlink(path)
+			except OSError:
+				pass
+
+	def open(self, headers):
+		import urllib2
+
+		request=urllib2.Request(self.url)
+
+		for (name, value) in headers.items():
+			request.add_header(name, value)
+
+		return urllib2.urlopen(request, timeout=self.timeout)
+
+	def run(self):
+		"""
+		Download and extract the archive. Returns the state of the download: the size,
+		SHA-256, ETag and Last-Modified of the archive. Raises IOError if it can't be
+		downloaded or is incomplete, and zipfile.BadZipfile if it is invalid.
+		"""
+		import zipfile
+
+		state=self.read_state()
+
+		try:
+			if state is None:
+				state=self.download_tail()
+
+			if state['downloaded'] < state['tail_start']:
+				self.download_body(state)
+
+			self.extract_available(state, True)
+		except zipfile.BadZipfile:
+			# Resuming an invalid archive would fail the same way
+			self.discard()
+			raise
+		finally:
+			if self.archive is not None:
+				self.archive.close()
+
+		state['sha256']=self.get_digest()
+
+		try:
+			os.unlink(self.get_state_path())
+		except OSError:
+			pass
+
+		return state
+
+	def download_tail(self):
+		response=self.open({'Range':'bytes=-{n}'.format(n=ArchiveDownload.TAIL_SIZE)})
+
+		try:
+			if response.getcode() != 206:
+				return self.download_all(response)
+
+			# Content-Range: bytes <first>-<last>/<size>
+			(first, last, size)=ArchiveDownload.parse_content_range(response.info().getheader('Content-Range'))
+
+			state={
+				'url':self.url,
+				'etag':response.info().getheader('ETag'),
+				'last_modified':response.info().getheader('Last-Modified'),
+				'size':size,
+				'tail_start':first,
+				'downloaded':0
+			}
+
+			with open(self.part_path, 'wb') as handle:
+				# Sparse until the body arrives
+				handle.truncate(size)
+				handle.seek(first)
+				self.write(response, handle, last+1-first, state, 0)
+		finally:
+			response.close()
+
+		self.write_state(state)
+		self.extract_available(state)
+
+		return state
+
+	def download_body(self, state):
+		headers={'Range':'bytes={f}-{l}'.format(f=state['downloaded'], l=state['tail_start']-1)}
+
+		# Only continue if the archive didn't change since the download started
+		if state['etag'] or state['last_modified']:
+			headers['If-Range']=state['etag'] or state['last_modified']
+
+		response=self.open(headers)
+
+		try:
+			if response.getcode() != 206:
+				state.update(self.download_all(response))
+				return
+
+			(first, last, size)=ArchiveDownload.parse_content_range(response.info().getheader('Content-Range'))
+
+			if first != state['downloaded'] or size != state['size']:
+				self.discard()
+				raise IOError("Unexpected range '{f}-{l}/{s}' of '{u}'.".format(f=first, l=last, s=size, u=self.url))
+
+			with open(self.part_path, 'r+b') as handle:
+				handle.seek(first)
+				self.write(response, handle, last+1-first, state, state['size']-state['tail_start']+first, True)
+		finally:
+			response.close()
+
+	def download_all(self, response):
+		"""
+		Read a complete archive from a response to a request that wasn't served as a
+		range, and start over with it.
+		"""
+		length=response.info().getheader('Content-Length')
+		size=int(length) if length is not None and length.isdigit() else None
+
+		state={
+			'url':self.url,
+			'etag':response.info().getheader('ETag'),
+			'last_modified':response.info().getheader('Last-Modified'),
+			'size':size,
+			'tail_start':0,
+			'downloaded':0
+		}
+
+		if self.archive is not None:
+			self.archive.close()
+			(self.archive, self.pending)=(None, None)
+
+		self.start_dir=None
+
+		with open(self.part_path, 'wb') as handle:
+			state['size']=self.write(response, handle, size, state, 0)
+
+		state['tail_start']=state['downloaded']=state['size']
+
+		return state
+
+	def write(self, response, handle, length, state, received, body=False):
+		"""
+		Copy a response to handle at its current position. When the response is the
+		body of the archive, the state advances with it and members are extracted as
+		they complete. Returns the number of bytes written.
+		"""
+		written=0
+		saved=state['downloaded']
+
+		while True:
+			chunk=response.read(ArchiveDownload.CHUNK_SIZE)
+
+			if len(chunk) == 0:
+				break
+
+			handle.write(chunk)
+			written += len(chunk)
+
+			if body:
+				handle.flush()
+				state['downloaded'] += len(chunk)
+				self.extract_available(state)
+
+				if state['downloaded']-saved >= ArchiveDownload.SAVE_INTERVAL:
+					self.write_state(state)
+					saved=state['downloaded']
+
+			if self.progress is not None:
+				self.progress.update(self.url, received+written, state['size'])
+
+				if self.progress.cancelled.is_set():
+					if body:
+						self.write_state(state)
+
+					raise IOError("The download of '{u}' was cancelled.".format(u=self.url))
+
+		if length is not None and written != length:
+			raise IOError("Incomplete download of '{u}': {w} of {n} bytes.".format(u=self.url, w=written, n=length))
+
+		return written
+
+	@staticmethod
+	def parse_content_range(value):
+		try:
+			(unit, spec)=value.split(' ', 1)
+			(positions, size)=spec.split('/', 1)
+			(first, last)=positions.split('-', 1)
+
+			return (int(first), int(last), int(size))
+		except (AttributeError, ValueError):
+			raise IOError("Invalid Content-Range '{v}'.".format(v=value))
+
+	def extract_available(self, state, complete=False):
+		"""
+		Extract the members whose bytes have all been downloaded: those before the
+		downloaded part of the body, or within the tail.
+		"""
+		import zipfile
+
+		if self.archive is None:
+			if not complete and not self.is_directory_available(state):
+				return
+
+			try:
+				self.archive=zipfile.ZipFile(self.part_path)
+			except zipfile.BadZipfile:
+				# Not an archive, or the central directory isn't in the tail yet
+				if complete:
+					raise
+
+				return
+
+			# A member ends where the next one (or the central directory) starts
+			members=sorted(self.archive.infolist(), key=lambda info: info.header_offset)
+			ends=[info.header_offset for info in members[1:]]+[self.archive.start_dir]
+			self.pending=[(info.header_offset, end, info) for (info, end) in zip(members, ends)]
+
+		(downloaded, tail_start)=(state['downloaded'], state['tail_start'])
+		available=[member for member in self.pending if complete or member[0] >= tail_start or min(member[1], tail_start) <= downloaded]
+
+		for (start, end, info) in available:
+			try:
+				self.archive.extract(info, self.target_dir)
+			except OSError, e:
+				# Another download created the same directory at the same time
+				if e.errno != errno.EEXIST:
+					raise
+
+				self.archive.extract(info, self.target_dir)
+
+			self.pending.remove((start, end, info))
+
+	def is_directory_available(self, state):
+		"""
+		Whether the central directory has been downloaded: it is within the tail, or
+		starts in the body and the body is complete. Its offset is read once from the
+		end of central directory record, rather than opening the archive every chunk.
+		"""
+		if self.start_dir is None:
+			self.start_dir=self.read_start_dir(state)
+
+		return self.start_dir >= state['tail_start'] or state['downloaded'] >= state['tail_start']
+
+	def read_start_dir(self, state):
+		"""
+		The offset of the central directory from the end of central directory record
+		in the tail, or 0 if there is no such record (or it points to a Zip64 one).
+		"""
+		import struct
+		import zipfile
+
+		with open(self.part_path, 'rb') as handle:
+			handle.seek(state['tail_start'])
+			tail=handle.read()
+
+		position=tail.rfind(zipfile.stringEndArchive)
+
+		if position < 0 or len(tail)-position < zipfile.sizeEndCentDir:
+			return 0
+
+		(signature, disk, disk_dir, disk_entries, entries, size, offset, comment_size)=struct.unpack(
+			zipfile.structEndArchive,
+			tail[position:position+zipfile.sizeEndCentDir]
+		)
+
+		return 0 if offset == 0xFFFFFFFF else offset
+
+	def get_digest(self):
+		digest=hashlib.sha256()
+
+		with open(self.part_path, 'rb') as handle:
+			while True:
+				chunk=handle.read(ArchiveDownload.CHUNK_SIZE)
+
+				if len(chunk) == 0:
+					break
+
+				digest.update(chunk)
+
+		return digest.hexdigest()
@@ -0,0 +1,43 @@
+from concurrency import WorkerPool
+
+class CallEngine(object):
+	"""
+	Executes a stream of API calls. run() applies a call function to every item and
+	yields (index, result, error) tuples; how many calls are in flight at once is up
+	to the engine.
+	"""
+	def __init__(self, concurrency=1):
+		self.concurrency=concurrency
+
+	@staticmethod
+	def create(name, concurrency=8):
+		"""
+		Create an engine by name, or return None for unknown names.
+		"""
+		engine_class=CALL_ENGINES.get(name)
+		return None if engine_class is None else engine_class(concurrency)
+
+class SyncCallEngine(CallEngine):
+	"""
+	Executes one call at a time, in order.
+	"""
+	def run(self, function, items):
+		for (index, item) in enumerate(items):
+			try:
+				yield (index, function(item), None)
+			except Exception, e:
+				yield (index, None, e)
+
+class ConcurrentCallEngine(CallEngine):
+	"""
+	Keeps up to concurrency calls in flight on a worker pool and yields results as they
+	complete. Combined with a client whose pool is capped to fewer connections, calls
+	queue for a free keep-alive connection instead of opening new ones.
+	"""
+	def run(self, function, items):
+		return WorkerPool(self.concurrency).imap_unordered(function, items)
+
+CALL_ENGINES={
+	'sync':SyncCallEngine,
+	'concurrent':ConcurrentCallEngine
+}
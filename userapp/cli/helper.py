@@ -1,9 +1,6 @@
 import os
-import urllib
-import shutil
-import zipfile
-import webbrowser
-import subprocess
+
+from timing import Tracer
 
 class ConsoleHelper(object):
 	@staticmethod
@@ -13,59 +10,164 @@ class ConsoleHelper(object):
 class WebBrowserHelper(object):
 	@staticmethod
 	def open_url(url):
+		import webbrowser
+
 		# Redirect stdout to devnull in order to avoid output from browser
 		savout = os.dup(1)
 		os.close(1)
 		os.open(os.devnull, os.O_RDWR)
 
 		try:
-			webbrowser.open(url)
+			with Tracer.get_instance().span('browser.open'):
+				webbrowser.open(url)
 		finally:
 		   os.dup2(savout, 1)
 
 class ProcessHelper(object):
 	@staticmethod
 	def execute(args, wait=True, block=True, cwd=None):
+		import subprocess
+
 		print(cwd)
 
-		if block:
-			process = subprocess.Popen(args, shell=True, stdout=subprocess.PIPE, cwd=cwd)
-		else:
-			process = subprocess.Popen(args, shell=True, cwd=cwd)
+		with Tracer.get_instance().span('process', args=args, wait=wait):
+			if block:
+				process = subprocess.Popen(args, shell=True, stdout=subprocess.PIPE, cwd=cwd)
+			else:
+				process = subprocess.Popen(args, shell=True, cwd=cwd)
 
-		if wait:
-			process.wait()
+			if wait:
+				process.wait()
 
 		return process.returncode
 
 class FileHelper(object):
 	@staticmethod
-	def unzip_url(source_url, target_dir):
+	def unzip_urls(downloads, cache=None, offline=False):
 		"""
-		Download an unzip and url in a target directory. Returns None if successful.
+		Download and unzip several (url, target directory) pairs concurrently. Returns
+		the result of unzip_url for every pair, in order.
 		"""
-		if not os.path.exists(target_dir):
-			os.makedirs(target_dir)
+		import sys
+		import threading
+		from download import DownloadProgress
+
+		progress=DownloadProgress()
+		results=[None]*len(downloads)
+
+		def unzip(index, source_url, target_dir):
+			try:
+				results[index]=(FileHelper.unzip_url(source_url, target_dir, cache, offline, progress), None)
+			except Exception:
+				results[index]=(None, sys.exc_info())
+
+		threads=[threading.Thread(target=unzip, args=(index, source_url, target_dir)) for (index, (source_url, target_dir)) in enumerate(downloads)]
+
+		for thread in threads:
+			thread.daemon=True
+			thread.start()
 
-		name = os.path.join(target_dir, 'stage.tmp')
-		
 		try:
-			name, hdrs = urllib.urlretrieve(source_url, name)
-		except IOError, e:
-			return 'invalid_url'
+			for thread in threads:
+				# A timeout keeps the wait interruptible by KeyboardInterrupt
+				while thread.is_alive():
+					thread.join(0.1)
+		except KeyboardInterrupt:
+			# Let the downloads save their progress, so that they can be resumed
+			progress.cancel()
+
+			for thread in threads:
+				thread.join()
+
+			raise
+
+		for (error, exception) in results:
+			if exception is not None:
+				raise exception[0], exception[1], exception[2]
+
+		return [error for (error, exception) in results]
+
+	@staticmethod
+	def unzip_url(source_url, target_dir, cache=None, offline=False, progress=None):
+		"""
+		Download an unzip and url in a target directory. Returns None if successful,
+		'invalid_url' if there is no archive at url, 'offline' if it isn't cached while
+		offline, 'invalid_zip', or ('download_failed', <reason>) for any other error.
+		Members are extracted while the archive downloads (see ArchiveDownload). With a
+		TemplateCache, the archive is taken from the cache when it is current, and
+		extracted from there.
+		"""
+		import urllib2
+		import zipfile
+		from download import ArchiveDownload
+
+		FileHelper.make_dirs(target_dir)
+
+		tracer=Tracer.get_instance()
+		name=None
+
+		if cache is not None:
+			try:
+				with tracer.span('revalidate', url=source_url):
+					name=cache.get_current_path(source_url, offline)
+			except IOError, e:
+				return 'offline'
 
 		try:
-			with zipfile.ZipFile(name) as handle:
-				handle.extractall(target_dir)
+			if name is None:
+				part_path=cache.get_part_path(source_url) if cache is not None else os.path.join(target_dir, 'stage.tmp')
+
+				FileHelper.make_dirs(os.path.dirname(part_path))
+
+				try:
+					with tracer.span('download', url=source_url):
+						download=ArchiveDownload(source_url, part_path, target_dir, progress).run()
+				except urllib2.HTTPError, e:
+					if e.code == 404:
+						return 'invalid_url'
+
+					return ('download_failed', str(e))
+				except urllib2.URLError, e:
+					return ('download_failed', str(e.reason))
+				except IOError, e:
+					# Timeouts, incomplete responses, cancellation, a full disk
+					return ('download_failed', str(e))
 
-			os.unlink(name)
+				if cache is not None:
+					try:
+						cache.store(source_url, part_path, download)
+					except (IOError, OSError), e:
+						import logging
+						logging.getLogger('userapp').debug("Unable to cache '{u}': {e}".format(u=source_url, e=e))
+				else:
+					os.unlink(part_path)
+			else:
+				with tracer.span('extract', target=target_dir):
+					with zipfile.ZipFile(name) as handle:
+						handle.extractall(target_dir)
 		except zipfile.error, e:
 			return 'invalid_zip'
 
 		return None
 
+	@staticmethod
+	def make_dirs(path):
+		"""
+		Create a directory and its parents, unless another thread or process just did.
+		"""
+		import errno
+
+		try:
+			os.makedirs(path)
+		except OSError, e:
+			if e.errno != errno.EEXIST or not os.path.isdir(path):
+				raise
+
 	@staticmethod
 	def search_replace_file(file_path, pattern, replace_with):
+		import shutil
+		import tempfile
+
 		fh, abs_path = tempfile.mkstemp()
 
 		with open(abs_path,'w') as new_file:
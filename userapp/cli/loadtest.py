@@ -0,0 +1,203 @@
+import math
+import time
+import threading
+
+from concurrency import WorkerPool
+
+class LatencyHistogram(object):
+	"""
+	Counts latencies in logarithmic buckets, each 2% wider than the previous, so that
+	percentiles of any number of samples are accurate to 2% in constant memory.
+	"""
+	GROWTH=1.02
+
+	# Latencies below this many seconds share the first bucket
+	RESOLUTION=0.00001
+
+	def __init__(self):
+		self.buckets={}
+		self.count=0
+		self.total=0.0
+		self.maximum=0.0
+		self.minimum=None
+
+	def get_bucket(self, latency):
+		if latency <= LatencyHistogram.RESOLUTION:
+			return 0
+
+		return int(math.log(latency/LatencyHistogram.RESOLUTION, LatencyHistogram.GROWTH))+1
+
+	def get_upper_bound(self, bucket):
+		return LatencyHistogram.RESOLUTION*(LatencyHistogram.GROWTH**bucket)
+
+	def record(self, latency):
+		bucket=self.get_bucket(latency)
+		self.buckets[bucket]=self.buckets.get(bucket, 0)+1
+		self.count += 1
+		self.total += latency
+		self.maximum=max(self.maximum, latency)
+		self.minimum=latency if self.minimum is None else min(self.minimum, latency)
+
+	def get_percentile(self, fraction):
+		"""
+		The latency below which fraction of the samples fall, or None without samples.
+		"""
+		if self.count == 0:
+			return None
+
+		rank=max(1, int(math.ceil(fraction*self.count)))
+		seen=0
+
+		for bucket in sorted(self.buckets.keys()):
+			seen += self.buckets[bucket]
+
+			if seen >= rank:
+				return min(self.get_upper_bound(bucket), self.maximum)
+
+		return self.maximum
+
+	def get_mean(self):
+		return self.total/self.count if self.count > 0 else None
+
+	def get_distribution(self, bounds):
+		"""
+		The number of samples up to each of bounds (in seconds, ascending), and above
+		the last one. Returns a list of (bound, count); the last bound is None.
+		"""
+		counts=[0]*(len(bounds)+1)
+
+		for (bucket, count) in self.buckets.items():
+			upper_bound=self.get_upper_bound(bucket)
+			index=0
+
+			while index < len(bounds) and upper_bound > bounds[index]*LatencyHistogram.GROWTH:
+				index += 1
+
+			counts[index] += count
+
+		return zip(list(bounds)+[None], counts)
+
+class LoadTest(object):
+	"""
+	Drives a function with a closed or open loop workload and records the latency and
+	outcome of every call.
+
+	In a closed loop, concurrency workers call back to back. In an open loop, calls
+	start at a fixed rate whether or not earlier calls completed, up to concurrency at
+	once, and latency is measured from when a call was due to start, so that calls
+	delayed by a slow server are counted as slow (no coordinated omission).
+	"""
+	def __init__(self, function, concurrency=8, duration=None, requests=None, rate=None):
+		self.function=function
+		self.concurrency=concurrency
+		self.duration=duration
+		self.requests=requests
+		self.rate=rate
+
+		self.histogram=LatencyHistogram()
+		self.errors={}
+		self.succeeded=0
+		self.failed=0
+		self.elapsed=0.0
+		self.lock=threading.Lock()
+
+	def get_schedule(self, started):
+		"""
+		Yield the time every call is due to start, until the duration or the number of
+		requests is reached. In a closed loop calls are due when a worker is free, and
+		None is yielded.
+		"""
+		index=0
+
+		while self.requests is None or index < self.requests:
+			if self.rate is None:
+				due=None
+				elapsed=time.time()-started
+			else:
+				due=started+index/self.rate
+				elapsed=due-started
+				delay=due-time.time()
+
+				if delay > 0:
+					time.sleep(delay)
+
+			if self.duration is not None and elapsed >= self.duration:
+				return
+
+			yield due
+			index += 1
+
+	def call(self, due):
+		if due is None:
+			due=time.time()
+
+		try:
+			self.function()
+			error=None
+		except Exception, e:
+			error=e
+
+		latency=time.time()-due
+
+		with self.lock:
+			self.histogram.record(latency)
+
+			if error is None:
+				self.succeeded += 1
+			else:
+				self.failed += 1
+				key=LoadTest.get_error_key(error)
+				self.errors[key]=self.errors.get(key, 0)+1
+
+	@staticmethod
+	def get_error_key(error):
+		"""
+		API errors are grouped by error code, other errors by exception type.
+		"""
+		return getattr(error, 'error_code', None) or type(error).__name__
+
+	def run(self, progress=None):
+		"""
+		Run the workload. progress(load_test) is called about once per second.
+		"""
+		started=time.time()
+		reported=started
+
+		try:
+			for (index, result, error) in WorkerPool(self.concurrency).imap_unordered(self.call, self.get_schedule(started)):
+				if progress is not None and time.time()-reported >= 1:
+					reported=time.time()
+					self.elapsed=reported-started
+					progress(self)
+		finally:
+			self.elapsed=time.time()-started
+
+	def get_throughput(self):
+		return self.histogram.count/self.elapsed if self.elapsed > 0 else 0.0
+
+	def get_report(self):
+		"""
+		The results as a dictionary, with latencies in milliseconds.
+		"""
+		def milliseconds(value):
+			return None if value is None else round(value*1000, 3)
+
+		return {
+			'mode':'closed' if self.rate is None else 'open',
+			'concurrency':self.concurrency,
+			'rate':self.rate,
+			'duration_s':round(self.elapsed, 3),
+			'requests':self.histogram.count,
+			'succeeded':self.succeeded,
+			'failed':self.failed,
+			'throughput':round(self.get_throughput(), 1),
+			'latency_ms':{
+				'min':milliseconds(self.histogram.minimum),
+				'mean':milliseconds(self.histogram.get_mean()),
+				'p50':milliseconds(self.histogram.get_percentile(0.5)),
+				'p90':milliseconds(self.histogram.get_percentile(0.9)),
+				'p99':milliseconds(self.histogram.get_percentile(0.99)),
+				'max':milliseconds(self.histogram.maximum if self.histogram.count > 0 else None)
+			},
+			'errors':self.errors
+		}
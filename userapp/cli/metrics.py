@@ -0,0 +1,284 @@
+import os
+import re
+import threading
+
+from core import ServiceLocator
+
+class Metrics(object):
+	"""
+	Records counters and durations of API requests and commands and hands them to
+	exporters: a Prometheus textfile (USERAPP_METRICS_TEXTFILE) and/or StatsD
+	(USERAPP_STATSD=host:port). Exporters buffer in memory until flush(), which is
+	called once per command. While no exporter is configured, recording does nothing.
+	"""
+	def __init__(self, exporters=None):
+		self.exporters=[] if exporters is None else exporters
+		self.enabled=len(self.exporters) > 0
+
+	@staticmethod
+	def get_instance():
+		"""
+		The metrics registered in the ServiceLocator, or disabled ones.
+		"""
+		metrics=ServiceLocator.get_instance().resolve('metrics')
+		return Metrics.DISABLED if metrics is None else metrics
+
+	@staticmethod
+	def from_environment(environment):
+		exporters=[]
+
+		if environment.get('USERAPP_METRICS_TEXTFILE'):
+			exporters.append(PrometheusTextfileExporter(environment['USERAPP_METRICS_TEXTFILE']))
+
+		if environment.get('USERAPP_STATSD'):
+			exporters.append(StatsdExporter(environment['USERAPP_STATSD']))
+
+		return Metrics(exporters)
+
+	def increment(self, name, value=1, **labels):
+		"""
+		Add value to the counter name (e.g. 'requests') with the given labels.
+		"""
+		for exporter in self.exporters:
+			exporter.increment(name, value, labels)
+
+	def observe(self, name, seconds, **labels):
+		"""
+		Record a duration of the histogram or timer name (e.g. 'request_duration').
+		"""
+		for exporter in self.exporters:
+			exporter.observe(name, seconds, labels)
+
+	def flush(self):
+		for exporter in self.exporters:
+			try:
+				exporter.flush()
+			except (IOError, OSError), e:
+				import logging
+				logging.getLogger('userapp').debug("Unable to export metrics: {e}".format(e=e))
+
+Metrics.DISABLED=Metrics()
+
+class PrometheusTextfileExporter(object):
+	"""
+	Adds the metrics of the process to a file read by the textfile collector of the
+	Prometheus node exporter. Counters and histograms are cumulative across processes:
+	on flush, the file is locked, its samples are read, the new values are added and
+	it is replaced atomically.
+	"""
+	PREFIX='userapp_cli_'
+
+	BUCKETS=[0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]
+
+	SAMPLE_PATTERN=re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(.*)\})?\s+(\S+)')
+	LABEL_PATTERN=re.compile(r'([a-zA-Z_][a-zA-Z0-9_]*)="((?:[^"\\]|\\.)*)"')
+	ESCAPE_PATTERN=re.compile(r'\\(.)')
+
+	def __init__(self, file_path):
+		self.file_path=file_path
+		self.lock=threading.Lock()
+		self.samples={}
+		self.types={}
+
+	def add(self, name, labels, value):
+		key=(name, tuple(sorted(labels.items())))
+		self.samples[key]=self.samples.get(key, 0)+value
+
+	def increment(self, name, value, labels):
+		name=PrometheusTextfileExporter.PREFIX + name + '_total'
+
+		with self.lock:
+			self.types[name]='counter'
+			self.add(name, labels, value)
+
+	def observe(self, name, seconds, labels):
+		name=PrometheusTextfileExporter.PREFIX + name + '_seconds'
+
+		with self.lock:
+			self.types[name]='histogram'
+
+			# Buckets are cumulative and all of them are written, including empty ones
+			for bound in PrometheusTextfileExporter.BUCKETS:
+				self.add(name + '_bucket', dict(labels, le='{b:g}'.format(b=bound)), 1 if seconds <= bound else 0)
+
+			self.add(name + '_bucket', dict(labels, le='+Inf'), 1)
+			self.add(name + '_sum', labels, seconds)
+			self.add(name + '_count', labels, 1)
+
+	def flush(self):
+		with self.lock:
+			(samples, types)=(self.samples, self.types)
+			(self.samples, self.types)=({}, {})
+
+		if len(samples) == 0:
+			return
+
+		try:
+			import fcntl
+		except ImportError:
+			fcntl=None
+
+		with open(self.file_path + '.lock', 'a') as lock_handle:
+			if fcntl is not None:
+				fcntl.flock(lock_handle.fileno(), fcntl.LOCK_EX)
+
+			(previous_samples, previous_types)=self.read()
+
+			for (key, value) in previous_samples.items():
+				samples[key]=samples.get(key, 0)+value
+
+			previous_types.update(types)
+			self.write(samples, previous_types)
+
+	def read(self):
+		samples={}
+		types={}
+
+		try:
+			handle=open(self.file_path, 'r')
+		except IOError:
+			return (samples, types)
+
+		with handle:
+			for line in handle:
+				if line.startswith('# TYPE '):
+					segments=line.split()
+
+					if len(segments) == 4:
+						types[segments[2]]=segments[3]
+
+					continue
+
+				match=PrometheusTextfileExporter.SAMPLE_PATTERN.match(line)
+
+				if match is None:
+					continue
+
+				labels=tuple(sorted([(label, PrometheusTextfileExporter.unescape(value)) for (label, value) in PrometheusTextfileExporter.LABEL_PATTERN.findall(match.group(2) or '')]))
+
+				try:
+					samples[(match.group(1), labels)]=float(match.group(3))
+				except ValueError:
+					pass
+
+		return (samples, types)
+
+	def write(self, samples, types):
+		def get_family(name):
+			for suffix in ['_bucket', '_sum', '_count']:
+				if name.endswith(suffix) and name[:-len(suffix)] in types:
+					return name[:-len(suffix)]
+
+			return name
+
+		def get_order(key):
+			(name, labels)=key
+			bound=dict(labels).get('le')
+
+			return (get_family(name), name, [label for label in labels if label[0] != 'le'], float(bound) if bound is not None else 0)
+
+		lines=[]
+		family=None
+
+		for key in sorted(samples.keys(), key=get_order):
+			(name, labels)=key
+
+			if get_family(name) != family:
+				family=get_family(name)
+
+				if family in types:
+					lines.append('# TYPE {f} {t}'.format(f=family, t=types[family]))
+
+			value=samples[key]
+			labels=sorted(labels, key=lambda label: label[0] == 'le')
+			label_text=','.join(['{k}="{v}"'.format(k=label, v=PrometheusTextfileExporter.escape(label_value)) for (label, label_value) in labels])
+
+			lines.append('{n}{l} {v}'.format(
+				n=name,
+				l='{' + label_text + '}' if len(labels) > 0 else '',
+				v=int(value) if value == int(value) else repr(value)
+			))
+
+		# The collector may read the file at any time, so it is replaced, never rewritten
+		temp_path='{p}.{i}.tmp'.format(p=self.file_path, i=os.getpid())
+
+		with open(temp_path, 'w') as handle:
+			handle.write('\n'.join(lines) + '\n')
+
+		os.rename(temp_path, self.file_path)
+
+	@staticmethod
+	def escape(value):
+		return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+	@staticmethod
+	def unescape(value):
+		"""
+		The label value written as value by escape().
+		"""
+		return PrometheusTextfileExporter.ESCAPE_PATTERN.sub(lambda match: '\n' if match.group(1) == 'n' else match.group(1), value)
+
+class StatsdExporter(object):
+	"""
+	Sends metrics to a StatsD server over UDP, as counters ('|c') and timers in
+	milliseconds ('|ms') named <prefix>.<name>.<label values...>. Lines are buffered
+	into packets that fit a typical MTU, and sent without waiting; packets that can't
+	be sent are dropped.
+	"""
+	MAX_PACKET_SIZE=1432
+
+	INVALID_CHARACTERS=re.compile(r'[^a-zA-Z0-9_.\-]')
+
+	def __init__(self, address, prefix='userapp.cli'):
+		(host, separator, port)=address.rpartition(':') if ':' in address else (address, '', '8125')
+
+		self.host=host or 'localhost'
+		self.port=int(port) if port.isdigit() else 8125
+		self.prefix=prefix
+		self.lock=threading.Lock()
+		self.buffer=[]
+		self.size=0
+		self.socket=None
+		self.target=None
+
+	def get_name(self, name, labels):
+		segments=[self.prefix, name]+[labels[key] for key in sorted(labels.keys())]
+		return '.'.join([StatsdExporter.INVALID_CHARACTERS.sub('_', str(segment)) for segment in segments])
+
+	def increment(self, name, value, labels):
+		self.add('{n}:{v}|c'.format(n=self.get_name(name, labels), v=value))
+
+	def observe(self, name, seconds, labels):
+		self.add('{n}:{v:.3f}|ms'.format(n=self.get_name(name, labels), v=seconds*1000))
+
+	def add(self, line):
+		with self.lock:
+			if self.size+len(line)+1 > StatsdExporter.MAX_PACKET_SIZE:
+				self.send()
+
+			self.buffer.append(line)
+			self.size += len(line)+1
+
+	def send(self):
+		if len(self.buffer) == 0:
+			return
+
+		packet='\n'.join(self.buffer)
+		(self.buffer, self.size)=([], 0)
+
+		import socket
+
+		try:
+			if self.socket is None:
+				# Resolved once, not for every packet
+				(family, socket_type, protocol, name, self.target)=socket.getaddrinfo(self.host, self.port, 0, socket.SOCK_DGRAM)[0]
+				self.socket=socket.socket(family, socket.SOCK_DGRAM)
+				self.socket.setblocking(False)
+
+			self.socket.sendto(packet, self.target)
+		except (socket.error, socket.gaierror):
+			pass
+
+	def flush(self):
+		with self.lock:
+			self.send()
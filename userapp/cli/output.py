@@ -0,0 +1,198 @@
+import sys
+import json
+
+class ResultWriter(object):
+	"""
+	Writes call results to a stream. write() takes a whole result, write_items() an
+	iterable of records which is consumed lazily.
+	"""
+	def __init__(self, stream=None):
+		import userapp
+
+		self.stream=sys.stdout if stream is None else stream
+		self.encoder_class=userapp.IterableObjectEncoder
+
+	@staticmethod
+	def get_records(result):
+		"""
+		The records of a result: the items of a search result, the elements of a list,
+		or else the result itself.
+		"""
+		source=getattr(result, 'source', result)
+
+		if isinstance(source, dict) and isinstance(source.get('items'), list):
+			return source['items']
+
+		if isinstance(source, list):
+			return source
+
+		return [result]
+
+	@staticmethod
+	def create(output_format=None, stream=None):
+		"""
+		Create a writer for the output format, the pretty writer if none is given.
+		Returns None for unknown formats.
+		"""
+		if output_format is None:
+			return PrettyResultWriter(stream)
+
+		writer_class=OUTPUT_FORMATS.get(output_format)
+
+		return None if writer_class is None else writer_class(stream)
+
+	def close(self):
+		self.stream.flush()
+
+class PrettyResultWriter(ResultWriter):
+	"""
+	The default, human readable '(result) ...' output.
+	"""
+	def write(self, result):
+		self.stream.write("(result) " + json.dumps(result, cls=self.encoder_class, sort_keys=True, indent=4) + '\n')
+
+	def write_items(self, items):
+		self.write(list(items))
+
+class JsonResultWriter(ResultWriter):
+	"""
+	Plain JSON, encoded record by record straight to the stream.
+	"""
+	separators=(', ', ': ')
+
+	def __init__(self, stream=None):
+		ResultWriter.__init__(self, stream)
+		self.encoder=self.encoder_class(separators=self.separators)
+
+	def write(self, result):
+		source=getattr(result, 'source', result)
+
+		if not (isinstance(source, dict) and isinstance(source.get('items'), list)):
+			self.stream.write(self.encoder.encode(result) + '\n')
+			return
+
+		# Encode the items of search results one by one instead of as one big string
+		self.stream.write('{')
+
+		for (key, value) in source.items():
+			if key != 'items':
+				self.stream.write(self.encoder.encode(key) + self.separators[1] + self.encoder.encode(value) + self.separators[0])
+
+		self.stream.write(self.encoder.encode('items') + self.separators[1])
+		self.write_records(source['items'])
+		self.stream.write('}\n')
+
+	def write_items(self, items):
+		self.write_records(items)
+		self.stream.write('\n')
+
+	def write_records(self, items):
+		self.stream.write('[')
+
+		for (index, item) in enumerate(items):
+			if index > 0:
+				self.stream.write(self.separators[0])
+
+			self.stream.write(self.encoder.encode(item))
+
+		self.stream.write(']')
+
+class CompactResultWriter(JsonResultWriter):
+	"""
+	JSON without any optional whitespace.
+	"""
+	separators=(',', ':')
+
+class NdjsonResultWriter(ResultWriter):
+	"""
+	One compact JSON document per record and line.
+	"""
+	def __init__(self, stream=None):
+		ResultWriter.__init__(self, stream)
+		self.encoder=self.encoder_class(separators=(',', ':'))
+
+	def write(self, result):
+		self.write_items(ResultWriter.get_records(result))
+
+	def write_items(self, items):
+		for item in items:
+			self.stream.write(self.encoder.encode(item) + '\n')
+
+class CsvResultWriter(ResultWriter):
+	"""
+	One row per record, nested values are written as JSON. The columns are the fields
+	of the first HEADER_RECORDS records; a later record with any other field fails
+	rather than losing it, as the header can't change once written.
+	"""
+	# Records read ahead to find the columns
+	HEADER_RECORDS=1000
+
+	def __init__(self, stream=None):
+		ResultWriter.__init__(self, stream)
+		self.encoder=self.encoder_class(separators=(',', ':'))
+		self.writer=None
+		self.columns=None
+
+	def resume(self, columns):
+		"""
+		Continue a file already holding the header row of columns.
+		"""
+		import csv
+
+		self.columns=columns
+		self.writer=csv.DictWriter(self.stream, columns)
+
+	def write(self, result):
+		self.write_items(ResultWriter.get_records(result))
+
+	def write_items(self, items):
+		import csv
+		import itertools
+
+		rows=(CsvResultWriter.get_source(item) for item in items)
+
+		if self.writer is None:
+			head=list(itertools.islice(rows, CsvResultWriter.HEADER_RECORDS))
+
+			if len(head) == 0:
+				return
+
+			self.columns=sorted(set([key for row in head for key in row.keys()]))
+			self.writer=csv.DictWriter(self.stream, self.columns)
+			self.writer.writeheader()
+
+			rows=itertools.chain(head, rows)
+
+		columns=set(self.columns)
+
+		for row in rows:
+			unknown=[key for key in row.keys() if key not in columns]
+
+			if len(unknown) > 0:
+				raise ValueError("A record has fields that aren't CSV columns: {f}. Use a JSON format to keep all fields.".format(f=', '.join(sorted(unknown))))
+
+			self.writer.writerow(dict([(key, self.format_value(value)) for (key, value) in row.items()]))
+
+	@staticmethod
+	def get_source(item):
+		source=getattr(item, 'source', item)
+		return source if isinstance(source, dict) else {'value':source}
+
+	def format_value(self, value):
+		if value is None:
+			return ''
+
+		if isinstance(value, unicode):
+			return value.encode('utf-8')
+
+		if isinstance(value, (bool, dict, list)) or hasattr(value, 'source'):
+			return self.encoder.encode(value)
+
+		return value
+
+OUTPUT_FORMATS={
+	'json':JsonResultWriter,
+	'compact':CompactResultWriter,
+	'ndjson':NdjsonResultWriter,
+	'csv':CsvResultWriter
+}
@@ -0,0 +1,69 @@
+from concurrency import WorkerPool
+
+class SearchPaginator(object):
+	"""
+	Iterates over every item of a search method, page by page. Once the first page has
+	told how many items there are, up to prefetch further pages are fetched
+	concurrently while earlier ones are consumed.
+	"""
+	def __init__(self, call, parameters=None, page_size=100, prefetch=4):
+		self.call=call
+		self.parameters={} if parameters is None else dict(parameters)
+		self.page_size=page_size
+		self.prefetch=prefetch
+
+	@staticmethod
+	def get_items(page):
+		source=getattr(page, 'source', page)
+		return source.get('items', []) if isinstance(source, dict) else []
+
+	@staticmethod
+	def get_total(page):
+		source=getattr(page, 'source', page)
+		return source.get('total_items') if isinstance(source, dict) else None
+
+	def fetch_page(self, number):
+		parameters=dict(self.parameters)
+		parameters['page']=number
+		parameters['page_size']=self.page_size
+
+		return self.call(parameters)
+
+	def get_page_count(self, total):
+		return (int(total)+self.page_size-1)//self.page_size
+
+	def __iter__(self):
+		for (number, page) in self.iter_pages():
+			for item in SearchPaginator.get_items(page):
+				yield item
+
+	def iter_pages(self, first_number=1):
+		"""
+		Yield (page number, page) tuples in order, starting at page first_number.
+		"""
+		first_page=self.fetch_page(first_number)
+		total=SearchPaginator.get_total(first_page)
+
+		yield (first_number, first_page)
+
+		if total is None:
+			# Without a total, walk the pages one at a time until a short page
+			number=first_number
+			page=first_page
+
+			while len(SearchPaginator.get_items(page)) >= self.page_size:
+				number += 1
+				page=self.fetch_page(number)
+
+				yield (number, page)
+
+			return
+
+		pool=WorkerPool(self.prefetch)
+		page_numbers=xrange(first_number+1, self.get_page_count(total)+1)
+
+		for (index, page, error) in pool.imap(self.fetch_page, page_numbers):
+			if error is not None:
+				raise error
+
+			yield (first_number+1+index, page)
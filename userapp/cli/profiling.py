@@ -0,0 +1,208 @@
+import os
+import sys
+import contextlib
+
+from core import ServiceLocator
+
+class StackSampler(object):
+	"""
+	Samples the stacks of all threads every interval seconds of CPU time (SIGPROF)
+	and counts them in the collapsed format of flame graph tools: one line per
+	distinct stack, 'outermost;...;innermost count'. Only available on POSIX
+	systems, and only from the main thread.
+	"""
+	def __init__(self, interval=0.005):
+		self.interval=interval
+		self.counts={}
+		self.previous_handler=None
+
+	@staticmethod
+	def is_supported():
+		import signal
+		return hasattr(signal, 'setitimer') and hasattr(sys, '_current_frames')
+
+	def start(self):
+		import signal
+
+		self.previous_handler=signal.signal(signal.SIGPROF, self.sample)
+
+		# Restart system calls interrupted by a sample instead of failing with EINTR
+		signal.siginterrupt(signal.SIGPROF, False)
+		signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+	def stop(self):
+		import signal
+
+		signal.setitimer(signal.ITIMER_PROF, 0, 0)
+		signal.signal(signal.SIGPROF, self.previous_handler or signal.SIG_DFL)
+
+	def sample(self, signal_number, frame):
+		import thread
+
+		# The main thread is interrupted at frame, its current frame is this handler
+		frames=sys._current_frames()
+		frames[thread.get_ident()]=frame
+
+		for current in frames.values():
+			names=[]
+
+			while current is not None:
+				names.append('{f}:{n}'.format(f=os.path.basename(current.f_code.co_filename), n=current.f_code.co_name))
+				current=current.f_back
+
+			key=';'.join(reversed(names))
+			self.counts[key]=self.counts.get(key, 0)+1
+
+	def write(self, file_path):
+		with open(file_path, 'w') as handle:
+			for (stack, count) in sorted(self.counts.items()):
+				handle.write('{s} {c}\n'.format(s=stack, c=count))
+
+class CommandProfiler(object):
+	"""
+	Profiles the creation and execution of commands, set up by the --profile-cpu and
+	--profile-mem global options.
+
+	CPU profiles are written as pstats files ('python -m pstats <file>'), or, if the
+	file name ends with .collapsed or .folded, as sampled stacks for flame graphs.
+	Memory profiles list the top allocation sites (tracemalloc) or, where tracemalloc
+	is not available, the object types whose number grew the most during the command.
+
+	When numbered, e.g. in the interactive console and in scripts, every command gets
+	its own files: out.pstats becomes out.1.pstats, out.2.pstats, ...
+	"""
+	COLLAPSED_EXTENSIONS=['.collapsed', '.folded']
+
+	def __init__(self, cpu_path=None, memory_path=None, top=25):
+		self.cpu_path=cpu_path
+		self.memory_path=memory_path
+		self.top=top
+		self.enabled=cpu_path is not None or memory_path is not None
+		self.numbered=False
+		self.count=0
+
+	@staticmethod
+	def get_instance():
+		"""
+		The profiler registered in the ServiceLocator, or a disabled one.
+		"""
+		profiler=ServiceLocator.get_instance().resolve('profiler')
+		return CommandProfiler.DISABLED if profiler is None else profiler
+
+	def get_path(self, file_path):
+		if not self.numbered:
+			return file_path
+
+		(base_path, extension)=os.path.splitext(file_path)
+		return '{b}.{n}{e}'.format(b=base_path, n=self.count, e=extension)
+
+	@contextlib.contextmanager
+	def profile(self):
+		if not self.enabled:
+			yield
+			return
+
+		self.count += 1
+
+		# The CPU profile runs inside the memory profile, so it doesn't include taking snapshots
+		memory_profile=self.start_memory() if self.memory_path is not None else None
+		cpu_profile=self.start_cpu() if self.cpu_path is not None else None
+
+		try:
+			yield
+		finally:
+			if cpu_profile is not None:
+				self.stop_cpu(cpu_profile, self.get_path(self.cpu_path))
+
+			if memory_profile is not None:
+				self.stop_memory(memory_profile, self.get_path(self.memory_path))
+
+	def is_collapsed(self):
+		return os.path.splitext(self.cpu_path)[1].lower() in CommandProfiler.COLLAPSED_EXTENSIONS
+
+	def start_cpu(self):
+		if self.is_collapsed():
+			if not StackSampler.is_supported():
+				sys.stderr.write("(error) Sampled CPU profiles are not supported on this platform, use a .pstats file.\n")
+				return None
+
+			profile=StackSampler()
+			profile.start()
+		else:
+			import cProfile
+			profile=cProfile.Profile()
+			profile.enable()
+
+		return profile
+
+	def stop_cpu(self, profile, file_path):
+		if isinstance(profile, StackSampler):
+			profile.stop()
+			profile.write(file_path)
+		else:
+			profile.disable()
+			profile.dump_stats(file_path)
+
+		sys.stderr.write("(info) CPU profile written to '" + file_path + "'.\n")
+
+	def start_memory(self):
+		import gc
+
+		try:
+			import tracemalloc
+		except ImportError:
+			tracemalloc=None
+
+		if tracemalloc is None:
+			gc.collect()
+			return {'counts':CommandProfiler.get_type_counts()}
+
+		started=not tracemalloc.is_tracing()
+
+		if started:
+			tracemalloc.start()
+
+		return {'tracemalloc':tracemalloc, 'started':started, 'snapshot':tracemalloc.take_snapshot()}
+
+	def stop_memory(self, profile, file_path):
+		import gc
+
+		if 'tracemalloc' in profile:
+			tracemalloc=profile['tracemalloc']
+			snapshot=tracemalloc.take_snapshot()
+			(current, peak)=tracemalloc.get_traced_memory()
+
+			if profile['started']:
+				tracemalloc.stop()
+
+			lines=['# Top {n} allocation sites by growth during the command. Traced: {c} bytes, peak {p} bytes.'.format(n=self.top, c=current, p=peak)]
+			lines.extend([str(statistic) for statistic in snapshot.compare_to(profile['snapshot'], 'lineno')[:self.top]])
+		else:
+			gc.collect()
+			counts=CommandProfiler.get_type_counts()
+			before=profile['counts']
+
+			growth=sorted([(count-before.get(name, 0), count, name) for (name, count) in counts.items()], reverse=True)[:self.top]
+
+			# Without tracemalloc, only objects tracked by the garbage collector are counted
+			lines=['# Top {n} object types by growth during the command (gc tracked objects only).'.format(n=self.top)]
+			lines.extend(['{g:+10d} {c:10d}  {n}'.format(g=grown, c=count, n=name) for (grown, count, name) in growth])
+
+		with open(file_path, 'w') as handle:
+			handle.write('\n'.join(lines) + '\n')
+
+		sys.stderr.write("(info) Memory profile written to '" + file_path + "'.\n")
+
+	@staticmethod
+	def get_type_counts():
+		import gc
+
+		counts={}
+
+		for item in gc.get_objects():
+			name=type(item).__name__
+			counts[name]=counts.get(name, 0)+1
+
+		return counts
+
+CommandProfiler.DISABLED=CommandProfiler()
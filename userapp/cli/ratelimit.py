@@ -0,0 +1,51 @@
+import time
+import random
+import threading
+
+class TokenBucket(object):
+	"""
+	Limits how many operations start per second across threads. Holds up to burst
+	tokens, refilled at rate tokens per second; acquire() waits for a token. A rate
+	of 0 means unlimited.
+	"""
+	def __init__(self, rate, burst=None):
+		self.rate=float(rate)
+		self.burst=max(1.0, float(rate if burst is None else burst))
+		self.tokens=self.burst
+		self.updated=time.time()
+		self.lock=threading.Lock()
+
+	def acquire(self):
+		if self.rate <= 0:
+			return
+
+		while True:
+			with self.lock:
+				now=time.time()
+				self.tokens=min(self.burst, self.tokens+(now-self.updated)*self.rate)
+				self.updated=now
+
+				if self.tokens >= 1:
+					self.tokens -= 1
+					return
+
+				wait=(1-self.tokens)/self.rate
+
+			time.sleep(wait)
+
+class RetryPolicy(object):
+	"""
+	How often and after which delays a failed call is retried: up to retries times,
+	waiting an exponentially growing, jittered delay. See RequestScheduler for which
+	errors are retried.
+	"""
+	def __init__(self, retries=3, base_delay=0.5, max_delay=30.0):
+		self.retries=retries
+		self.base_delay=base_delay
+		self.max_delay=max_delay
+
+	def get_delay(self, attempt):
+		"""
+		The delay before retry attempt (1 for the first retry), with full jitter.
+		"""
+		return random.uniform(0, min(self.max_delay, self.base_delay*(2**(attempt-1))))
@@ -0,0 +1,236 @@
+import json
+import time
+import threading
+
+from ratelimit import RetryPolicy
+from cache import ResponseCache
+from session import SessionCache
+from metrics import Metrics
+
+class RequestScheduler(object):
+	"""
+	Schedules the HTTP requests of one profile. Failed requests are classified as
+	connect, network, throttled, server, auth or validation errors. Network,
+	throttling and server errors are retried with jittered exponential backoff, and
+	an auth error triggers one re-authentication. Requests that aren't idempotent
+	(e.g. user.save, user.login) may have been processed when a response is lost, so
+	they are only retried when they were throttled or the connection couldn't be
+	established. The number of requests in flight adapts to throttling (AIMD): it is
+	halved when the server throttles and grows by one per window of successful
+	requests up to max_concurrency.
+	"""
+	CONNECT='connect'
+	NETWORK='network'
+	THROTTLED='throttled'
+	SERVER='server'
+	AUTH='auth'
+	VALIDATION='validation'
+
+	RETRIED=[CONNECT, NETWORK, THROTTLED, SERVER]
+
+	# Errors after which a request that isn't idempotent certainly wasn't processed
+	RETRIED_NON_IDEMPOTENT=[CONNECT, THROTTLED]
+
+	# Non-idempotent methods besides those that mutate data (see ResponseCache)
+	NON_IDEMPOTENT_METHODS=['login']
+
+	THROTTLE_STATUSES=[429, 503]
+	THROTTLE_ERROR_CODES=['RATE_LIMIT_EXCEEDED', 'TOO_MANY_REQUESTS']
+	SERVER_ERROR_CODES=['INTERNAL_ERROR', 'SERVICE_UNAVAILABLE', 'TIMEOUT']
+
+	def __init__(self, retries=3, max_concurrency=16, base_delay=0.25, max_delay=30.0):
+		self.policy=RetryPolicy(retries, base_delay, max_delay)
+		self.max_concurrency=max_concurrency
+		self.limit=float(max_concurrency)
+		self.active=0
+		self.decreased=0
+		self.condition=threading.Condition()
+		self.retried=0
+		self.throttled=0
+
+	@staticmethod
+	def get_error_code(response):
+		"""
+		The error code of an API error response. Only small bodies are parsed, as
+		error responses are.
+		"""
+		content=response.content
+
+		if len(content) > 4096 or 'error_code' not in content:
+			return None
+
+		try:
+			result=json.loads(content)
+		except ValueError:
+			return None
+
+		return result.get('error_code') if isinstance(result, dict) else None
+
+	@staticmethod
+	def is_idempotent(method):
+		"""
+		Whether sending a request for method (service.method) twice has the same effect
+		as sending it once. Requests of unknown methods are assumed not to be.
+		"""
+		if method is None:
+			return False
+
+		name=method.rsplit('.', 1)[-1]
+
+		return not (ResponseCache.is_mutating(name) or name in RequestScheduler.NON_IDEMPOTENT_METHODS)
+
+	@staticmethod
+	def is_connect_error(error):
+		"""
+		Whether a request failed while connecting, before anything was sent.
+		"""
+		import requests
+		from requests.packages.urllib3.exceptions import ConnectTimeoutError
+
+		if isinstance(error, requests.ConnectTimeout):
+			return True
+
+		if not isinstance(error, requests.ConnectionError) or len(error.args) == 0:
+			return False
+
+		# Refused connections and failed name lookups (NewConnectionError) included
+		return isinstance(getattr(error.args[0], 'reason', error.args[0]), ConnectTimeoutError)
+
+	@staticmethod
+	def classify(response=None, error=None):
+		"""
+		The kind of error of a request, or None if it succeeded. Exceptions other than
+		network errors are not worth retrying and count as validation errors.
+		"""
+		if error is not None:
+			import requests
+
+			if RequestScheduler.is_connect_error(error):
+				return RequestScheduler.CONNECT
+
+			if isinstance(error, (requests.ConnectionError, requests.Timeout)):
+				return RequestScheduler.NETWORK
+
+			return RequestScheduler.VALIDATION
+
+		if response.status_code in RequestScheduler.THROTTLE_STATUSES:
+			return RequestScheduler.THROTTLED
+
+		if response.status_code >= 500:
+			return RequestScheduler.SERVER
+
+		error_code=RequestScheduler.get_error_code(response)
+
+		if error_code is None:
+			return None
+
+		if error_code in RequestScheduler.THROTTLE_ERROR_CODES:
+			return RequestScheduler.THROTTLED
+
+		if error_code in RequestScheduler.SERVER_ERROR_CODES:
+			return RequestScheduler.SERVER
+
+		if error_code in SessionCache.AUTH_ERROR_CODES:
+			return RequestScheduler.AUTH
+
+		return RequestScheduler.VALIDATION
+
+	def set_max_concurrency(self, max_concurrency):
+		with self.condition:
+			self.max_concurrency=max_concurrency
+			self.limit=float(max_concurrency)
+			self.condition.notify_all()
+
+	def acquire(self):
+		with self.condition:
+			while self.active >= int(self.limit):
+				self.condition.wait(1)
+
+			self.active += 1
+
+	def release(self, category):
+		with self.condition:
+			self.active -= 1
+
+			if category == RequestScheduler.THROTTLED:
+				self.throttled += 1
+
+				# Requests in flight when the server started throttling only count once
+				if time.time()-self.decreased >= 1:
+					self.limit=max(1.0, self.limit/2)
+					self.decreased=time.time()
+			elif category is None:
+				self.limit=min(float(self.max_concurrency), self.limit+1/self.limit)
+
+			self.condition.notify_all()
+
+	def get_delay(self, attempt, response):
+		delay=self.policy.get_delay(attempt)
+
+		retry_after=None if response is None else response.headers.get('Retry-After')
+
+		if retry_after is not None and retry_after.isdigit():
+			delay=max(delay, min(float(retry_after), self.policy.max_delay))
+
+		return delay
+
+	def execute(self, send, reauthenticate=None, method=None):
+		"""
+		Send a request, retrying as its errors allow. send() returns a response or
+		raises; reauthenticate() returns True if credentials were refreshed and the
+		request should be sent again. Returns the last response (API errors are left
+		to the client to raise) or raises the last exception. method (service.method)
+		decides which errors are retried, and the outcome is recorded under it.
+		"""
+		metrics=Metrics.get_instance()
+		started=time.time()
+
+		if RequestScheduler.is_idempotent(method):
+			retried_categories=RequestScheduler.RETRIED
+		else:
+			retried_categories=RequestScheduler.RETRIED_NON_IDEMPOTENT
+
+		attempt=0
+		reauthenticated=False
+
+		while True:
+			(response, error)=(None, None)
+
+			category=None
+
+			self.acquire()
+
+			try:
+				try:
+					response=send()
+				except Exception, e:
+					error=e
+
+				category=RequestScheduler.classify(response, error)
+			finally:
+				self.release(category)
+
+			if category == RequestScheduler.AUTH and not reauthenticated and reauthenticate is not None:
+				reauthenticated=True
+
+				if reauthenticate():
+					metrics.increment('retries', method=method, reason=category)
+					continue
+
+			if category in retried_categories and attempt < self.policy.retries:
+				attempt += 1
+
+				with self.condition:
+					self.retried += 1
+
+				metrics.increment('retries', method=method, reason=category)
+				time.sleep(self.get_delay(attempt, response))
+				continue
+
+			metrics.increment('requests', method=method, result=category or 'ok')
+			metrics.observe('request_duration', time.time()-started, method=method)
+
+			if error is not None:
+				raise error
+
+			return response
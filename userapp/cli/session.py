@@ -0,0 +1,106 @@
+import os
+import json
+import time
+import threading
+
+class SessionCache(object):
+	"""
+	Caches login artifacts (session token, user id, app id and CLI token id) per login and
+	base address, so commands can skip the login handshake. Session tokens expire after ttl
+	seconds, the app id and token id are kept until the entry is invalidated.
+	"""
+	AUTH_ERROR_CODES=['INVALID_CREDENTIALS', 'UNAUTHORIZED', 'INVALID_TOKEN', 'TOKEN_EXPIRED']
+
+	def __init__(self, file_path, ttl=1800):
+		self.file_path=file_path
+		self.ttl=ttl
+		self.lock=threading.Lock()
+		self.entries=None
+
+	@staticmethod
+	def is_auth_error(error):
+		return getattr(error, 'error_code', None) in SessionCache.AUTH_ERROR_CODES
+
+	def get_key(self, login, base_address):
+		return '{l}@{a}'.format(l=login, a=base_address)
+
+	def load(self):
+		if self.entries is not None:
+			return
+
+		try:
+			with open(self.file_path, 'r') as handle:
+				self.entries=json.load(handle)
+		except (IOError, ValueError):
+			self.entries={}
+
+	def reload(self):
+		"""
+		Read the file again on next use, e.g. after another process has changed it.
+		"""
+		with self.lock:
+			self.entries=None
+
+	def save(self):
+		cache_dir_path=os.path.dirname(self.file_path)
+
+		try:
+			if not os.path.exists(cache_dir_path):
+				os.makedirs(cache_dir_path, 0700)
+
+			# The cache holds session tokens, keep it private to the user
+			handle=os.fdopen(os.open(self.file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0600), 'w')
+
+			with handle:
+				json.dump(self.entries, handle)
+		except (IOError, OSError):
+			pass
+
+	def get(self, login, base_address):
+		"""
+		Returns the cached entry, without the session token if it has expired, or None.
+		"""
+		with self.lock:
+			self.load()
+
+			entry=self.entries.get(self.get_key(login, base_address))
+
+			if entry is None:
+				return None
+
+			entry=dict(entry)
+
+			if entry.get('expires', 0) < time.time():
+				entry.pop('session_token', None)
+
+			return entry
+
+	def get_session_token(self, login, base_address):
+		entry=self.get(login, base_address)
+		return None if entry is None else entry.get('session_token')
+
+	def update(self, login, base_address, **values):
+		"""
+		Merge values into the cached entry and persist it. Storing a session token
+		restarts its expiry.
+		"""
+		with self.lock:
+			self.load()
+
+			key=self.get_key(login, base_address)
+			entry=self.entries.setdefault(key, {})
+			entry.update(values)
+
+			if 'session_token' in values:
+				entry['expires']=time.time()+self.ttl
+
+			self.save()
+
+			return dict(entry)
+
+	def invalidate(self, login, base_address):
+		with self.lock:
+			self.load()
+
+			if self.entries.pop(self.get_key(login, base_address), None) is not None:
+				self.save()
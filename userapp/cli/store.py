@@ -0,0 +1,185 @@
+import os
+import json
+import sqlite3
+
+from core import Configuration
+
+class SqliteConfiguration(Configuration):
+	"""
+	A configuration that keeps one row per profile in a SQLite database. Profiles are
+	read when first used and only the changed ones are written, and the primary profile
+	is found through an index, so commands don't slow down as profiles are added.
+	"""
+	SCHEMA=[
+		'CREATE TABLE IF NOT EXISTS profiles (name TEXT PRIMARY KEY, is_primary INTEGER NOT NULL DEFAULT 0, data TEXT NOT NULL)',
+		'CREATE INDEX IF NOT EXISTS profiles_primary ON profiles (is_primary)'
+	]
+
+	def __init__(self, selected_profile_name=None, file_path=None):
+		Configuration.__init__(self, selected_profile_name, None, file_path)
+		self.connection=None
+		self.written={}
+
+	@staticmethod
+	def get_store_path(config_path):
+		"""
+		The database used instead of the JSON configuration file config_path, if it exists.
+		"""
+		return os.path.splitext(config_path)[0] + '.db'
+
+	@staticmethod
+	def get_config_path(store_path):
+		return os.path.splitext(store_path)[0] + '.json'
+
+	@staticmethod
+	def migrate_from(config):
+		"""
+		Copy the profiles of the JSON configuration config into a new database alongside
+		it. The JSON file is left in place as a backup, without tokens and passwords.
+		"""
+		store_path=SqliteConfiguration.get_store_path(config.get_file_path())
+
+		if os.path.exists(store_path):
+			os.remove(store_path)
+
+		# The profiles hold tokens, the database is private to the user from the start
+		os.close(os.open(store_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0600))
+
+		store=SqliteConfiguration(config.selected_profile_name, store_path)
+		store.load()
+		store.put_profiles(config.profiles.items())
+
+		if os.path.exists(config.get_file_path()):
+			SqliteConfiguration.remove_credentials(config.get_file_path())
+
+		return store
+
+	@staticmethod
+	def remove_credentials(config_path):
+		"""
+		Clear the tokens and passwords of the profiles in the JSON configuration file.
+		"""
+		backup=Configuration(file_path=config_path)
+		backup.load()
+
+		for profile in backup.profiles.values():
+			profile['user']['token']=None
+			profile['user']['password']=None
+
+		backup.save()
+
+	def migrate_to_json(self):
+		"""
+		Write all profiles back to the JSON configuration file and remove the database.
+		"""
+		config=Configuration(self.selected_profile_name, None, SqliteConfiguration.get_config_path(self.get_file_path()))
+		config.load()
+		config.profiles=self.get_all_profiles()
+		config.save()
+
+		self.connection.close()
+		self.connection=None
+		os.remove(self.get_file_path())
+
+		return config
+
+	def connect(self):
+		if self.connection is None:
+			self.connection=sqlite3.connect(self.get_file_path(), timeout=10)
+
+			with self.connection:
+				for statement in SqliteConfiguration.SCHEMA:
+					self.connection.execute(statement)
+
+		return self.connection
+
+	def load(self):
+		"""
+		Forget the profiles read so far, they are read again when used.
+		"""
+		self.connect()
+		self.profiles={}
+		self.written={}
+
+	def read_profile(self, name):
+		row=self.connect().execute('SELECT data FROM profiles WHERE name = ?', (name,)).fetchone()
+
+		if row is None:
+			return None
+
+		profile=json.loads(row[0])
+		self.apply_defaults(profile)
+
+		self.profiles[name]=profile
+		self.written[name]=json.dumps(profile, sort_keys=True)
+
+		return profile
+
+	def has_profile(self, name):
+		return name in self.profiles or self.read_profile(name) is not None
+
+	def get_profile(self, name):
+		if name in self.profiles:
+			return self.profiles[name]
+
+		profile=self.read_profile(name)
+
+		if profile is None:
+			profile=self.get_default_profile()
+			self.profiles[name]=profile
+
+		return profile
+
+	def get_profile_names(self):
+		names=set([row[0] for row in self.connect().execute('SELECT name FROM profiles')])
+		return sorted(names.union(self.profiles.keys()))
+
+	def get_primary_profile(self):
+		for (name,) in self.connect().execute('SELECT name FROM profiles WHERE is_primary = 1 ORDER BY name').fetchall():
+			profile=self.get_profile(name)
+
+			if profile['primary']:
+				return profile
+
+		# Profiles not saved yet, or made primary since they were read
+		for name in sorted(self.profiles.keys()):
+			if self.profiles[name]['primary']:
+				return self.profiles[name]
+
+		return self.get_default_profile()
+
+	def write(self, snapshot):
+		"""
+		Write the profiles that changed since they were read or last saved.
+		"""
+		changed=[(name, value) for (name, value) in snapshot.items() if self.written.get(name) != value]
+
+		if len(changed) == 0:
+			return
+
+		self.put_profiles([(name, json.loads(value)) for (name, value) in changed])
+		self.written.update(changed)
+
+	def put_profiles(self, profiles):
+		"""
+		Insert or replace (name, profile) pairs in one transaction.
+		"""
+		connection=self.connect()
+
+		with connection:
+			connection.executemany('INSERT OR REPLACE INTO profiles (name, is_primary, data) VALUES (?, ?, ?)', [
+				(name, 1 if profile.get('primary') else 0, json.dumps(profile, sort_keys=True)) for (name, profile) in profiles
+			])
+
+	def get_all_profiles(self):
+		profiles={}
+
+		for (name, data) in self.connect().execute('SELECT name, data FROM profiles'):
+			profiles[name]=json.loads(data)
+
+		profiles.update(self.profiles)
+
+		return profiles
+
+	def __str__(self):
+		return json.dumps({'profiles':self.get_all_profiles()}, sort_keys=True, indent=4)
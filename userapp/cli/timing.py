@@ -0,0 +1,159 @@
+import sys
+import time
+import threading
+
+from core import ServiceLocator
+
+class NullSpan(object):
+	"""
+	The span handed out while tracing is disabled. Does nothing.
+	"""
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *arguments):
+		return False
+
+	def set(self, name, value):
+		pass
+
+class Span(object):
+	def __init__(self, tracer, name, attributes):
+		self.tracer=tracer
+		self.name=name
+		self.attributes=attributes
+		self.thread=threading.current_thread().name
+		self.depth=0
+		self.start=None
+		self.duration=None
+
+	def __enter__(self):
+		self.depth=self.tracer.push()
+		self.start=time.time()
+		return self
+
+	def __exit__(self, *arguments):
+		self.duration=time.time()-self.start
+		self.tracer.pop(self)
+		return False
+
+	def set(self, name, value):
+		self.attributes[name]=value
+
+class Tracer(object):
+	"""
+	Records nested, named phases (spans) of a command and reports their durations to
+	stderr, either as an indented breakdown or as JSON lines. While disabled, span()
+	returns a shared no-op span.
+	"""
+	NULL_SPAN=NullSpan()
+
+	def __init__(self, enabled=False, output_format='text', stream=None):
+		self.enabled=enabled
+		self.output_format=output_format
+		self.stream=sys.stderr if stream is None else stream
+		self.started=time.time()
+		self.spans=[]
+		self.lock=threading.Lock()
+		self.local=threading.local()
+
+	@staticmethod
+	def get_instance():
+		"""
+		The tracer registered in the ServiceLocator, or a disabled one.
+		"""
+		tracer=ServiceLocator.get_instance().resolve('tracer')
+		return Tracer.DISABLED if tracer is None else tracer
+
+	@staticmethod
+	def from_environment(environment, timing=False):
+		"""
+		Create a tracer from USERAPP_TRACE (1, text or json) and the --timing flag.
+		"""
+		value=environment.get('USERAPP_TRACE', '').lower()
+
+		if value == 'json':
+			return Tracer(True, 'json')
+
+		return Tracer(timing or value in ['1', 'true', 'yes', 'on', 'text'], 'text')
+
+	def span(self, name, **attributes):
+		if not self.enabled:
+			return Tracer.NULL_SPAN
+
+		return Span(self, name, attributes)
+
+	def record(self, name, start, duration, **attributes):
+		"""
+		Record a span that has already ended, e.g. one measured before the tracer existed.
+		"""
+		if not self.enabled:
+			return
+
+		span=Span(self, name, attributes)
+		span.depth=getattr(self.local, 'depth', 0)
+		span.start=start
+		span.duration=duration
+
+		with self.lock:
+			self.spans.append(span)
+
+	def push(self):
+		depth=getattr(self.local, 'depth', 0)
+		self.local.depth=depth+1
+		return depth
+
+	def pop(self, span):
+		self.local.depth=span.depth
+
+		with self.lock:
+			self.spans.append(span)
+
+	def reset(self):
+		with self.lock:
+			self.started=time.time()
+			self.spans=[]
+
+	def report(self):
+		if not self.enabled or len(self.spans) == 0:
+			return
+
+		spans=sorted(self.spans, key=lambda span: span.start)
+		started=min(self.started, spans[0].start)
+		total=max([span.start+span.duration for span in spans])-started
+
+		if self.output_format == 'json':
+			import json
+
+			for span in spans:
+				line=dict(span.attributes)
+				line.update({
+					'name':span.name,
+					'depth':span.depth,
+					'thread':span.thread,
+					'start_ms':round(1000*(span.start-started), 3),
+					'duration_ms':round(1000*span.duration, 3)
+				})
+				self.stream.write(json.dumps(line, sort_keys=True) + '\n')
+		else:
+			self.stream.write('(timing) {t:.1f} ms total\n'.format(t=1000*total))
+
+			for span in spans:
+				attributes=' '.join(['{k}={v}'.format(k=key, v=value) for (key, value) in sorted(span.attributes.items())])
+
+				if span.thread != 'MainThread':
+					attributes=('thread=' + span.thread + ' ' + attributes).rstrip()
+				share=100*span.duration/total if total > 0 else 0
+
+				self.stream.write('(timing) {i}{n:<{w}} {d:>9.1f} ms {s:>5.1f}%  {a}\n'.format(
+					i='  '*span.depth,
+					n=span.name,
+					w=max(1, 28-2*span.depth),
+					d=1000*span.duration,
+					s=share,
+					a=attributes
+				).rstrip() + '\n')
+
+		self.stream.flush()
+
+Tracer.DISABLED=Tracer(False)